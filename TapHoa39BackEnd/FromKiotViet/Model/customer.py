@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Any, Dict, Optional, Tuple
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Any, ClassVar, Dict, Optional, Tuple
 
 
 CUSTOMER_FIELD_NAMES: Tuple[str, ...] = (
@@ -35,7 +36,8 @@ CUSTOMER_FIELD_NAMES: Tuple[str, ...] = (
 )
 
 
-@dataclass
+# slots: no per-instance __dict__; fields are declared in CUSTOMER_FIELD_NAMES order.
+@dataclass(slots=True)
 class Customer:
 	Id: Optional[Any] = None
 	BranchId: Optional[Any] = None
@@ -65,18 +67,13 @@ class Customer:
 	LocationName: Optional[str] = None
 	WardName: Optional[str] = None
 
-	_FIELD_ORDER: Tuple[str, ...] = field(default=CUSTOMER_FIELD_NAMES, init=False, repr=False)
+	_FIELD_ORDER: ClassVar[Tuple[str, ...]] = CUSTOMER_FIELD_NAMES
 
 	@classmethod
 	def from_dict(cls, data: Dict[str, Any], default_branch_id: Optional[Any] = None) -> "Customer":
-		payload: Dict[str, Any] = {}
-		for field_name in cls._FIELD_ORDER:
-			if field_name == "Id":
-				payload[field_name] = data.get("Id", data.get("id"))
-			else:
-				payload[field_name] = data.get(field_name)
-
-		instance = cls(**payload)
+		get = data.get
+		# Positional, in field order; "Id" also accepts the Firestore "id" alias.
+		instance = cls(get("Id", get("id")), *[get(field_name) for field_name in _FIELDS_AFTER_ID])
 		if instance.BranchId is None and default_branch_id is not None:
 			instance.BranchId = default_branch_id
 		return instance
@@ -154,18 +151,25 @@ class Customer:
 			self.Groups = response.get("Groups")
 
 	def to_dict(self, include_none: bool = False, include_id_alias: bool = True) -> Dict[str, Any]:
-		result: Dict[str, Any] = {}
-		for field_name in self._FIELD_ORDER:
-			value = getattr(self, field_name)
-			if value is None and not include_none:
-				continue
-			result[field_name] = value
+		pairs = zip(CUSTOMER_FIELD_NAMES, _customer_values(self))
+		if include_none:
+			result: Dict[str, Any] = dict(pairs)
+		else:
+			result = {field_name: value for field_name, value in pairs if value is not None}
 
 		if include_id_alias and self.Id is not None:
 			result["id"] = str(self.Id)
 
 		return result
 
+	def to_firestore(self) -> Dict[str, Any]:
+		"""Document for the customers collection: set fields plus the string ``id`` alias."""
+		return self.to_dict(include_none=False, include_id_alias=True)
+
 	def to_kiotviet_payload(self) -> Dict[str, Any]:
 		return self.to_dict(include_none=False, include_id_alias=False)
 
+
+_FIELDS_AFTER_ID = CUSTOMER_FIELD_NAMES[1:]
+_customer_values = attrgetter(*CUSTOMER_FIELD_NAMES)
+
@@ -1,7 +1,6 @@
-import requests
 from typing import Any, Dict
 
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 from Utility.get_env import LatestBranchId, retailer
 
 url = "https://api-man1.kiotviet.vn/api/customers"
@@ -16,7 +15,6 @@ def add_customer_to_kiotviet(customer_payload: Dict[str, Any]) -> Dict[str, Any]
     normalized_payload.setdefault("IsActive", True)
 
     headers = {
-        "Authorization": auth_token,
         "branchid": LatestBranchId,
         "retailer": retailer,
         "Content-Type": "application/json",
@@ -30,7 +28,7 @@ def add_customer_to_kiotviet(customer_payload: Dict[str, Any]) -> Dict[str, Any]
         "SkipValidateEmail": False,
     }
 
-    response = requests.post(url, headers=headers, json=body, timeout=30)
+    response = kiotviet_client.post(url, headers=headers, json=body, timeout=30)
 
     if response.status_code != 200:
         raise RuntimeError(
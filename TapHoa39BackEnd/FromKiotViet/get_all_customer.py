@@ -1,17 +1,17 @@
-import requests
-from FromKiotViet.get_authorization import auth_token
+import os
+from typing import Any, Dict, Iterator, List
+
+from FromKiotViet.http_client import kiotviet_client
+from FromKiotViet.resource_pager import PAGE_WORKERS, ROW_COUNT_KEY, Page, iter_pages
 from Utility.get_env import LatestBranchId, retailer
 
+CUSTOMERS_URL = "https://api-man1.kiotviet.vn/api/customers"
+# Customers per request; the pages are fetched in parallel (FromKiotViet.resource_pager).
+CUSTOMER_PAGE_SIZE = int(os.getenv("KIOTVIET_CUSTOMER_PAGE_SIZE", "1000"))
 
-def get_entire_customer():
-    url = "https://api-man1.kiotviet.vn/api/customers"
-    payload = {}
-    headers = {
-      'Authorization': auth_token,
-      'branchid': LatestBranchId,
-      'retailer': retailer
-    }
-    param = {
+
+def _customer_params(skip: int, top: int) -> Dict[str, Any]:
+    return {
         "format": "json",
         "Includes": "TotalInvoiced",
         "Includes": "Location",
@@ -26,13 +26,34 @@ def get_entire_customer():
         "NewCustomerDateFilterType":"alltime",
         "NewCustomerLastTradingDateFilterType":"alltime",
         "CustomerBirthDateFilterType":"alltime",
-        "top":10000
+        "skip": skip,
+        "top": top,
         }
-    response = requests.request("GET", url, headers=headers, data=payload, params=param)
-    print(response.status_code)
-    if response.status_code == 200:
-        print(200)
-        data: list = response.json().get("Data", [])
-        return data[1:]
-    else:
-        return None
+
+
+def _fetch_customer_page(page_index: int, page_size: int) -> Dict[str, Any]:
+    headers = {
+      'branchid': LatestBranchId,
+      'retailer': retailer
+    }
+    response = kiotviet_client.get(CUSTOMERS_URL, headers=headers,
+                                   params=_customer_params(page_index * page_size, page_size))
+    response.raise_for_status()
+    body = response.json() or {}
+    rows: list = body.get("Data") or []
+    # Every page starts with the summary row (ForSummaryRow), which is not a customer.
+    # It may count towards "top", so the pager judges a full page by all the rows.
+    data = rows[1:] if rows and not rows[0].get("Id") else rows
+    return {"Data": data, "Total": body.get("Total"), ROW_COUNT_KEY: len(rows)}
+
+
+def iter_customer_pages(page_size: int = CUSTOMER_PAGE_SIZE, workers: int = PAGE_WORKERS) -> Iterator[Page]:
+    """Yield ``(page_index, customers)`` for every page of customers as it arrives."""
+    return iter_pages(lambda page_index: _fetch_customer_page(page_index, page_size),
+                      page_size=page_size, label="khách hàng", workers=workers)
+
+
+def get_entire_customer() -> List[Dict[str, Any]]:
+    customers = [customer for _, page in iter_customer_pages() for customer in page]
+    print(f"Đã lấy {len(customers)} khách hàng từ KiotViet")
+    return customers
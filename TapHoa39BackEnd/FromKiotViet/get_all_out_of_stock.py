@@ -2,9 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional
 
-import requests
-
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 from Utility.get_env import LatestBranchId, retailer
 
 
@@ -12,7 +10,6 @@ BASE_URL = "https://api-man1.kiotviet.vn/api/branchs/{branch_id}/masterproducts"
 
 DEFAULT_HEADERS = {
 	"Accept": "application/json, text/plain, */*",
-	"Authorization": auth_token,
 	"BranchId": str(LatestBranchId),
 	"FingerPrintKey": "211d1f5bb8cc08a94863d2291f1c866d_Chrome_Desktop_Máy tính Windows",
 	"IsUseKvClient": "1",
@@ -89,12 +86,11 @@ def fetch_out_of_stock_master_products(
 	params.update(_build_paging(page, page_size))
 
 	headers = dict(DEFAULT_HEADERS)
-	headers["Authorization"] = auth_token
 	headers["BranchId"] = str(branch)
 	headers["X-RETAILER-CODE"] = retailer
 	headers["Retailer"] = retailer
 
-	response = requests.get(url, headers=headers, params=params, timeout=timeout)
+	response = kiotviet_client.get(url, headers=headers, params=params, timeout=timeout)
 	response.raise_for_status()
 	return response.json()
 
@@ -1,10 +1,9 @@
 from unicodedata import category
-import requests
 import json
 import os
 
 import unidecode
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 from Utility.get_env import LatestBranchId, retailer
 
 # URL API
@@ -14,7 +13,6 @@ def get_items_category(category_id):
     # Headers
 
     header = {
-        "Authorization": auth_token,
         "retailer": retailer,
         "branchid": LatestBranchId
     }
@@ -43,7 +41,7 @@ def get_items_category(category_id):
         "pageSize": 2000,
         "filter[logic]": "and"
     }
-    response = requests.get(productUrl, headers=header, params=param)
+    response = kiotviet_client.get(productUrl, headers=header, params=param)
     if response.status_code == 200:
         data: list = response.json().get("Data", [])
         return data[1:]
@@ -52,7 +50,6 @@ def get_items_category(category_id):
     
 def get_items_out_of_stock():
     header = {
-        "Authorization": auth_token,
         "retailer": retailer,
         "branchid": LatestBranchId
     }
@@ -94,7 +91,7 @@ def get_items_out_of_stock():
         }
     }
 
-    response = requests.get(productUrl, headers=header, params=param)
+    response = kiotviet_client.get(productUrl, headers=header, params=param)
     if response.status_code == 200:
         data: list = response.json().get("Data", [])
         total: int = response.json().get("Total")
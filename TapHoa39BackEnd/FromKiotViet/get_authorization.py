@@ -1,6 +1,20 @@
+import base64
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
 import requests
 from Utility.get_env import UserName, Password, LatestBranchId, retailer
 
+# Used when the token does not carry a readable JWT "exp" claim.
+DEFAULT_TOKEN_TTL_SECONDS = int(os.getenv("KIOTVIET_TOKEN_TTL_SECONDS", str(6 * 3600)))
+# Log in again this long before the token expires.
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("KIOTVIET_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# After a failed login, wait this long before trying again (callers get the old token or None).
+LOGIN_RETRY_AFTER_SECONDS = 15
+
 
 def get_authen_with_credentials(username: str, password: str, branch_id: str, retailer_name: str) -> str:
     """
@@ -52,5 +66,85 @@ def get_authen() -> str:
     return get_authen_with_credentials(UserName, Password, LatestBranchId, retailer)
 
 
-# Cache the token for reuse
-auth_token = get_authen()
\ No newline at end of file
+def _token_expiry(token: str) -> Optional[float]:
+    """Read the ``exp`` claim of a ``Bearer <jwt>`` token without verifying it."""
+    try:
+        payload = token.split(" ", 1)[-1].split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp else None
+    except (IndexError, ValueError, AttributeError, TypeError):
+        return None
+
+
+class KiotVietTokenManager:
+    """Thread-safe holder of the KiotViet bearer token.
+
+    Logs in on first use instead of at import, refreshes shortly before the
+    token expires and, via ``invalidate()``, once more when KiotViet answers 401.
+    """
+
+    def __init__(self, login: Optional[Callable[[], Optional[str]]] = None):
+        self._login = login
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._retry_login_at = 0.0
+
+    def _needs_login(self, now: float) -> bool:
+        return self._token is None or now >= self._expires_at - TOKEN_REFRESH_MARGIN_SECONDS
+
+    def get_token(self) -> Optional[str]:
+        now = time.time()
+        if not self._needs_login(now):
+            return self._token
+        with self._lock:
+            now = time.time()
+            if self._needs_login(now) and now >= self._retry_login_at:
+                self._refresh(now)
+            # A token past the refresh margin is still better than none while KiotViet is unreachable.
+            if self._token is not None and now < self._expires_at:
+                return self._token
+            return None
+
+    def _refresh(self, now: float) -> None:
+        token = (self._login or get_authen)()
+        if not token:
+            self._retry_login_at = now + LOGIN_RETRY_AFTER_SECONDS
+            print("⚠️ Đăng nhập KiotViet thất bại, sẽ thử lại sau.")
+            return
+        self._token = token
+        self._expires_at = _token_expiry(token) or now + DEFAULT_TOKEN_TTL_SECONDS
+        self._retry_login_at = 0.0
+        print("🔑 Đã đăng nhập KiotViet.")
+
+    def invalidate(self, token: Optional[str]) -> None:
+        """Drop ``token`` after a 401; a token another thread already replaced is left alone."""
+        with self._lock:
+            if token is not None and token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+                self._retry_login_at = 0.0
+
+
+token_manager = KiotVietTokenManager()
+
+
+def send_with_token(send: Callable[[Optional[str]], requests.Response]) -> requests.Response:
+    """Call ``send(authorization)``; on 401 log in again and retry once."""
+    token = token_manager.get_token()
+    response = send(token)
+    if response.status_code == 401:
+        token_manager.invalidate(token)
+        fresh = token_manager.get_token()
+        if fresh and fresh != token:
+            response = send(fresh)
+    return response
+
+
+def __getattr__(name):
+    # Backward compatibility for `from FromKiotViet.get_authorization import auth_token`:
+    # resolves (and logs in) when read rather than when this module is imported.
+    if name == "auth_token":
+        return token_manager.get_token()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
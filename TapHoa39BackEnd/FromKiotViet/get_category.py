@@ -2,7 +2,7 @@ import requests
 
 import unidecode
 from Utility.get_env import LatestBranchId, retailer
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 
 
 # URL API for categories
@@ -15,12 +15,11 @@ from FromKiotViet.get_authorization import auth_token
 def get_category():
     url = "https://api-man1.kiotviet.vn/api/categories"
     headers = {
-        "Authorization": auth_token,
         "retailer": retailer,
         "branchid": LatestBranchId
     }
     try:
-        response = requests.get(url, headers=headers)
+        response = kiotviet_client.get(url, headers=headers)
         response.raise_for_status()  # Raise an exception for HTTP errors
         data: list = response.json().get("Data", [])
         if not data:
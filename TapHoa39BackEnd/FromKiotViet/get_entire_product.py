@@ -1,11 +1,9 @@
-import requests
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 from Utility.get_env import LatestBranchId, retailer
 
 url = f"https://api-kvsync1.kiotviet.vn/api/resource/fetch"
   # Headers
 header = {
-      "Authorization": auth_token,
       "retailer": retailer,
       "branchid": LatestBranchId
   }
@@ -16,7 +14,7 @@ param = {
   }
 
 def get_all():
-    response = requests.get(url, headers=header, params=param)
+    response = kiotviet_client.get(url, headers=header, params=param)
     if response.status_code == 200:
         data = response.json()
         raw_items = data.get('Data', [])
@@ -28,7 +26,7 @@ def get_all():
     
 
 def get_deleted_products():
-  response = requests.request("GET", url, headers=header, params=param)
+  response = kiotviet_client.get(url, headers=header, params=param)
   if response.status_code == 200:
       data = response.json()
       raw_items = data.get('Data', [])
@@ -41,7 +39,7 @@ def get_deleted_products():
       return None
     
 def get_inactive_products():
-  response = requests.request("GET", url, headers=header, params=param)
+  response = kiotviet_client.get(url, headers=header, params=param)
   if response.status_code == 200:
       data = response.json()
       raw_items = data.get('Data', [])
@@ -1,6 +1,5 @@
 from unicodedata import category
-import requests
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 from Utility.get_env import LatestBranchId, retailer
 import os
 import json
@@ -10,12 +9,11 @@ def get_item(tearm):
 
     # Headers
     header = {
-        "Authorization": auth_token,
         "retailer": retailer,
         "branchid": LatestBranchId
     }
 
-    response = requests.get(url, headers=header)
+    response = kiotviet_client.get(url, headers=header)
     if response.status_code == 200:
         data = response.json()
         return data
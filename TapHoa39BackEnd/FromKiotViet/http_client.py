@@ -0,0 +1,184 @@
+"""Shared HTTP client for every KiotViet call.
+
+One ``requests.Session`` per process keeps connections to the KiotViet hosts
+alive between calls, so a sync that makes hundreds of requests pays for one
+TLS handshake per connection instead of one per request. On top of it:
+
+- every call has a (connect, read) timeout, ``KIOTVIET_CONNECT_TIMEOUT`` /
+  ``KIOTVIET_READ_TIMEOUT`` unless the caller passes its own read timeout;
+- a token bucket (``KIOTVIET_RATE_PER_SECOND``, ``KIOTVIET_RATE_BURST``)
+  shared by all threads keeps bulk jobs from tripping KiotViet's rate limit;
+- timeouts, connection errors, 429 and 5xx are retried up to
+  ``KIOTVIET_MAX_RETRIES`` times with jittered exponential backoff (or the
+  server's ``Retry-After``). POST and other non-idempotent calls are only
+  retried when the request cannot have reached KiotViet;
+- the Authorization header comes from ``token_manager``; a 401 logs in again
+  and retries once (``send_with_token``).
+
+Usage::
+
+    from FromKiotViet.http_client import kiotviet_client
+
+    response = kiotviet_client.get(url, headers={"retailer": retailer}, params=params)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from FromKiotViet.get_authorization import send_with_token
+from Utility.metrics import metrics
+
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("KIOTVIET_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT_SECONDS = float(os.getenv("KIOTVIET_READ_TIMEOUT", "30"))
+RATE_PER_SECOND = float(os.getenv("KIOTVIET_RATE_PER_SECOND", "8"))
+RATE_BURST = int(os.getenv("KIOTVIET_RATE_BURST", "16"))
+MAX_RETRIES = int(os.getenv("KIOTVIET_MAX_RETRIES", "3"))
+POOL_SIZE = int(os.getenv("KIOTVIET_POOL_SIZE", "20"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+Timeout = Union[None, float, Tuple[float, float]]
+
+metrics.describe("kiotviet_requests_total", "KiotViet API responses, by method and status.")
+metrics.describe("kiotviet_request_seconds", "KiotViet API round trips, by method.")
+metrics.describe("kiotviet_retries_total", "KiotViet API attempts retried, by reason.")
+metrics.describe("kiotviet_throttled_seconds_total", "Time spent waiting for the KiotViet rate limiter.")
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire()`` blocks until a request may go out."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token and return how long the caller waited for it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now and sleep outside the lock: concurrent callers
+            # queue up behind each other instead of all waking at the same moment.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def _backoff_seconds(attempt: int, response: Optional[requests.Response] = None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX_SECONDS, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    # Full jitter: spread the retries of concurrent callers over the whole window.
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+class KiotVietClient:
+    def __init__(self, *, rate: float = RATE_PER_SECOND, burst: int = RATE_BURST,
+                 max_retries: int = MAX_RETRIES, pool_size: int = POOL_SIZE):
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.bucket = TokenBucket(rate, burst)
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """The pooled session of this process (a forked worker opens its own connections)."""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    def request(self, method: str, url: str, *, headers: Optional[Dict[str, Any]] = None,
+                timeout: Timeout = None, retries: Optional[int] = None, authorize: bool = True,
+                **kwargs: Any) -> requests.Response:
+        """Send a KiotViet request; returns the final response (raises only when every attempt failed)."""
+        method = method.upper()
+        if timeout is None:
+            timeout = (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+        elif not isinstance(timeout, tuple):
+            timeout = (CONNECT_TIMEOUT_SECONDS, float(timeout))
+        retries = self.max_retries if retries is None else retries
+
+        def send(token: Optional[str]) -> requests.Response:
+            merged = dict(headers or {})
+            if authorize:
+                merged["Authorization"] = token
+            return self._send(method, url, merged, timeout, retries, kwargs)
+
+        return send_with_token(send) if authorize else send(None)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def _send(self, method: str, url: str, headers: Dict[str, Any], timeout: Tuple[float, float],
+              retries: int, kwargs: Dict[str, Any]) -> requests.Response:
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            if waited:
+                metrics.inc("kiotviet_throttled_seconds_total", waited)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as exc:
+                # A connect timeout never reached KiotViet, so even a POST is safe to resend.
+                safe = idempotent or isinstance(exc, requests.exceptions.ConnectTimeout)
+                if not safe or attempt >= retries:
+                    raise
+                reason = "timeout" if isinstance(exc, requests.exceptions.Timeout) else "connection"
+                delay = _backoff_seconds(attempt)
+                print(f"⚠️ KiotViet {method} lỗi ({type(exc).__name__}), thử lại sau {delay:.1f}s "
+                      f"(lần {attempt + 1}/{retries})")
+            else:
+                metrics.observe("kiotviet_request_seconds", time.perf_counter() - started, {"method": method})
+                metrics.inc("kiotviet_requests_total", labels={"method": method, "status": response.status_code})
+                # 429 means KiotViet rejected the request without processing it.
+                retryable = response.status_code in RETRY_STATUSES and (idempotent or response.status_code == 429)
+                if not retryable or attempt >= retries:
+                    return response
+                reason = str(response.status_code)
+                delay = _backoff_seconds(attempt, response)
+                print(f"⚠️ KiotViet {method} trả về {response.status_code}, thử lại sau {delay:.1f}s "
+                      f"(lần {attempt + 1}/{retries})")
+                response.close()
+            metrics.inc("kiotviet_retries_total", labels={"reason": reason})
+            attempt += 1
+            time.sleep(delay)
+
+
+kiotviet_client = KiotVietClient()
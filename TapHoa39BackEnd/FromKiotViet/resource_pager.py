@@ -0,0 +1,197 @@
+"""Concurrent pager for the KiotViet list APIs.
+
+``iter_pages()`` works with any endpoint that answers ``{"Data": [...],
+"Total": n}`` for a page index; ``iter_resource_pages()`` wraps it for the
+``resource/fetch`` API (products), ``FromKiotViet.get_all_customer`` for
+customers. Page 0 is fetched first to learn ``Total``; the remaining pages are
+then requested together on a small thread pool, so pulling the whole list
+takes roughly one page latency per ``KIOTVIET_PAGE_WORKERS`` pages instead of
+one per page. ``kiotviet_client`` still applies its rate limit and retries to
+every page.
+
+Pages are yielded in the order they arrive, not by page index. Ids already
+seen on an earlier page are dropped, and after ``MAX_DUPLICATE_PAGES`` pages
+of nothing but duplicates the pager stops (KiotViet sometimes keeps returning
+the last page for out-of-range indexes).
+
+Whether more pages follow is decided from the rows the endpoint returned: a
+``fetch`` that drops rows before handing the page over (the customer summary
+row) reports the raw count as ``"RowCount"``, so a page shortened that way
+still counts as full.
+
+A page that still fails after the client's retries makes the pager raise
+``IncompleteListingError`` once the pages it could fetch have been yielded,
+so callers never take a partial listing for the whole one.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+from FromKiotViet.http_client import kiotviet_client
+
+RESOURCE_FETCH_URL = "https://api-kvsync1.kiotviet.vn/api/resource/fetch"
+PAGE_WORKERS = int(os.getenv("KIOTVIET_PAGE_WORKERS", "6"))
+MAX_DUPLICATE_PAGES = 3
+
+Page = Tuple[int, List[Dict[str, Any]]]
+# Optional page body key: rows KiotViet returned, when ``fetch`` removed some from "Data".
+ROW_COUNT_KEY = "RowCount"
+
+
+class IncompleteListingError(RuntimeError):
+    """Pages ``failed_pages`` of ``label`` could not be fetched; the listing is incomplete."""
+
+    def __init__(self, label: str, failed_pages: List[int]):
+        self.label = label
+        self.failed_pages = sorted(failed_pages)
+        super().__init__(f"Không tải được {len(self.failed_pages)} trang {label}: {self.failed_pages}")
+
+
+class PageFilter:
+    """Drops ids seen on earlier pages and counts consecutive all-duplicate pages."""
+
+    def __init__(self):
+        self.seen_ids: Set[str] = set()
+        self.duplicate_pages = 0
+
+    def unique(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        unique_items = []
+        for item in items:
+            item_id = item.get("Id") if isinstance(item, dict) else None
+            if item_id is None or str(item_id) in self.seen_ids:
+                continue
+            self.seen_ids.add(str(item_id))
+            unique_items.append(item)
+        self.duplicate_pages = 0 if unique_items else self.duplicate_pages + 1
+        return unique_items
+
+    @property
+    def exhausted(self) -> bool:
+        return self.duplicate_pages >= MAX_DUPLICATE_PAGES
+
+
+def _fetch_page(url: str, resource: str, client_id: str, page_index: int, page_size: int,
+                headers: Optional[Dict[str, Any]], timeout: float,
+                extra_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    params = {
+        **(extra_params or {}),
+        "clientId": client_id,
+        "resourceName": resource,
+        "pageSize": page_size,
+        "pageIndex": page_index,
+    }
+    response = kiotviet_client.get(url, params=params, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.json() or {}
+
+
+def iter_resource_pages(resource: str, *, client_id: str, page_size: int,
+                        headers: Optional[Dict[str, Any]] = None, url: str = RESOURCE_FETCH_URL,
+                        timeout: float = 45, workers: int = PAGE_WORKERS,
+                        params: Optional[Dict[str, Any]] = None) -> Iterator[Page]:
+    """Yield ``(page_index, new_items)`` for every page of ``resource`` as it arrives.
+
+    ``params`` are sent with every page request (e.g. a modified-since filter).
+    """
+    def fetch(page_index: int) -> Dict[str, Any]:
+        return _fetch_page(url, resource, client_id, page_index, page_size, headers, timeout, params)
+
+    return iter_pages(fetch, page_size=page_size, label=resource, workers=workers)
+
+
+def iter_pages(fetch: Callable[[int], Dict[str, Any]], *, page_size: int, label: str,
+               workers: int = PAGE_WORKERS) -> Iterator[Page]:
+    """Yield ``(page_index, new_items)`` for every page ``fetch(page_index)`` returns, as it arrives.
+
+    ``fetch`` raises ``requests`` exceptions on failure; ``label`` names the records in log lines.
+    Raises ``IncompleteListingError`` when a page could not be fetched.
+    """
+    page_filter = PageFilter()
+
+    def is_full(body: Dict[str, Any], items: List[Dict[str, Any]]) -> bool:
+        return (body.get(ROW_COUNT_KEY) or len(items)) >= page_size
+
+    def accept(page_index: int, items: List[Dict[str, Any]]) -> Optional[Page]:
+        unique_items = page_filter.unique(items)
+        if not unique_items:
+            print(f"  Trang {page_index} chỉ chứa {label} trùng "
+                  f"({page_filter.duplicate_pages}/{MAX_DUPLICATE_PAGES}).")
+            return None
+        return page_index, unique_items
+
+    try:
+        first = fetch(0)
+    except requests.exceptions.RequestException as exc:
+        print(f"❌ Không thể fetch trang 0: {exc}")
+        raise IncompleteListingError(label, [0]) from exc
+    items = first.get("Data") or []
+    if not items:
+        return
+    page = accept(0, items)
+    if page:
+        yield page
+
+    total = first.get("Total") or first.get("total")
+    next_index = 1
+    last_page_full = is_full(first, items)
+    if total and workers > 1 and last_page_full:
+        page_count = math.ceil(int(total) / page_size)
+        if page_count > 1:
+            print(f"  {label}: {total} bản ghi, {page_count} trang, tải song song {min(workers, page_count - 1)} luồng.")
+        executor = ThreadPoolExecutor(max_workers=min(workers, max(1, page_count - 1)),
+                                      thread_name_prefix="kiotviet-pager")
+        failed_pages: List[int] = []
+        try:
+            futures = {executor.submit(fetch, index): index for index in range(1, page_count)}
+            for future in as_completed(futures):
+                page_index = futures[future]
+                try:
+                    body = future.result()
+                except requests.exceptions.RequestException as exc:
+                    # Keep yielding the other pages; the caller learns about this one at the end.
+                    print(f"❌ Không thể fetch trang {page_index}: {exc}")
+                    failed_pages.append(page_index)
+                    continue
+                items = body.get("Data") or []
+                if page_index == page_count - 1:
+                    last_page_full = is_full(body, items)
+                if not items:
+                    continue
+                page = accept(page_index, items)
+                if page:
+                    yield page
+                elif page_filter.exhausted:
+                    print("  Đã gặp quá nhiều trang trùng lặp, dừng phân trang.")
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if failed_pages:
+            raise IncompleteListingError(label, failed_pages)
+        if page_filter.exhausted:
+            return
+        next_index = page_count
+
+    # No Total to plan with, or more rows appeared while paging: walk on one page at a time.
+    while last_page_full:
+        try:
+            body = fetch(next_index)
+        except requests.exceptions.RequestException as exc:
+            print(f"❌ Không thể fetch trang {next_index}: {exc}")
+            raise IncompleteListingError(label, [next_index]) from exc
+        items = body.get("Data") or []
+        if not items:
+            return
+        page = accept(next_index, items)
+        if page:
+            yield page
+        elif page_filter.exhausted:
+            print("  Đã gặp quá nhiều trang trùng lặp, dừng phân trang.")
+            return
+        last_page_full = is_full(body, items)
+        next_index += 1
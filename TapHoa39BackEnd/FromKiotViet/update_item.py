@@ -1,7 +1,7 @@
 import json
 import requests
 from Utility.get_env import LatestBranchId, retailer
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
 
 # URL API for categories
 url = "https://api-man1.kiotviet.vn/api/products/photo"
@@ -23,14 +23,13 @@ payload = {'Product': f'{{"Id":38080826,"ProductType":2,"CategoryId":1436920,"Ca
 'ListUnitPriceBookDetail': '[]'}
 
 headers = {
-  'Authorization': auth_token,
   'retailer': retailer,
   'branchid': LatestBranchId
 }
 
 def set_data():
     try:
-        response = requests.post(url, headers=headers, data=payload )
+        response = kiotviet_client.post(url, headers=headers, data=payload)
         response.raise_for_status()  # Raise an exception for HTTP errors
         print("Response:", response.json())
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,298 @@
+"""Background jobs for operations that outlive an HTTP request.
+
+A KiotViet sync or an aggregate refresh can take minutes; run inline, it ties
+up a request thread, runs into proxy timeouts and starts a second copy when
+somebody presses the button again. ``job_runner.submit()`` instead records a
+job and runs it on a small worker pool (``JOB_WORKERS``):
+
+- at most one job per ``job_type`` is queued or running per host: submitting
+  while one is active returns the active job (``created`` is False) instead of
+  starting another one;
+- jobs live in a SQLite file (``JOB_STORE_PATH``, default: the system temp
+  dir) shared by the worker processes of one host, so ``GET /api/jobs/<id>``
+  answers whichever worker the request lands on;
+- the running job can call ``report_progress(**fields)`` (a no-op outside a
+  job) to publish progress;
+- a running job whose process died stops heart-beating and is marked failed
+  after ``JOB_STALE_SECONDS``, which frees its type for a new job.
+
+Job status: ``queued`` -> ``running`` -> ``succeeded`` | ``failed``. A job
+whose function returns a dict with ``"success": False`` counts as failed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from Utility.metrics import metrics
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "taphoa39-jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# How long a sync endpoint waits for its job before answering 202 with the job id.
+JOB_WAIT_SECONDS = float(os.getenv("JOB_WAIT_SECONDS", "20"))
+JOB_HEARTBEAT_SECONDS = 15.0
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "72"))
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_type_status ON jobs (type, status);
+"""
+
+metrics.describe("jobs_total", "Background jobs finished, by type and status.")
+metrics.describe("job_duration_seconds", "Background job run time, by type.")
+
+
+def _dumps(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _loads(raw: Optional[str]) -> Any:
+    return None if raw is None else json.loads(raw)
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call, as in Utility.sync_ledger.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for key in ("params", "progress", "result"):
+            job[key] = _loads(job[key])
+        job.pop("heartbeat_at", None)
+        return job
+
+    def claim(self, job_type: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], bool]:
+        """Create a queued job of ``job_type`` unless one is already active; returns ``(job, created)``."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front: two workers cannot both see "no active job".
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                    "WHERE type = ? AND status IN ('queued', 'running') AND heartbeat_at < ?",
+                    ("Tiến trình chạy job đã dừng (mất heartbeat)", now, job_type, now - JOB_STALE_SECONDS),
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE type = ? AND status IN ('queued', 'running') "
+                    "ORDER BY created_at LIMIT 1",
+                    (job_type,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return self._to_dict(row), False
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, type, status, params, created_at, heartbeat_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                    (job_id, job_type, _dumps(params or {}), now, now),
+                )
+                conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                    (now - JOB_RETENTION_HOURS * 3600,),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id), True
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if not fields:
+            return
+        fields["heartbeat_at"] = time.time()
+        for key in ("params", "progress", "result"):
+            if key in fields:
+                fields[key] = _dumps(fields[key])
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with closing(self._connect()) as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        if not job_ids:
+            return
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(now, job_id) for job_id in job_ids])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def recent(self, job_type: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM jobs"
+        args: Tuple[Any, ...] = ()
+        if job_type:
+            query += " WHERE type = ?"
+            args = (job_type,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, (*args, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+_current = threading.local()
+
+
+def report_progress(**fields: Any) -> None:
+    """Merge ``fields`` into the progress of the job running on this thread (no-op outside a job)."""
+    job = getattr(_current, "job", None)
+    if job is None:
+        return
+    runner, job_id, progress = job
+    progress.update(fields)
+    try:
+        runner.store.update(job_id, progress=progress)
+    except sqlite3.Error as exc:
+        print(f"⚠️ Không lưu được tiến độ job {job_id}: {exc}")
+
+
+class JobRunner:
+    def __init__(self, path: Optional[str] = None, max_workers: int = JOB_WORKERS):
+        self._path = path
+        self.max_workers = max(1, max_workers)
+        self._store: Optional[JobStore] = None
+        self._store_path: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._running: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def store(self) -> JobStore:
+        # Resolved on use, so OfflineEnvironment/tests can point JOB_STORE_PATH elsewhere.
+        path = self._path or os.getenv("JOB_STORE_PATH") or DEFAULT_PATH
+        if self._store is None or self._store_path != path:
+            with self._lock:
+                if self._store is None or self._store_path != path:
+                    self._store = JobStore(path)
+                    self._store_path = path
+        return self._store
+
+    def _pool(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        with self._lock:
+            # A forked worker inherits the parent's executor object but not its threads.
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+                self._executor_pid = pid
+                self._running = {}
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def submit(self, job_type: str, func: Callable[..., Any], *args: Any,
+               params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Tuple[Dict[str, Any], bool]:
+        """Queue ``func(*args, **kwargs)`` as a ``job_type`` job; returns ``(job, created)``."""
+        job, created = self.store.claim(job_type, params)
+        if created:
+            executor = self._pool()
+            with self._lock:
+                self._running[job["id"]] = threading.Event()
+            executor.submit(self._run, job["id"], job_type, func, args, kwargs)
+            print(f"🧵 Đã tạo job {job_type} {job['id']}")
+        else:
+            print(f"🧵 Job {job_type} đang chạy ({job['id']}), không tạo job mới")
+        return job, created
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def recent(self, job_type: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.store.recent(job_type, limit)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once finished, or as it stands after ``timeout`` seconds."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            job = self.store.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            done = self._running.get(job_id)
+            if done is not None:
+                done.wait(remaining)
+            else:
+                # Running in another worker process: poll the store.
+                time.sleep(min(0.5, remaining))
+
+    def _run(self, job_id: str, job_type: str, func: Callable[..., Any], args: Tuple[Any, ...],
+             kwargs: Dict[str, Any]) -> None:
+        started = time.time()
+        self.store.update(job_id, status="running", started_at=started)
+        _current.job = (self, job_id, {})
+        status = "failed"
+        try:
+            result = func(*args, **kwargs)
+            if isinstance(result, dict) and result.get("success") is False:
+                error = result.get("error") or result.get("message") or "Job thất bại"
+                self.store.update(job_id, status=status, result=result, error=str(error), finished_at=time.time())
+            else:
+                status = "succeeded"
+                self.store.update(job_id, status=status, result=result, finished_at=time.time())
+        except Exception as exc:
+            traceback.print_exc()
+            self.store.update(job_id, status=status, error=f"{type(exc).__name__}: {exc}", finished_at=time.time())
+        finally:
+            _current.job = None
+            elapsed = time.time() - started
+            metrics.inc("jobs_total", labels={"type": job_type, "status": status})
+            metrics.observe("job_duration_seconds", elapsed, {"type": job_type})
+            print(f"🧵 Job {job_type} {job_id} {status} sau {elapsed:.1f}s")
+            with self._lock:
+                done = self._running.pop(job_id, None)
+            if done is not None:
+                done.set()
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                job_ids = list(self._running)
+            try:
+                self.store.heartbeat(job_ids)
+            except sqlite3.Error as exc:
+                print(f"⚠️ Không cập nhật được heartbeat job: {exc}")
+
+
+job_runner = JobRunner()
@@ -0,0 +1,128 @@
+"""Incremental parser for ``{"Total": ..., "Data": [ ...huge array... ]}`` responses.
+
+``response.json()`` on the 20k-product KiotViet payload keeps the raw body,
+the decoded list and whatever the caller builds from it in memory together.
+``JsonArrayStream`` reads the body chunk by chunk and yields the items of one
+top-level array as soon as each is complete, so only the current chunk and
+the current item are held at any time.
+
+    stream = JsonArrayStream(response.iter_content(65536), key="Data")
+    for item in stream:
+        ...
+    stream.meta.get("Total")   # other top-level fields, complete after iteration
+
+Only the top level is walked by hand; every item (and every other top-level
+value) is decoded by the stdlib ``json`` decoder.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, Dict, Iterable, Iterator, Union
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class JsonArrayStream:
+    def __init__(self, chunks: Iterable[Union[bytes, str]], key: str = "Data"):
+        self.key = key
+        self.meta: Dict[str, Any] = {}
+        self.count = 0
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    # -- Buffer ----------------------------------------------------------
+    def _fill(self) -> bool:
+        """Append the next chunk; False once the input is exhausted."""
+        if self._eof:
+            return False
+        # Drop what has been consumed so the buffer stays about one chunk long.
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+            if text:
+                self._buffer += text
+                return True
+        self._buffer += self._utf8.decode(b"", final=True)
+        self._eof = True
+        return False
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, without consuming it ("" at end of input)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON stream: expected {char!r}, found {found or 'end of input'!r} "
+                             f"at offset {self._pos}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """Decode one complete JSON value at the current position."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the next chunk: "1" of "15", or "1" of "1.5" when the
+            # chunk ends after "1." (the decoder stops before a dangling ".", "e" or sign).
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and not self._eof:
+                tail = end
+                while tail < len(self._buffer) and self._buffer[tail] in _NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self._buffer) and self._fill():
+                    continue
+            self._pos = end
+            return value
+
+    # -- Top level ---------------------------------------------------------
+    def __iter__(self) -> Iterator[Any]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if name == self.key and self._peek() == "[":
+                yield from self._array_items()
+            else:
+                self.meta[name] = self._value()
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return
+
+    def _array_items(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            item = self._value()
+            self.count += 1
+            yield item
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("]")
+            return
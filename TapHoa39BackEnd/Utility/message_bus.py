@@ -0,0 +1,196 @@
+"""Small publish/subscribe bus between the worker processes of one host.
+
+Every worker keeps its own caches (and, later, its own Socket.IO clients), so
+a write handled by worker A must tell the other workers about it. Messages
+are JSON objects published on a named channel; subscribers of that channel in
+the *other* processes receive them. The publisher has already applied the
+change locally.
+
+Backends (env ``MESSAGE_BUS_BACKEND``):
+    local  single process, publish() is a no-op (default, ``python -m app``)
+    unix   one Unix datagram socket per process in ``MESSAGE_BUS_DIR``;
+           publish() sends the message to every other socket in the directory
+
+``serve.py`` picks ``unix`` automatically when it starts more than one worker.
+Delivery is best effort: a message that cannot be sent (peer gone, receive
+buffer full) is counted in ``message_bus_dropped_total`` and the affected
+cache entries simply expire on their TTL.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from Utility.metrics import metrics
+
+Handler = Callable[[Dict[str, Any]], None]
+
+# Unix datagrams above ~200KB are rejected by the default socket buffers.
+MAX_MESSAGE_BYTES = 128 * 1024
+PEER_REFRESH_SECONDS = 1.0
+
+metrics.describe("message_bus_published_total", "Messages sent to other worker processes, by channel.")
+metrics.describe("message_bus_received_total", "Messages received from other worker processes, by channel.")
+metrics.describe("message_bus_dropped_total", "Messages that could not be delivered to a peer, by channel.")
+
+
+class LocalBus:
+    """Single-process bus: keeps the subscriber table, publishes nowhere."""
+
+    backend = "local"
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._handlers_lock = threading.Lock()
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        with self._handlers_lock:
+            handlers = self._handlers.setdefault(channel, [])
+            if handler not in handlers:
+                handlers.append(handler)
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        return None
+
+    def peers(self) -> List[str]:
+        return []
+
+    def _dispatch(self, channel: str, payload: Dict[str, Any]) -> None:
+        with self._handlers_lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception as exc:  # pragma: no cover - one bad handler must not stop the receiver
+                print(f"⚠️ Message bus handler lỗi ({channel}): {exc}")
+
+
+class UnixDatagramBus(LocalBus):
+    """One ``<pid>.sock`` per process; publish() fans out to the other sockets."""
+
+    backend = "unix"
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._path: Optional[str] = None
+        self._send_socket: Optional[socket.socket] = None
+        self._peers: List[str] = []
+        self._peers_loaded_at = 0.0
+
+    def _ensure_started(self) -> None:
+        """Bind this process's socket; re-binds after a fork so each worker gets its own."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            path = os.path.join(self.directory, f"{pid}.sock")
+            if os.path.exists(path):
+                os.unlink(path)
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(path)
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.setblocking(False)
+            self._path = path
+            self._send_socket = sender
+            self._peers_loaded_at = 0.0
+            self._pid = pid
+            atexit.register(self._remove_socket_file, path)
+            thread = threading.Thread(target=self._receive_loop, args=(receiver,), name="message-bus", daemon=True)
+            thread.start()
+
+    @staticmethod
+    def _remove_socket_file(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        super().subscribe(channel, handler)
+        self._ensure_started()
+
+    def peers(self) -> List[str]:
+        now = time.monotonic()
+        if now - self._peers_loaded_at >= PEER_REFRESH_SECONDS:
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                names = []
+            self._peers = [
+                os.path.join(self.directory, name) for name in names
+                if name.endswith(".sock") and os.path.join(self.directory, name) != self._path
+            ]
+            self._peers_loaded_at = now
+        return self._peers
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        self._ensure_started()
+        data = json.dumps({"channel": channel, "origin": self._pid, "payload": payload},
+                          separators=(",", ":"), default=str).encode("utf-8")
+        if len(data) > MAX_MESSAGE_BYTES:
+            raise ValueError(f"message bus payload too large ({len(data)} bytes) on channel {channel}")
+
+        labels = {"channel": channel}
+        for peer in list(self.peers()):
+            try:
+                self._send_socket.sendto(data, peer)
+                metrics.inc("message_bus_published_total", labels=labels)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker behind this socket exited without cleaning up.
+                self._remove_socket_file(peer)
+                self._peers_loaded_at = 0.0
+                metrics.inc("message_bus_dropped_total", labels=labels)
+            except OSError as exc:
+                metrics.inc("message_bus_dropped_total", labels=labels)
+                print(f"⚠️ Message bus không gửi được tới {os.path.basename(peer)}: {exc}")
+
+    def _receive_loop(self, receiver: socket.socket) -> None:
+        while True:
+            try:
+                data = receiver.recv(MAX_MESSAGE_BYTES + 1024)
+                message = json.loads(data.decode("utf-8"))
+            except Exception as exc:  # pragma: no cover - keep listening whatever arrives
+                print(f"⚠️ Message bus nhận lỗi: {exc}")
+                continue
+            channel = message.get("channel")
+            metrics.inc("message_bus_received_total", labels={"channel": channel})
+            self._dispatch(channel, message.get("payload") or {})
+
+
+_bus: Optional[LocalBus] = None
+_bus_lock = threading.Lock()
+
+
+def create_bus(backend: Optional[str] = None, directory: Optional[str] = None) -> LocalBus:
+    backend = (backend or os.getenv("MESSAGE_BUS_BACKEND", "local")).strip().lower()
+    if backend == "local":
+        return LocalBus()
+    if backend == "unix":
+        directory = directory or os.getenv("MESSAGE_BUS_DIR") or os.path.join(tempfile.gettempdir(), "taphoa39-bus")
+        return UnixDatagramBus(directory)
+    raise ValueError(f"Unknown MESSAGE_BUS_BACKEND: {backend!r} (expected local or unix)")
+
+
+def get_bus() -> LocalBus:
+    """Process-wide bus, created from the environment on first use."""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = create_bus()
+                if _bus.backend != "local":
+                    print(f"📡 Message bus: {_bus.backend} ({getattr(_bus, 'directory', '')})")
+    return _bus
@@ -0,0 +1,195 @@
+"""In-process metrics: latency histograms, counters and gauges.
+
+Metrics live in the current process only and are rendered in the Prometheus
+text exposition format by ``routes/metrics_routes.py``.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+METRIC_PREFIX = "taphoa39_"
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+QUANTILES: Tuple[float, ...] = (0.5, 0.95, 0.99)
+RECENT_SAMPLES = 2048
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+    if not labels:
+        return ()
+    return tuple(sorted((str(key), str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Bucketed latency histogram that also keeps recent samples for percentiles."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+        self.recent: deque = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.bucket_counts):
+            self.bucket_counts[index] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self, quantiles: Tuple[float, ...] = QUANTILES) -> Dict[float, float]:
+        samples = sorted(self.recent)
+        if not samples:
+            return {}
+        size = len(samples)
+        return {q: samples[min(size - 1, max(0, math.ceil(q * size) - 1))] for q in quantiles}
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        rows: List[Tuple[str, int]] = []
+        running = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            running += count
+            rows.append((_format_value(bound), running))
+        rows.append(("+Inf", self.count))
+        return rows
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = METRIC_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = float(value)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]) -> None:
+        """Register a callback yielding ``(name, type, help, labels, value)`` rows at render time."""
+        self._collectors.append(collector)
+
+    def latency_summary(self, name: str) -> List[Dict[str, Any]]:
+        """Return count/avg/p50/p95/p99 (in milliseconds) for every label set of a histogram."""
+        with self._lock:
+            series = dict(self._histograms.get(name, {}))
+            rows = []
+            for key, histogram in series.items():
+                quantiles = histogram.quantiles()
+                rows.append({
+                    **dict(key),
+                    "count": histogram.count,
+                    "avg_ms": round(histogram.total / histogram.count * 1000, 2) if histogram.count else 0.0,
+                    "p50_ms": round(quantiles.get(0.5, 0.0) * 1000, 2),
+                    "p95_ms": round(quantiles.get(0.95, 0.0) * 1000, 2),
+                    "p99_ms": round(quantiles.get(0.99, 0.0) * 1000, 2),
+                })
+        rows.sort(key=lambda row: row["p95_ms"], reverse=True)
+        return rows
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                full = self.prefix + name
+                self._header(lines, name, full, "histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{full}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {_format_value(histogram.total)}")
+                    lines.append(f"{full}_count{_format_labels(key)} {histogram.count}")
+
+                quantile_name = f"{full}_recent"
+                lines.append(f"# HELP {quantile_name} Percentiles over the last {RECENT_SAMPLES} samples.")
+                lines.append(f"# TYPE {quantile_name} gauge")
+                for key, histogram in sorted(series.items()):
+                    for q, value in histogram.quantiles().items():
+                        lines.append(f"{quantile_name}{_format_labels(key, [('quantile', str(q))])} {_format_value(value)}")
+
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    full = self.prefix + name
+                    self._header(lines, name, full, kind)
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{full}{_format_labels(key)} {_format_value(value)}")
+
+            collectors = list(self._collectors)
+
+        # Samples of one metric family must be contiguous in the exposition format.
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in collectors:
+            try:
+                rows = list(collector())
+            except Exception as exc:  # pragma: no cover - never break the scrape
+                print(f"⚠️ Metrics collector failed: {exc}")
+                continue
+            for name, kind, help_text, labels, value in rows:
+                full = self.prefix + name
+                family = families.setdefault(full, (kind, help_text, []))
+                family[2].append(f"{full}{_format_labels(_label_key(labels))} {_format_value(value)}")
+
+        for full, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, full: str, kind: str) -> None:
+        help_text = self._help.get(name)
+        if help_text:
+            lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+
+
+metrics = MetricsRegistry()
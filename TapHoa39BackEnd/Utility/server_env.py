@@ -0,0 +1,28 @@
+"""Environment handling and startup banner shared by ``python -m app`` and ``python -m serve``.
+
+Kept free of Flask/Firestore imports: ``serve`` reads it in the gunicorn
+master, before any worker is forked.
+"""
+
+import os
+
+
+def get_env_name():
+    return os.getenv("e", "prod")
+
+
+def get_port(env_name=None):
+    """SERVER_PORT wins; otherwise 8000 in prod and 5000 locally (as before)."""
+    explicit = os.getenv("SERVER_PORT")
+    if explicit:
+        return int(explicit)
+    return 8000 if (env_name or get_env_name()) == "prod" else 5000
+
+
+def print_banner(env_name, port, server_line, socketio_line):
+    print(f"\n{'='*60}")
+    print(f"Starting server in {env_name.upper()} mode on port {port}")
+    print(f"Server: {server_line}")
+    print(f"Socket.IO: {socketio_line}")
+    print(f"Server URL: http://0.0.0.0:{port}")
+    print(f"{'='*60}\n")
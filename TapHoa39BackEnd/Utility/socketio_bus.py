@@ -0,0 +1,57 @@
+"""Socket.IO client manager that fans emits out over ``Utility.message_bus``.
+
+With several workers each one only knows its own Socket.IO clients. Passing
+``create_client_manager()`` as ``client_manager`` makes every
+``socketio.emit`` reach the clients of the other workers too: the emit is
+delivered locally and published on the bus, and the other workers replay it
+to their own clients (python-socketio's ``PubSubManager`` protocol).
+
+On the local (single process) bus no manager is installed and Socket.IO
+behaves exactly as before.
+"""
+
+from __future__ import annotations
+
+import queue
+from typing import Any, Dict, Optional
+
+import socketio
+
+from Utility.message_bus import get_bus
+
+SOCKETIO_CHANNEL = "socketio"
+
+
+class MessageBusManager(socketio.PubSubManager):
+    name = "message-bus"
+
+    def __init__(self, bus, channel: str = SOCKETIO_CHANNEL, write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus
+        self._inbox: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    def initialize(self):
+        # python-socketio calls this when the first client connects to this worker;
+        # until then there is nobody to replay remote emits to, so do not queue them.
+        if not self.write_only:
+            self.bus.subscribe(self.channel, self._inbox.put)
+        super().initialize()
+
+    def _publish(self, data: Dict[str, Any]) -> None:
+        try:
+            self.bus.publish(self.channel, data)
+        except ValueError as exc:
+            # Already delivered to this worker's clients; the others miss this one emit.
+            print(f"⚠️ Socket.IO emit không gửi được sang worker khác: {exc}")
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def create_client_manager(bus=None) -> Optional[MessageBusManager]:
+    """Manager for ``SocketIO(client_manager=...)``, or None when there is a single process."""
+    bus = bus or get_bus()
+    if bus.backend == "local":
+        return None
+    return MessageBusManager(bus)
@@ -0,0 +1,238 @@
+"""On-disk ledger of the checksums the KiotViet sync last wrote to Firestore.
+
+A full product sync has to know the ``SyncChecksum`` of every Firestore
+document to decide what changed; reading it back costs one document read per
+product per sync. The ledger keeps ``id -> checksum`` in a local SQLite file
+instead:
+
+- the sync records the checksums of each batch right after the batch commit
+  succeeded (one SQLite transaction per batch);
+- the backend's other write paths call ``forget()`` for the ids they touched,
+  so the next sync treats them as changed and rewrites them, and clear the
+  doc's ``SyncChecksum`` in the same write (``CLEARED_CHECKSUM``) so a
+  verification sees them as changed too;
+- once every ``SYNC_LEDGER_VERIFY_HOURS`` (or when the file is new) the sync
+  reads the checksums from Firestore as before and ``replace_all()`` resets
+  the ledger to them, which also repairs anything changed behind our back
+  (e.g. by the apps writing to Firestore directly).
+
+The file lives at ``SYNC_LEDGER_PATH`` (default: the system temp dir) and is
+shared by the worker processes of one host; SQLite's WAL mode lets them read
+while one writes. Losing the file only costs one verification read.
+
+The ledger assumes one host: the syncs and the app writes of a collection run
+on the host that owns the file (or all hosts point ``SYNC_LEDGER_PATH`` at the
+same one). A ``forget()`` on another host never reaches it; such a write is
+only picked up by the next verification, through the cleared ``SyncChecksum``.
+To keep syncs that move between hosts from trusting a stale file, each file
+gets a random ``ledger_id``: a verification ``claim()``s the collection's
+sync state doc (``SyncState/<namespace>``, field ``ledger_id``), and a ledger
+that is not the one named there verifies before it is trusted.
+
+Next to what was written, the ledger keeps the *source* snapshot: checksum
+and a few display fields of every record as KiotViet last returned it
+(``record_source()`` during a sync; a full sync ends with ``prune_source()``,
+dropping what KiotViet no longer returns). The compare report diffs the two
+without fetching either side again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "taphoa39-sync-ledger.sqlite3")
+VERIFY_INTERVAL_HOURS = float(os.getenv("SYNC_LEDGER_VERIFY_HOURS", "24"))
+# Firestore collection of the per-collection sync state docs, and the field naming
+# the ledger that saw the latest write.
+SYNC_STATE_COLLECTION = "SyncState"
+STATE_LEDGER_FIELD = "ledger_id"
+# Merged into the payload of writes outside the sync: a doc without a checksum is
+# compared as changed by every verification, at no extra write.
+CLEARED_CHECKSUM = {"SyncChecksum": None}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checksums (
+    namespace TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, doc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    namespace TEXT PRIMARY KEY,
+    verified_at REAL
+);
+CREATE TABLE IF NOT EXISTS source_items (
+    namespace TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    details TEXT,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (namespace, doc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS source_meta (
+    namespace TEXT PRIMARY KEY,
+    updated_at REAL,
+    complete_at REAL
+);
+CREATE TABLE IF NOT EXISTS ledger_file (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SyncLedger:
+    def __init__(self, path: str, namespace: str):
+        self.path = path
+        self.namespace = namespace
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            with conn:
+                # Created with the file: a new file (new host, lost temp dir) is a new ledger.
+                conn.execute("INSERT OR IGNORE INTO ledger_file (key, value) VALUES ('ledger_id', ?)",
+                             (uuid.uuid4().hex,))
+            self.ledger_id = conn.execute("SELECT value FROM ledger_file WHERE key = 'ledger_id'").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call: safe across threads and forked workers.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def load(self) -> Dict[str, str]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT doc_id, checksum FROM checksums WHERE namespace = ?", (self.namespace,))
+            return dict(rows)
+
+    def record(self, entries: Iterable[Tuple[str, str]]) -> None:
+        """Store checksums of documents that were just committed to Firestore."""
+        now = time.time()
+        rows = [(self.namespace, str(doc_id), checksum, now) for doc_id, checksum in entries]
+        if not rows:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO checksums (namespace, doc_id, checksum, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def forget(self, doc_ids: Iterable[str]) -> None:
+        """Drop ids written outside the sync; they will be compared as changed next time."""
+        rows = [(self.namespace, str(doc_id)) for doc_id in doc_ids]
+        if not rows:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("DELETE FROM checksums WHERE namespace = ? AND doc_id = ?", rows)
+
+    def claim(self, state_ref) -> None:
+        """Name this ledger, just verified, in the sync state doc ``state_ref``."""
+        state_ref.set({STATE_LEDGER_FIELD: self.ledger_id}, merge=True)
+
+    def replace_all(self, checksums: Dict[str, Optional[str]]) -> None:
+        """Reset the ledger to what Firestore holds and mark it verified."""
+        now = time.time()
+        rows = [(self.namespace, str(doc_id), checksum, now) for doc_id, checksum in checksums.items() if checksum]
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM checksums WHERE namespace = ?", (self.namespace,))
+            conn.executemany(
+                "INSERT INTO checksums (namespace, doc_id, checksum, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO ledger_meta (namespace, verified_at) VALUES (?, ?)",
+                (self.namespace, now),
+            )
+
+    def verified_at(self) -> Optional[float]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT verified_at FROM ledger_meta WHERE namespace = ?", (self.namespace,)).fetchone()
+        return row[0] if row else None
+
+    def needs_verification(self, state: Optional[Dict[str, Any]] = None,
+                           interval_hours: float = VERIFY_INTERVAL_HOURS) -> bool:
+        """True when due, or when ``state`` (the sync state doc) names another ledger."""
+        if state is not None and state.get(STATE_LEDGER_FIELD) != self.ledger_id:
+            return True
+        verified_at = self.verified_at()
+        return verified_at is None or time.time() - verified_at >= interval_hours * 3600
+
+    def invalidate(self) -> None:
+        """Force the next sync to verify against Firestore."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM ledger_meta WHERE namespace = ?", (self.namespace,))
+
+    # -- Source snapshot -----------------------------------------------------
+    def record_source(self, entries: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]]) -> None:
+        """Store ``(id, checksum, details)`` of records just read from KiotViet."""
+        now = time.time()
+        rows = [
+            (self.namespace, str(doc_id), checksum, json.dumps(details, ensure_ascii=False, default=str), now)
+            for doc_id, checksum, details in entries
+        ]
+        if not rows:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO source_items (namespace, doc_id, checksum, details, seen_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT INTO source_meta (namespace, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(namespace) DO UPDATE SET updated_at = excluded.updated_at",
+                (self.namespace, now),
+            )
+
+    def prune_source(self, before: float) -> None:
+        """After a complete read of the source: drop records not seen since ``before``."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM source_items WHERE namespace = ? AND seen_at < ?", (self.namespace, before))
+            conn.execute(
+                "INSERT INTO source_meta (namespace, updated_at, complete_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(namespace) DO UPDATE SET updated_at = excluded.updated_at, "
+                "complete_at = excluded.complete_at",
+                (self.namespace, now, now),
+            )
+
+    def load_source(self) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT doc_id, checksum, details FROM source_items WHERE namespace = ?", (self.namespace,)
+            )
+            return {doc_id: (checksum, json.loads(details) if details else {}) for doc_id, checksum, details in rows}
+
+    def source_info(self) -> Dict[str, Optional[float]]:
+        """``updated_at`` of the snapshot and ``complete_at`` of the last full read (None if never)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT updated_at, complete_at FROM source_meta WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return {"updated_at": row[0], "complete_at": row[1]} if row else {"updated_at": None, "complete_at": None}
+
+
+_ledgers: Dict[Tuple[str, str], SyncLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_sync_ledger(namespace: str, path: Optional[str] = None) -> SyncLedger:
+    path = path or os.getenv("SYNC_LEDGER_PATH") or DEFAULT_PATH
+    key = (path, namespace)
+    ledger = _ledgers.get(key)
+    if ledger is None:
+        with _ledgers_lock:
+            ledger = _ledgers.get(key)
+            if ledger is None:
+                ledger = _ledgers[key] = SyncLedger(path, namespace)
+    return ledger
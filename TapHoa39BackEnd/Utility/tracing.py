@@ -0,0 +1,321 @@
+"""Per-request span tracing and the structured slow-request log.
+
+A trace is started for every HTTP request by ``routes/metrics_routes.py``.
+Firestore calls, outgoing HTTP calls (KiotViet), Socket.IO emits and cache
+lookups add spans/events to the active trace. When a request is slower than
+``SLOW_REQUEST_THRESHOLD_MS`` its span tree is written to the slow log.
+Outside of a request (scripts, background threads) every helper is a no-op.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000"))
+SLOW_LOG_PATH = os.getenv("SLOW_LOG_PATH")
+RECENT_SLOW_LIMIT = 50
+MAX_SPANS_PER_TRACE = 2000
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("taphoa39_trace", default=None)
+_recent_slow: deque = deque(maxlen=RECENT_SLOW_LIMIT)
+_slow_log_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+        }
+        if self.attrs:
+            payload["attrs"] = self.attrs
+        if self.children:
+            payload["children"] = [child.to_dict(origin) for child in self.children]
+        return payload
+
+
+class Trace:
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.root = Span(name, attrs)
+        self.stack: List[Span] = [self.root]
+        self.span_count = 0
+        self.token = None
+        self.started_at = datetime.utcnow().isoformat() + "Z"
+
+    def open(self, name: str, attrs: Dict[str, Any], push: bool = True) -> Optional[Span]:
+        if self.span_count >= MAX_SPANS_PER_TRACE:
+            return None
+        child = Span(name, attrs)
+        self.stack[-1].children.append(child)
+        if push:
+            self.stack.append(child)
+        self.span_count += 1
+        return child
+
+    def close(self, child: Span) -> None:
+        child.end = time.perf_counter()
+        if self.stack[-1] is child and len(self.stack) > 1:
+            self.stack.pop()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Aggregate span count and time by category (the part before the first dot)."""
+        totals: Dict[str, Dict[str, float]] = {}
+        pending = list(self.root.children)
+        while pending:
+            current = pending.pop()
+            category = current.name.split(".", 1)[0]
+            bucket = totals.setdefault(category, {"count": 0, "total_ms": 0.0})
+            bucket["count"] += 1
+            bucket["total_ms"] = round(bucket["total_ms"] + current.duration_ms, 2)
+            pending.extend(current.children)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "summary": self.summary(),
+            "span_count": self.span_count,
+            "truncated": self.span_count >= MAX_SPANS_PER_TRACE,
+            "trace": self.root.to_dict(self.root.start),
+        }
+
+
+def start_trace(name: str, **attrs: Any) -> Trace:
+    trace = Trace(name, attrs)
+    trace.token = _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: Trace) -> float:
+    """Close the trace, detach it from the context and return its duration in ms."""
+    trace.root.end = time.perf_counter()
+    if trace.token is not None:
+        try:
+            _current_trace.reset(trace.token)
+        except ValueError:
+            _current_trace.set(None)
+        trace.token = None
+    return trace.root.duration_ms
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    child = trace.open(name, attrs)
+    if child is None:
+        yield None
+        return
+    try:
+        yield child
+    except BaseException as exc:
+        child.attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        trace.close(child)
+
+
+def add_event(name: str, **attrs: Any) -> None:
+    """Record a zero-duration span (e.g. a cache hit) on the active trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    child = trace.open(name, attrs)
+    if child is not None:
+        trace.close(child)
+
+
+def record_slow_trace(trace: Trace, duration_ms: float, **fields: Any) -> None:
+    entry = {"duration_ms": round(duration_ms, 2), **fields, **trace.to_dict()}
+    _recent_slow.append(entry)
+
+    top = sorted(entry["summary"].items(), key=lambda item: item[1]["total_ms"], reverse=True)[:3]
+    breakdown = ", ".join(f"{name}={data['total_ms']:.0f}ms/{data['count']}" for name, data in top)
+    print(f"🐢 Slow request {fields.get('method', '')} {fields.get('route', '')} {duration_ms:.0f}ms ({breakdown})")
+
+    if SLOW_LOG_PATH:
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with _slow_log_lock:
+            try:
+                with open(SLOW_LOG_PATH, "a", encoding="utf-8") as handle:
+                    handle.write(line + "\n")
+            except OSError as exc:
+                print(f"⚠️ Không ghi được slow log {SLOW_LOG_PATH}: {exc}")
+
+
+def recent_slow_traces() -> List[Dict[str, Any]]:
+    return list(_recent_slow)
+
+
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+_instrumented: set = set()
+# Set while a traced client call runs so that nested client calls
+# (e.g. CollectionReference.stream -> Query.stream) are recorded once.
+_in_client_call: ContextVar[bool] = ContextVar("taphoa39_in_client_call", default=False)
+
+
+def _wrap_method(owner: type, method_name: str, span_name: str, describe) -> None:
+    original = getattr(owner, method_name, None)
+    if original is None or getattr(original, "_taphoa39_traced", False):
+        return
+
+    @functools.wraps(original)
+    def traced(self, *args, **kwargs):
+        if _current_trace.get() is None or _in_client_call.get():
+            return original(self, *args, **kwargs)
+        token = _in_client_call.set(True)
+        try:
+            with span(span_name, target=describe(self)):
+                return original(self, *args, **kwargs)
+        finally:
+            _in_client_call.reset(token)
+
+    traced._taphoa39_traced = True  # type: ignore[attr-defined]
+    setattr(owner, method_name, traced)
+
+
+def _wrap_stream(owner: type, method_name: str, span_name: str, describe) -> None:
+    original = getattr(owner, method_name, None)
+    if original is None or getattr(original, "_taphoa39_traced", False):
+        return
+
+    @functools.wraps(original)
+    def traced(self, *args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None or _in_client_call.get():
+            return original(self, *args, **kwargs)
+        token = _in_client_call.set(True)
+        try:
+            iterator = original(self, *args, **kwargs)
+        finally:
+            _in_client_call.reset(token)
+        return _traced_iterator(trace, span_name, describe(self), iterator)
+
+    traced._taphoa39_traced = True  # type: ignore[attr-defined]
+    setattr(owner, method_name, traced)
+
+
+def _traced_iterator(trace: Trace, span_name: str, target: str, iterator):
+    # The span covers the whole iteration, which is when the RPCs actually run.
+    # It is not pushed on the stack: the caller's own work between items must
+    # not be attributed to the stream.
+    child = trace.open(span_name, {"target": target}, push=False)
+    count = 0
+    try:
+        for item in iterator:
+            count += 1
+            yield item
+    finally:
+        if child is not None:
+            child.attrs["docs"] = count
+            trace.close(child)
+
+
+def _describe_firestore(target: Any) -> str:
+    path = getattr(target, "path", None)
+    if isinstance(path, str):
+        return path
+    parent = getattr(target, "_parent", None)
+    if parent is not None:
+        return getattr(parent, "id", None) or type(target).__name__
+    return type(target).__name__
+
+
+def instrument_firestore() -> None:
+    if "firestore" in _instrumented:
+        return
+    try:
+        from google.cloud.firestore_v1.batch import WriteBatch
+        from google.cloud.firestore_v1.client import Client
+        from google.cloud.firestore_v1.collection import CollectionReference
+        from google.cloud.firestore_v1.document import DocumentReference
+        from google.cloud.firestore_v1.query import Query
+    except ImportError:  # pragma: no cover - firestore not installed
+        return
+
+    for method_name in ("get", "set", "update", "delete", "create"):
+        _wrap_method(DocumentReference, method_name, f"firestore.doc.{method_name}", _describe_firestore)
+    _wrap_method(WriteBatch, "commit", "firestore.batch.commit", lambda batch: f"{len(getattr(batch, '_write_pbs', []))} writes")
+    _wrap_method(Query, "get", "firestore.query.get", _describe_firestore)
+    _wrap_method(CollectionReference, "get", "firestore.query.get", _describe_firestore)
+    _wrap_stream(Query, "stream", "firestore.query.stream", _describe_firestore)
+    _wrap_stream(CollectionReference, "stream", "firestore.query.stream", _describe_firestore)
+    _wrap_stream(Client, "get_all", "firestore.get_all", lambda client: "get_all")
+    _instrumented.add("firestore")
+
+
+def instrument_http() -> None:
+    """Trace outgoing ``requests`` calls; KiotViet hosts get their own span name."""
+    if "http" in _instrumented:
+        return
+    try:
+        import requests
+    except ImportError:  # pragma: no cover
+        return
+
+    original = requests.Session.request
+
+    @functools.wraps(original)
+    def traced(self, method, url, *args, **kwargs):
+        if _current_trace.get() is None:
+            return original(self, method, url, *args, **kwargs)
+        parts = urlsplit(str(url))
+        span_name = "kiotviet.http" if "kiotviet" in (parts.hostname or "") else "http.request"
+        with span(span_name, method=str(method).upper(), host=parts.hostname, path=parts.path) as current:
+            response = original(self, method, url, *args, **kwargs)
+            if current is not None:
+                current.attrs["status"] = getattr(response, "status_code", None)
+            return response
+
+    requests.Session.request = traced
+    _instrumented.add("http")
+
+
+def instrument_socketio(socketio) -> None:
+    if socketio is None or getattr(socketio, "_taphoa39_traced", False):
+        return
+    original = socketio.emit
+
+    @functools.wraps(original)
+    def traced(event, *args, **kwargs):
+        if _current_trace.get() is None:
+            return original(event, *args, **kwargs)
+        with span("socketio.emit", event=event, namespace=kwargs.get("namespace")):
+            return original(event, *args, **kwargs)
+
+    socketio.emit = traced
+    socketio._taphoa39_traced = True
@@ -7,11 +7,13 @@ from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 
-from firebase.firebase_service.cache import Cache
+from firebase.firebase_service.cache import Cache, start_cache_stats_logger
 from firebase.firebase_service.customer_service import FirestoreCustomerService
 from firebase.firebase_service.invoice_service import FirestoreInvoiceService
 from firebase.firebase_service.order_service import FirestoreorderService
 from firebase.firebase_service.product_service import FirestoreProductService
+from firebase.init_firebase import prewarm_firestore_clients
+from firebase.sync_scheduler import start_sync_scheduler
 from routes.firebase_customers import create_firebase_customers_bp
 from routes.firebase_invoices import create_firebase_invoices_bp
 from routes.firebase_orders import create_firebase_orders_bp
@@ -20,7 +22,15 @@ from routes.kiotviet_routes import create_kiotviet_routes_bp
 from routes.sync_routes import create_sync_routes_bp
 from routes.static_routes import create_static_routes_bp
 from routes.firebase_websocket import register_namespaces
+from routes.events_routes import create_events_routes_bp
+from routes.jobs_routes import create_jobs_routes_bp
 from routes.auth_routes import auth_bp
+from routes.metrics_routes import create_metrics_routes_bp, register_request_metrics
+from Utility.server_env import get_env_name, get_port, print_banner
+from Utility.socketio_bus import create_client_manager
+from Utility.tracing import instrument_firestore, instrument_http, instrument_socketio
+
+SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
 
 # SocketIO middleware removed — websockets are no longer used.
 
@@ -29,25 +39,40 @@ def _build_app() -> Flask:
     app = Flask(__name__)
     CORS(app, resources={r"/*": {"origins": "*"}})
 
-    product_service = FirestoreProductService(Cache())
-    invoice_service = FirestoreInvoiceService(Cache())
-    customer_service = FirestoreCustomerService(Cache())
-    order_service = FirestoreorderService(Cache())
-
-    # Initialize SocketIO without async_mode (uses threading by default)
+    # Latency histograms per route + span trees for slow requests
+    instrument_firestore()
+    instrument_http()
+    register_request_metrics(app)
+
+    product_service = FirestoreProductService(Cache("products"))
+    invoice_service = FirestoreInvoiceService(Cache("invoices"))
+    customer_service = FirestoreCustomerService(Cache("customers"))
+    order_service = FirestoreorderService(Cache("orders"))
+    start_cache_stats_logger()
+    # Firestore clients are created lazily; open them in the background so the
+    # first request does not pay for credentials parsing and channel setup.
+    if os.getenv("FIRESTORE_PREWARM", "1").lower() not in ("0", "false", "no"):
+        prewarm_firestore_clients()
+
+    # async_mode is explicit: "threading" for `python -m app` (Werkzeug dev server),
+    # serve.py switches it to "gevent" before importing this module.
     # Frontend uses polling transport only, so no WebSocket needed
-    # This avoids eventlet monkey patching issues that can block REST APIs
     socketio = SocketIO(
         app,
+        async_mode=SOCKETIO_ASYNC_MODE,
         cors_allowed_origins="*",
         logger=False,
         engineio_logger=False,
         ping_timeout=60,
         ping_interval=25,
+        # Fans emits out to the other workers when the message bus is multi-process.
+        client_manager=create_client_manager(),
         # Allow both polling and websocket, but frontend will use polling only
         transports=['polling', 'websocket']
     )
 
+    instrument_socketio(socketio)
+
     # Register Socket.IO namespaces so clients can connect and receive events
     try:
         register_namespaces(socketio)
@@ -55,6 +80,9 @@ def _build_app() -> Flask:
         # best-effort registration; avoid crashing startup if socketio not available
         pass
     app.register_blueprint(auth_bp)
+    app.register_blueprint(create_metrics_routes_bp())
+    app.register_blueprint(create_events_routes_bp())
+    app.register_blueprint(create_jobs_routes_bp())
     app.register_blueprint(create_static_routes_bp())
     app.register_blueprint(create_kiotviet_routes_bp())
     app.register_blueprint(create_sync_routes_bp(product_service))
@@ -70,8 +98,18 @@ def _build_app() -> Flask:
     app.register_blueprint(create_firebase_customers_bp(customer_service, socketio))
     app.register_blueprint(create_firebase_orders_bp(order_service, socketio))
 
+    # Scheduled KiotViet syncs (SYNC_SCHEDULE); on by default in prod, see firebase/sync_scheduler.py
+    start_sync_scheduler(product_service)
+
     # Attach socketio to app for external use if needed
     app.socketio = socketio
+    # Services are exposed the same way for benchmarks/scripts that reuse the app's caches
+    app.services = {
+        "products": product_service,
+        "invoices": invoice_service,
+        "customers": customer_service,
+        "orders": order_service,
+    }
 
     return app
 
@@ -80,16 +118,12 @@ app = _build_app()
 
 
 if __name__ == "__main__":
-    env = os.getenv("e", "prod")
-    port = 8000 if env == "prod" else 5000
-    print(f"\n{'='*60}")
-    print(f"Starting server in {env.upper()} mode on port {port}")
-    print(f"Socket.IO: Polling transport (threading mode)")
-    print(f"Server URL: http://0.0.0.0:{port}")
-    print(f"{'='*60}\n")
+    # Development server. Production runs `python -m serve` (gunicorn + gevent workers).
+    env = get_env_name()
+    port = get_port(env)
+    print_banner(env, port, "Werkzeug (development)", f"Polling transport ({SOCKETIO_ASYNC_MODE} mode)")
 
     # Use socketio.run() which handles both regular HTTP and Socket.IO
-    # Using threading mode (default) instead of eventlet to avoid blocking REST APIs
     app.socketio.run(
         app,
         host="0.0.0.0",
@@ -0,0 +1,709 @@
+"""In-memory stand-in for the subset of the Firestore client used by the services.
+
+Supported: ``collection``/``document`` references (including sub-collections),
+``get``/``set``/``update``/``delete``/``create``, queries with ``where`` (positional
+or ``filter=FieldFilter(...)``), ``select``, ``order_by``, ``limit``, ``offset``,
+``stream``/``get``, ``batch()``, ``transaction()`` (works with
+``@firestore.transactional``) and ``get_all``.
+
+Every RPC sleeps ``latency_ms`` (plus ``per_doc_us`` per document transferred) so
+the benchmarks see round-trip costs similar to the real service, and
+``client.stats`` counts reads/writes the way Firestore bills them.
+"""
+
+from __future__ import annotations
+
+import random
+import string
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists, InvalidArgument, NotFound
+
+try:
+    from google.cloud.firestore_v1.transforms import DELETE_FIELD, SERVER_TIMESTAMP, Increment
+except ImportError:  # pragma: no cover - very old client library
+    DELETE_FIELD = SERVER_TIMESTAMP = object()
+    Increment = None
+
+MAX_BATCH_WRITES = 500
+MAX_IN_VALUES = 30
+_MISSING = object()
+_MAX_ID = "\uffff"  # sorts after every document id
+_INDEXABLE_OPS = ("==", "<", "<=", ">", ">=", "in")
+
+
+def _clone(value: Any) -> Any:
+    """Copy documents on the way in and out, like the wire protocol does."""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clone(item) for item in value]
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    # Firestore orders values by type first: null < bool < number < timestamp < string < array < map.
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    rank = _type_rank(value)
+    if rank == 3 and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if rank >= 8:
+        return rank, repr(value)
+    return rank, value
+
+
+def _get_path(data: Dict[str, Any], field_path: str) -> Any:
+    current: Any = data
+    for part in field_path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _set_path(data: Dict[str, Any], field_path: str, value: Any) -> None:
+    parts = field_path.split(".")
+    current = data
+    for part in parts[:-1]:
+        child = current.get(part)
+        if not isinstance(child, dict):
+            child = current[part] = {}
+        current = child
+    _apply_value(current, parts[-1], value)
+
+
+def _apply_value(target: Dict[str, Any], key: str, value: Any) -> None:
+    if value is DELETE_FIELD:
+        target.pop(key, None)
+    elif value is SERVER_TIMESTAMP:
+        target[key] = datetime.now(timezone.utc)
+    elif Increment is not None and isinstance(value, Increment):
+        current = target.get(key)
+        target[key] = (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + value.value
+    else:
+        target[key] = _clone(value)
+
+
+def _deep_merge(target: Dict[str, Any], updates: Dict[str, Any]) -> None:
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            _apply_value(target, key, value)
+
+
+def _matches(value: Any, op: str, expected: Any) -> bool:
+    if value is _MISSING:
+        # Documents without the field never match, not even '!=' / 'not-in'.
+        return False
+    if op == "==":
+        return _sort_key(value) == _sort_key(expected)
+    if op == "!=":
+        return _sort_key(value) != _sort_key(expected)
+    if op == "in":
+        return any(_sort_key(value) == _sort_key(item) for item in expected)
+    if op == "not-in":
+        return all(_sort_key(value) != _sort_key(item) for item in expected)
+    if op == "array-contains":
+        return isinstance(value, list) and any(_sort_key(item) == _sort_key(expected) for item in value)
+    if op == "array-contains-any":
+        return isinstance(value, list) and any(_sort_key(item) == _sort_key(e) for e in expected for item in value)
+    if _type_rank(value) != _type_rank(expected):
+        return False
+    left, right = _sort_key(value), _sort_key(expected)
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    raise InvalidArgument(f"Unsupported operator {op!r}")
+
+
+class _FieldIndex:
+    """Sorted ``(sort_key, doc_id)`` entries of one field, kept up to date on every write."""
+
+    def __init__(self, field_path: str, documents: Dict[str, Dict[str, Any]]):
+        self.field_path = field_path
+        self.entries: List[Tuple[Tuple[int, Any], str]] = []
+        for doc_id, data in documents.items():
+            value = _get_path(data, field_path)
+            if value is not _MISSING:
+                self.entries.append((_sort_key(value), doc_id))
+        self.entries.sort()
+
+    def replace(self, doc_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        if old is not None:
+            value = _get_path(old, self.field_path)
+            if value is not _MISSING:
+                entry = (_sort_key(value), doc_id)
+                position = bisect_left(self.entries, entry)
+                if position < len(self.entries) and self.entries[position] == entry:
+                    del self.entries[position]
+        if new is not None:
+            value = _get_path(new, self.field_path)
+            if value is not _MISSING:
+                insort(self.entries, (_sort_key(value), doc_id))
+
+    def candidates(self, op: str, value: Any) -> List[str]:
+        if op == "in":
+            ids: Dict[str, None] = {}
+            for item in value:
+                ids.update(dict.fromkeys(self.candidates("==", item)))
+            return list(ids)
+        key = _sort_key(value)
+        rank = key[0]
+        # Range filters only match values of the same type.
+        low = bisect_left(self.entries, ((rank,),))
+        high = bisect_left(self.entries, ((rank + 1,),))
+        if op == "==":
+            low = bisect_left(self.entries, (key,), low, high)
+            high = bisect_right(self.entries, (key, _MAX_ID), low, high)
+        elif op == ">":
+            low = bisect_right(self.entries, (key, _MAX_ID), low, high)
+        elif op == ">=":
+            low = bisect_left(self.entries, (key,), low, high)
+        elif op == "<":
+            high = bisect_left(self.entries, (key,), low, high)
+        elif op == "<=":
+            high = bisect_right(self.entries, (key, _MAX_ID), low, high)
+        return [doc_id for _, doc_id in self.entries[low:high]]
+
+
+class _Collection:
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, _FieldIndex] = {}
+        self.update_times: Dict[str, datetime] = {}
+
+    def write(self, doc_id: str, data: Optional[Dict[str, Any]]) -> None:
+        old = self.documents.get(doc_id)
+        if data is None:
+            self.documents.pop(doc_id, None)
+            self.update_times.pop(doc_id, None)
+        else:
+            # Stored documents are never mutated in place; readers may hold the old dict.
+            self.documents[doc_id] = data
+            self.update_times[doc_id] = datetime.now(timezone.utc)
+        for index in self.indexes.values():
+            index.replace(doc_id, old, data)
+
+    def index(self, field_path: str) -> _FieldIndex:
+        index = self.indexes.get(field_path)
+        if index is None:
+            index = self.indexes[field_path] = _FieldIndex(field_path, self.documents)
+        return index
+
+
+# ============================================================================
+# SNAPSHOTS & REFERENCES
+# ============================================================================
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]],
+                 update_time: Optional[datetime] = None, field_paths: Optional[Iterable[str]] = None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.update_time = update_time
+        self.create_time = update_time
+        self.read_time = datetime.now(timezone.utc)
+        self._field_paths = list(field_paths) if field_paths is not None else None
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        if self._data is None:
+            return None
+        if self._field_paths is None:
+            return _clone(self._data)
+        projected: Dict[str, Any] = {}
+        for field_path in self._field_paths:
+            value = _get_path(self._data, field_path)
+            if value is not _MISSING:
+                _set_path(projected, field_path, value)
+        return projected
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_path(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _clone(value)
+
+
+class FakeDocumentReference:
+    def __init__(self, client: "FakeFirestoreClient", collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, self._collection_path)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, FakeDocumentReference) and other._client is self._client and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def __repr__(self) -> str:
+        return f"<FakeDocumentReference {self.path}>"
+
+    def collection(self, collection_id: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction: Any = None, **_: Any) -> FakeDocumentSnapshot:
+        self._client._rpc(documents=1)
+        return self._client._snapshot(self, field_paths)
+
+    def set(self, document_data: Dict[str, Any], merge: Any = False, **_: Any) -> Dict[str, Any]:
+        self._client._rpc()
+        self._client._commit([("set", self, document_data, bool(merge))])
+        return {"update_time": datetime.now(timezone.utc)}
+
+    def create(self, document_data: Dict[str, Any], **_: Any) -> Dict[str, Any]:
+        self._client._rpc()
+        self._client._commit([("create", self, document_data, False)])
+        return {"update_time": datetime.now(timezone.utc)}
+
+    def update(self, field_updates: Dict[str, Any], **_: Any) -> Dict[str, Any]:
+        self._client._rpc()
+        self._client._commit([("update", self, field_updates, False)])
+        return {"update_time": datetime.now(timezone.utc)}
+
+    def delete(self, **_: Any) -> datetime:
+        self._client._rpc()
+        self._client._commit([("delete", self, None, False)])
+        return datetime.now(timezone.utc)
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeFirestoreClient", collection_path: str, filters: Tuple = (),
+                 projection: Optional[List[str]] = None, orders: Tuple = (), limit: Optional[int] = None,
+                 offset: int = 0, start_after: Optional[Tuple] = None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = filters
+        self._projection = projection
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._start_after = start_after
+
+    def _copy(self, **changes: Any) -> "FakeQuery":
+        params = {
+            "filters": self._filters,
+            "projection": self._projection,
+            "orders": self._orders,
+            "limit": self._limit,
+            "offset": self._offset,
+            "start_after": self._start_after,
+        }
+        params.update(changes)
+        return FakeQuery(self._client, self._collection_path, **params)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None,
+              *, filter: Any = None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string in ("in", "not-in", "array-contains-any") and len(value) > MAX_IN_VALUES:
+            raise InvalidArgument(f"'{op_string}' filters support a maximum of {MAX_IN_VALUES} elements")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def select(self, field_paths: Iterable[str]) -> "FakeQuery":
+        return self._copy(projection=list(field_paths))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=self._orders + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip: int) -> "FakeQuery":
+        return self._copy(offset=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        if isinstance(document_fields_or_snapshot, FakeDocumentSnapshot):
+            data = document_fields_or_snapshot._data or {}
+            cursor = document_fields_or_snapshot.id
+        else:
+            data = document_fields_or_snapshot
+            cursor = None
+        values = tuple(_get_path(data, field_path) for field_path, _ in self._orders)
+        return self._copy(start_after=(values, cursor))
+
+    def _run(self) -> List[FakeDocumentSnapshot]:
+        client = self._client
+        with client._lock:
+            collection = client._collections.get(self._collection_path)
+            if collection is None:
+                return []
+            documents = collection.documents
+            indexed = next((f for f in self._filters if f[1] in _INDEXABLE_OPS), None)
+            if indexed is not None:
+                ids = collection.index(indexed[0]).candidates(indexed[1], indexed[2])
+            else:
+                ids = list(documents)
+            # Grab the (immutable) stored dicts under the lock, filter outside of it.
+            rows = [(doc_id, documents[doc_id], collection.update_times.get(doc_id)) for doc_id in ids]
+
+        for field_path, op, value in self._filters:
+            rows = [row for row in rows if _matches(_get_path(row[1], field_path), op, value)]
+
+        if self._orders:
+            rows.sort(key=lambda row: row[0])
+            for field_path, descending in reversed(self._orders):
+                rows = [row for row in rows if _get_path(row[1], field_path) is not _MISSING]
+                rows.sort(key=lambda row, path=field_path: _sort_key(_get_path(row[1], path)), reverse=descending)
+        elif indexed is None or indexed[1] in ("==", "in"):
+            # Default order is by document id; range filters order by the filtered field.
+            rows.sort(key=lambda row: row[0])
+
+        if self._start_after is not None:
+            values, cursor = self._start_after
+            for position, (doc_id, data, _) in enumerate(rows):
+                if cursor is not None:
+                    found = doc_id == cursor
+                else:
+                    found = tuple(_get_path(data, field_path) for field_path, _ in self._orders) == values
+                if found:
+                    rows = rows[position + 1:]
+                    break
+            else:
+                rows = []
+
+        if self._offset:
+            rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[: self._limit]
+
+        return [
+            FakeDocumentSnapshot(
+                FakeDocumentReference(client, self._collection_path, doc_id), data, update_time, self._projection
+            )
+            for doc_id, data, update_time in rows
+        ]
+
+    def stream(self, transaction: Any = None, **_: Any) -> Iterator[FakeDocumentSnapshot]:
+        snapshots = self._run()
+        self._client._rpc(documents=max(1, len(snapshots)))
+        for snapshot in snapshots:
+            yield snapshot
+
+    def get(self, transaction: Any = None, **_: Any) -> List[FakeDocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: "FakeFirestoreClient", path: str):
+        super().__init__(client, path)
+
+    @property
+    def id(self) -> str:
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    @property
+    def path(self) -> str:
+        return self._collection_path
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        if document_id is None:
+            document_id = "".join(random.choices(string.ascii_letters + string.digits, k=20))
+        return FakeDocumentReference(self._client, self._collection_path, str(document_id))
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return datetime.now(timezone.utc), reference
+
+    def list_documents(self, page_size: Optional[int] = None) -> Iterator[FakeDocumentReference]:
+        with self._client._lock:
+            collection = self._client._collections.get(self._collection_path)
+            ids = sorted(collection.documents) if collection else []
+        self._client._rpc()
+        for doc_id in ids:
+            yield FakeDocumentReference(self._client, self._collection_path, doc_id)
+
+
+# ============================================================================
+# WRITES
+# ============================================================================
+
+class FakeWriteBatch:
+    def __init__(self, client: "FakeFirestoreClient"):
+        self._client = client
+        self._writes: List[Tuple[str, FakeDocumentReference, Any, bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, reference: FakeDocumentReference, document_data: Dict[str, Any], merge: Any = False) -> None:
+        self._writes.append(("set", reference, _clone(document_data), bool(merge)))
+
+    def create(self, reference: FakeDocumentReference, document_data: Dict[str, Any]) -> None:
+        self._writes.append(("create", reference, _clone(document_data), False))
+
+    def update(self, reference: FakeDocumentReference, field_updates: Dict[str, Any], **_: Any) -> None:
+        self._writes.append(("update", reference, _clone(field_updates), False))
+
+    def delete(self, reference: FakeDocumentReference, **_: Any) -> None:
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self, **_: Any) -> List[Dict[str, Any]]:
+        if len(self._writes) > MAX_BATCH_WRITES:
+            raise InvalidArgument(f"maximum {MAX_BATCH_WRITES} writes allowed per request")
+        writes, self._writes = self._writes, []
+        self._client._rpc()
+        self._client._commit(writes)
+        now = datetime.now(timezone.utc)
+        return [{"update_time": now} for _ in writes]
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Buffered writes applied on commit; implements the hooks ``@firestore.transactional`` calls."""
+
+    def __init__(self, client: "FakeFirestoreClient", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id: Optional[bytes] = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    @property
+    def id(self) -> Optional[bytes]:
+        return self._id
+
+    def _begin(self, retry_id: Optional[bytes] = None) -> None:
+        self._client._rpc()
+        self._id = random.getrandbits(64).to_bytes(8, "big")
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    def _rollback(self) -> None:
+        self._clean_up()
+
+    def _commit(self) -> List[Dict[str, Any]]:
+        try:
+            return self.commit()
+        finally:
+            self._id = None
+
+    def get(self, ref_or_query: Any, **_: Any):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+class FakeFirestoreClient:
+    """Thread-safe in-memory Firestore client.
+
+    ``latency_ms`` is slept once per RPC (round trip), ``per_doc_us`` once per
+    document returned, and ``jitter_ms`` adds uniform noise to the round trip.
+    """
+
+    def __init__(self, project: str = "fake-project", latency_ms: float = 0.0,
+                 per_doc_us: float = 0.0, jitter_ms: float = 0.0):
+        self.project = project
+        self.latency_ms = latency_ms
+        self.per_doc_us = per_doc_us
+        self.jitter_ms = jitter_ms
+        self._lock = threading.RLock()
+        self._collections: Dict[str, _Collection] = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {"rpcs": 0, "reads": 0, "writes": 0, "deletes": 0}
+
+    # -- API ---------------------------------------------------------------
+    def collection(self, path: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, path.strip("/"))
+
+    def document(self, path: str) -> FakeDocumentReference:
+        collection_path, _, doc_id = path.strip("/").rpartition("/")
+        return FakeDocumentReference(self, collection_path, doc_id)
+
+    def collections(self) -> List[FakeCollectionReference]:
+        with self._lock:
+            names = sorted(path for path in self._collections if "/" not in path)
+        return [FakeCollectionReference(self, name) for name in names]
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> FakeTransaction:
+        return FakeTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references: Iterable[FakeDocumentReference], field_paths: Optional[Iterable[str]] = None,
+                transaction: Any = None, **_: Any) -> Iterator[FakeDocumentSnapshot]:
+        references = list(references)
+        self._rpc(documents=max(1, len(references)))
+        for reference in references:
+            yield self._snapshot(reference, field_paths)
+
+    def close(self) -> None:
+        return None
+
+    # -- Benchmark helpers -------------------------------------------------
+    def load(self, collection_path: str, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Seed documents without latency or stats (``documents`` yields ``(doc_id, data)``)."""
+        with self._lock:
+            collection = self._collections.setdefault(collection_path, _Collection())
+            count = 0
+            for doc_id, data in documents:
+                collection.write(str(doc_id), _clone(data))
+                count += 1
+        return count
+
+    def ensure_index(self, collection_path: str, field_path: str) -> None:
+        """Build a field index up front (Firestore indexes exist before the first query)."""
+        with self._lock:
+            self._collections.setdefault(collection_path, _Collection()).index(field_path)
+
+    def count(self, collection_path: str) -> int:
+        with self._lock:
+            collection = self._collections.get(collection_path)
+            return len(collection.documents) if collection else 0
+
+    def reset_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            previous = dict(self.stats)
+            for key in self.stats:
+                self.stats[key] = 0
+        return previous
+
+    # -- Internals ---------------------------------------------------------
+    def _rpc(self, documents: int = 0) -> None:
+        with self._stats_lock:
+            self.stats["rpcs"] += 1
+            self.stats["reads"] += documents
+        delay = self.latency_ms / 1000.0
+        if self.jitter_ms:
+            delay += random.uniform(0, self.jitter_ms) / 1000.0
+        delay += documents * self.per_doc_us / 1_000_000.0
+        if delay > 0:
+            time.sleep(delay)
+
+    def _snapshot(self, reference: FakeDocumentReference, field_paths: Optional[Iterable[str]] = None) -> FakeDocumentSnapshot:
+        with self._lock:
+            collection = self._collections.get(reference._collection_path)
+            data = collection.documents.get(reference.id) if collection else None
+            update_time = collection.update_times.get(reference.id) if collection else None
+        return FakeDocumentSnapshot(reference, data, update_time, field_paths)
+
+    def _commit(self, writes: List[Tuple[str, FakeDocumentReference, Any, bool]]) -> None:
+        with self._lock:
+            # Validate first so a failing batch leaves nothing behind, like the real thing.
+            staged: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+
+            def current(reference: FakeDocumentReference) -> Optional[Dict[str, Any]]:
+                key = (reference._collection_path, reference.id)
+                if key in staged:
+                    return staged[key]
+                collection = self._collections.get(reference._collection_path)
+                return collection.documents.get(reference.id) if collection else None
+
+            for kind, reference, data, merge in writes:
+                existing = current(reference)
+                if kind == "delete":
+                    new = None
+                elif kind == "create":
+                    if existing is not None:
+                        raise AlreadyExists(f"Document already exists: {reference.path}")
+                    new = {}
+                    _deep_merge(new, data)
+                elif kind == "update":
+                    if existing is None:
+                        raise NotFound(f"No document to update: {reference.path}")
+                    new = _clone(existing)
+                    for field_path, value in data.items():
+                        _set_path(new, field_path, value)
+                elif merge and existing is not None:
+                    new = _clone(existing)
+                    _deep_merge(new, data)
+                else:
+                    new = {}
+                    _deep_merge(new, data)
+                staged[(reference._collection_path, reference.id)] = new
+
+            deletes = 0
+            for (collection_path, doc_id), new in staged.items():
+                collection = self._collections.setdefault(collection_path, _Collection())
+                collection.write(doc_id, new)
+                if new is None:
+                    deletes += 1
+
+        with self._stats_lock:
+            self.stats["writes"] += len(writes) - deletes
+            self.stats["deletes"] += deletes
+
+
+class FakeFirestoreFactory:
+    """``init_firestore`` replacement: one fake client per service-account env variable.
+
+    Services that share an account (e.g. invoices and customer lookups on the
+    HOADON project) share the same in-memory data, exactly like production.
+    """
+
+    def __init__(self, **client_options: Any):
+        self.client_options = client_options
+        self.clients: Dict[str, FakeFirestoreClient] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, account: str, app_name: Optional[str] = None) -> FakeFirestoreClient:
+        return self.client(account)
+
+    def client(self, account: str) -> FakeFirestoreClient:
+        with self._lock:
+            client = self.clients.get(account)
+            if client is None:
+                client = self.clients[account] = FakeFirestoreClient(project=account.lower(), **self.client_options)
+            return client
+
+    def set_latency(self, latency_ms: float, per_doc_us: float = 0.0, jitter_ms: float = 0.0) -> None:
+        self.client_options.update(latency_ms=latency_ms, per_doc_us=per_doc_us, jitter_ms=jitter_ms)
+        for client in self.clients.values():
+            client.latency_ms = latency_ms
+            client.per_doc_us = per_doc_us
+            client.jitter_ms = jitter_ms
+
+    def reset_stats(self) -> Dict[str, Dict[str, int]]:
+        return {account: client.reset_stats() for account, client in self.clients.items()}
@@ -0,0 +1,179 @@
+"""Local HTTP server that answers the KiotViet endpoints the backend calls.
+
+``route_kiotviet_to(stub.url)`` rewrites every outgoing ``requests`` call to a
+``*.kiotviet.vn`` host so the module-level URLs in ``FromKiotViet`` and
+``product_service`` reach the stub without being edited.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+STUB_TOKEN = "stub-token"
+# resource/fetch filter used by the delta product sync (KIOTVIET_MODIFIED_SINCE_PARAM);
+# like KiotViet it matches the last change, i.e. CreatedDate for never-edited records.
+MODIFIED_SINCE_PARAM = "lastModifiedFrom"
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=None) if value else None
+    except ValueError:
+        return None
+
+
+class KiotVietStub:
+    """Serve ``products``/``customers`` lists with optional per-request latency."""
+
+    def __init__(self, products: Optional[List[Dict[str, Any]]] = None,
+                 customers: Optional[List[Dict[str, Any]]] = None, latency_ms: float = 0.0):
+        self.products = products or []
+        self.customers = customers or []
+        self.latency_ms = latency_ms
+        self.requests: Counter = Counter()
+        self._bodies: Dict[Tuple, bytes] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("KiotViet stub is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_products(self, products: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.products = products
+            self._bodies.clear()
+
+    def set_customers(self, customers: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.customers = customers
+            self._bodies.clear()
+
+    def start(self) -> "KiotVietStub":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:  # keep benchmark output clean
+                return
+
+            def do_GET(self) -> None:
+                stub._handle(self)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                stub._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="kiotviet-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "KiotVietStub":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    # -- Handlers ----------------------------------------------------------
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        parts = urlsplit(handler.path)
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        path = parts.path.rstrip("/")
+        self.requests[path] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        if path.endswith("/api/account/login"):
+            body = json.dumps({"token": STUB_TOKEN}).encode()
+        elif path.endswith("/api/resource/fetch"):
+            body = self._page_body("Products", self.products, params, index_param="pageIndex", size_param="pageSize")
+        elif path.endswith("/api/customers"):
+            body = self._customers_body(params)
+        else:
+            self._send(handler, 404, b'{"message": "not stubbed"}')
+            return
+        self._send(handler, 200, body)
+
+    def _page_body(self, resource: str, items: List[Dict[str, Any]], params: Dict[str, str],
+                   index_param: str, size_param: str) -> bytes:
+        page_size = int(params.get(size_param) or 100)
+        page_index = int(params.get(index_param) or 0)
+        since = _parse_date(params.get(MODIFIED_SINCE_PARAM))
+        key = (resource, page_index, page_size, since)
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                if since is not None:
+                    items = [item for item in items
+                             if (_parse_date(item.get("ModifiedDate") or item.get("CreatedDate")) or since) > since]
+                start = page_index * page_size
+                payload = {"Data": items[start:start + page_size], "Total": len(items)}
+                body = self._bodies[key] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return body
+
+    def _customers_body(self, params: Dict[str, str]) -> bytes:
+        top = int(params.get("top") or params.get("$top") or 10_000)
+        skip = int(params.get("skip") or params.get("$skip") or 0)
+        key = ("Customers", skip, top)
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                # KiotViet puts a summary row first; get_entire_customer() drops it.
+                summary_row = {"Id": 0, "Name": "Tổng", "Debt": sum(c.get("Debt") or 0 for c in self.customers)}
+                payload = {"Data": [summary_row] + self.customers[skip:skip + top], "Total": len(self.customers)}
+                body = self._bodies[key] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return body
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: bytes) -> None:
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def route_kiotviet_to(base_url: str) -> Callable[[], None]:
+    """Send every ``requests`` call for ``*.kiotviet.vn`` to ``base_url``; returns an undo function."""
+    from requests.adapters import HTTPAdapter
+
+    original = HTTPAdapter.send
+    target = urlsplit(base_url)
+
+    @functools.wraps(original)
+    def send(self, request, *args, **kwargs):
+        parts = urlsplit(request.url)
+        if (parts.hostname or "").endswith("kiotviet.vn"):
+            request.url = parts._replace(scheme=target.scheme, netloc=target.netloc).geturl()
+            request.headers.pop("Host", None)
+        return original(self, request, *args, **kwargs)
+
+    HTTPAdapter.send = send
+
+    def undo() -> None:
+        HTTPAdapter.send = original
+
+    return undo
@@ -0,0 +1,435 @@
+"""HTTP load test that replays a POS checkout day against the running app.
+
+By default the app is started in-process on the threaded Socket.IO server
+(the production setup of ``python -m app``) wired to the in-memory Firestore;
+``--target http://host:port`` load-tests a server started elsewhere instead.
+
+Virtual users per concurrency level N:
+
+* N terminals: ``GET /api/firebase/get/products`` every ``--poll-interval``
+  seconds plus one Engine.IO long-polling session joined to the products and
+  invoices namespaces (exactly what the frontend's polling transport does);
+* max(1, N/4) cashiers: bursts of ``POST /add_invoice`` followed by
+  ``PUT /products/update_onhand_batch``;
+* max(1, N/10) dashboards: daily/monthly summary and top products.
+
+Each level runs for ``--stage-seconds``; the report gives throughput,
+latency percentiles and error rates per endpoint and level, so a capacity
+change (server mode, worker count...) can be compared before opening a store::
+
+    python -m benchmarks.load_test --levels 5,10,20,40 --stage-seconds 30
+    python -m benchmarks.load_test --target http://127.0.0.1:8000 --levels 10,50
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.synthetic_data import ANCHOR_DATE, DEFAULT_SEED, build_invoice, generate_customers, generate_products
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+TERMINAL_NAMESPACES = ("/api/websocket/products", "/api/websocket/invoices")
+REQUEST_TIMEOUT = 60
+
+
+class Recorder:
+    """Thread-safe latency/error collection for one stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_examples: Dict[str, str] = {}
+        self.events_received = 0
+        self.started = time.perf_counter()
+        self.stopped: Optional[float] = None
+
+    def record(self, name: str, elapsed: float, ok: bool = True, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                if error and name not in self.error_examples:
+                    self.error_examples[name] = error[:200]
+
+    def add_events(self, count: int) -> None:
+        with self._lock:
+            self.events_received += count
+
+    def summary(self) -> Dict[str, Any]:
+        duration = (self.stopped or time.perf_counter()) - self.started
+        endpoints: Dict[str, Any] = {}
+        total = 0
+        total_errors = 0
+        with self._lock:
+            for name, samples in sorted(self.samples.items()):
+                ordered = sorted(samples)
+                errors = self.errors.get(name, 0)
+                total += len(ordered)
+                total_errors += errors
+                endpoints[name] = {
+                    "count": len(ordered),
+                    "rps": round(len(ordered) / duration, 2),
+                    "p50_ms": _percentile(ordered, 0.50),
+                    "p95_ms": _percentile(ordered, 0.95),
+                    "p99_ms": _percentile(ordered, 0.99),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                    "errors": errors,
+                    "error_rate": round(errors / len(ordered), 4),
+                }
+                if name in self.error_examples:
+                    endpoints[name]["error_example"] = self.error_examples[name]
+            events = self.events_received
+        return {
+            "duration_s": round(duration, 2),
+            "requests": total,
+            "rps": round(total / duration, 2),
+            "error_rate": round(total_errors / total, 4) if total else 0.0,
+            "socketio_events_received": events,
+            "endpoints": endpoints,
+        }
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))] * 1000, 1)
+
+
+# ============================================================================
+# VIRTUAL USERS
+# ============================================================================
+
+class VirtualUser(threading.Thread):
+    def __init__(self, name: str, base_url: str, recorder: Recorder, stop: threading.Event, seed: int):
+        super().__init__(name=name, daemon=True)
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.stop_event = stop
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+
+    def call(self, label: str, method: str, path: str, expected: Tuple[int, ...] = (200,), **kwargs: Any):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=REQUEST_TIMEOUT, **kwargs)
+        except requests.RequestException as exc:
+            self.recorder.record(label, time.perf_counter() - started, ok=False, error=f"{type(exc).__name__}: {exc}")
+            return None
+        elapsed = time.perf_counter() - started
+        ok = response.status_code in expected
+        self.recorder.record(label, elapsed, ok=ok, error=None if ok else f"HTTP {response.status_code}: {response.text[:120]}")
+        return response if ok else None
+
+    def pause(self, seconds: float) -> bool:
+        """Sleep with ±30% jitter; False when the stage is over."""
+        return not self.stop_event.wait(seconds * self.rng.uniform(0.7, 1.3))
+
+    def run(self) -> None:
+        # Spread the start so all users do not fire in the same millisecond.
+        if not self.pause(self.rng.uniform(0, 1.0)):
+            return
+        while not self.stop_event.is_set():
+            try:
+                if not self.step():
+                    break
+            except Exception as exc:  # keep the user alive; the error is part of the result
+                self.recorder.record("user_error", 0.0, ok=False, error=f"{type(exc).__name__}: {exc}")
+                if not self.pause(1.0):
+                    break
+        self.session.close()
+
+    def step(self) -> bool:
+        raise NotImplementedError
+
+
+class Terminal(VirtualUser):
+    """POS screen: polls the catalogue and keeps a Socket.IO polling session open."""
+
+    def __init__(self, *args: Any, poll_interval: float, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.poll_interval = poll_interval
+        self.socket = SocketIOPollingClient(self.base_url, self.recorder, self.stop_event)
+
+    def run(self) -> None:
+        self.socket.start()
+        super().run()
+        self.socket.close()
+
+    def step(self) -> bool:
+        self.call("GET /get/products", "GET", "/api/firebase/get/products")
+        return self.pause(self.poll_interval)
+
+
+class Cashier(VirtualUser):
+    """Rings up a burst of sales, then waits for the next customers."""
+
+    def __init__(self, *args: Any, products: List[Dict[str, Any]], customers: List[Dict[str, Any]],
+                 think_time: float, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.products = products
+        self.customers = customers
+        self.think_time = think_time
+
+    def step(self) -> bool:
+        for _ in range(self.rng.randint(1, 4)):
+            created = ANCHOR_DATE + timedelta(days=1, seconds=self.rng.randrange(7 * 3600, 22 * 3600))
+            invoice = build_invoice(self.rng, self.products, self.customers, created,
+                                    invoice_id=f"LT{self.rng.getrandbits(48):015d}")
+            self.call("POST /add_invoice", "POST", "/api/firebase/add_invoice", json=invoice)
+            updates = [
+                {"productId": item["product"]["Id"], "minus": item["quantity"], "invoiceId": invoice["id"]}
+                for item in invoice["cartItems"]
+            ]
+            self.call("PUT /products/update_onhand_batch", "PUT", "/api/firebase/products/update_onhand_batch", json=updates)
+            if not self.pause(0.2):
+                return False
+        return self.pause(self.think_time)
+
+
+class Dashboard(VirtualUser):
+    def __init__(self, *args: Any, refresh_interval: float, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.refresh_interval = refresh_interval
+
+    def step(self) -> bool:
+        day = (ANCHOR_DATE - timedelta(days=self.rng.randrange(0, 30))).date().isoformat()
+        self.call("GET /daily_summary", "GET", "/api/firebase/daily_summary", params={"date": day})
+        self.call("GET /monthly_summary", "GET", "/api/firebase/monthly_summary",
+                  params={"year": ANCHOR_DATE.year, "month": ANCHOR_DATE.month})
+        self.call("GET /top_products", "GET", "/api/firebase/top_products", params={"date": day})
+        return self.pause(self.refresh_interval)
+
+
+class SocketIOPollingClient(threading.Thread):
+    """Minimal Engine.IO v4 polling client: handshake, namespace connect, long-poll loop."""
+
+    def __init__(self, base_url: str, recorder: Recorder, stop: threading.Event):
+        super().__init__(name="socketio-poll", daemon=True)
+        self.base_url = base_url
+        self.recorder = recorder
+        self.stop_event = stop
+        self.session = requests.Session()
+        self.sid: Optional[str] = None
+
+    def _url(self) -> str:
+        url = f"{self.base_url}/socket.io/?EIO=4&transport=polling&t={time.time_ns()}"
+        return url + (f"&sid={self.sid}" if self.sid else "")
+
+    def _post(self, payload: str) -> bool:
+        try:
+            response = self.session.post(self._url(), data=payload.encode("utf-8"), timeout=REQUEST_TIMEOUT,
+                                         headers={"Content-Type": "text/plain;charset=UTF-8"})
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        try:
+            response = self.session.get(self._url(), timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            handshake = json.loads(response.text[1:])
+            self.sid = handshake["sid"]
+            ok = all(self._post(f"40{namespace},") for namespace in TERMINAL_NAMESPACES)
+            self.recorder.record("socket.io connect", time.perf_counter() - started, ok=ok,
+                                 error=None if ok else "namespace connect failed")
+        except (requests.RequestException, ValueError, KeyError) as exc:
+            self.recorder.record("socket.io connect", time.perf_counter() - started, ok=False,
+                                 error=f"{type(exc).__name__}: {exc}")
+            return
+
+        while not self.stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self._url(), timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as exc:
+                if not self.stop_event.is_set():
+                    self.recorder.record("socket.io poll", time.perf_counter() - started, ok=False,
+                                         error=f"{type(exc).__name__}: {exc}")
+                return
+            if response.status_code != 200:
+                if not self.stop_event.is_set():
+                    self.recorder.record("socket.io poll", time.perf_counter() - started, ok=False,
+                                         error=f"HTTP {response.status_code}")
+                return
+            packets = response.text.split("\x1e")
+            # Long polls legitimately wait for the next event/ping; only record
+            # them as latencies when they carried events.
+            events = [packet for packet in packets if packet.startswith("42")]
+            if events:
+                self.recorder.add_events(len(events))
+            if "2" in packets and not self._post("3"):
+                return
+            if "1" in packets:
+                return
+
+    def close(self) -> None:
+        if self.sid:
+            self._post("1")
+        self.session.close()
+
+
+# ============================================================================
+# SERVER & RUNNER
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_local_server(port: int) -> str:
+    """Run the app on its threaded Socket.IO server in a daemon thread."""
+    from app import app
+
+    # One access-log line per request would drown the report.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    thread = threading.Thread(
+        target=app.socketio.run,
+        args=(app,),
+        kwargs={"host": "127.0.0.1", "port": port, "debug": False, "use_reloader": False,
+                "log_output": False, "allow_unsafe_werkzeug": True},
+        name="load-test-server",
+        daemon=True,
+    )
+    thread.start()
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(base_url + "/api/metrics/latency", timeout=2)
+            return base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start within 30s")
+
+
+def run_stage(base_url: str, level: int, args: argparse.Namespace, products: List[Dict[str, Any]],
+              customers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    recorder = Recorder()
+    stop = threading.Event()
+    users: List[VirtualUser] = []
+    seed = args.seed * 1000 + level
+    for index in range(level):
+        users.append(Terminal(f"terminal-{index}", base_url, recorder, stop, seed + index,
+                              poll_interval=args.poll_interval))
+    for index in range(max(1, level // 4)):
+        users.append(Cashier(f"cashier-{index}", base_url, recorder, stop, seed + 100 + index,
+                             products=products, customers=customers, think_time=args.think_time))
+    for index in range(max(1, level // 10)):
+        users.append(Dashboard(f"dashboard-{index}", base_url, recorder, stop, seed + 200 + index,
+                               refresh_interval=args.dashboard_interval))
+
+    for user in users:
+        user.start()
+    time.sleep(args.stage_seconds)
+    stop.set()
+    recorder.stopped = time.perf_counter()
+    for user in users:
+        user.join(timeout=REQUEST_TIMEOUT)
+
+    summary = recorder.summary()
+    summary["level"] = level
+    summary["users"] = {
+        "terminals": level,
+        "cashiers": max(1, level // 4),
+        "dashboards": max(1, level // 10),
+    }
+    return summary
+
+
+def print_stage(summary: Dict[str, Any]) -> None:
+    users = summary["users"]
+    print(f"\n📈 Level {summary['level']}: {users['terminals']} terminals, {users['cashiers']} cashiers, "
+          f"{users['dashboards']} dashboards — {summary['rps']} req/s, errors {summary['error_rate'] * 100:.2f}%, "
+          f"{summary['socketio_events_received']} Socket.IO events")
+    print(f"   {'endpoint':36} {'count':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+    for name, row in summary["endpoints"].items():
+        print(f"   {name:36} {row['count']:>6} {row['rps']:>7.2f} {row['p50_ms']:>6.0f}ms {row['p95_ms']:>6.0f}ms "
+              f"{row['p99_ms']:>6.0f}ms {row['error_rate'] * 100:>5.1f}%")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a POS checkout day against the backend.")
+    parser.add_argument("--target", help="base URL of a running server (default: start one in-process on fake Firestore)")
+    parser.add_argument("--levels", default="5,10,20,40", help="terminal counts to run, one stage each")
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds between catalogue polls per terminal")
+    parser.add_argument("--think-time", type=float, default=3.0, help="seconds between cashier bursts")
+    parser.add_argument("--dashboard-interval", type=float, default=5.0)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--invoices", type=int, default=50_000, help="invoice history seeded in the fake")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="fake Firestore round trip per RPC")
+    parser.add_argument("--per-doc-us", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", help="JSON report path (default benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    sizes = {"products": args.products, "customers": args.customers, "invoices": args.invoices}
+
+    stages = []
+    with contextlib.ExitStack() as stack:
+        if args.target:
+            base_url = args.target.rstrip("/")
+            # Invoices must reference products/customers that exist on the target; the
+            # generator is deterministic, so this matches a server seeded with the same sizes.
+            products = generate_products(args.products, args.seed)
+            customers = generate_customers(args.customers, args.seed)
+        else:
+            from benchmarks.offline_env import OfflineEnvironment
+
+            environment = stack.enter_context(OfflineEnvironment(sizes, seed=args.seed))
+            products = environment.dataset["products"]
+            customers = environment.dataset["customers"]
+            port = _free_port()
+            print(f"🚀 Khởi động server (threading Socket.IO) trên cổng {port}...")
+            base_url = start_local_server(port)
+            environment.set_firestore_latency(args.latency_ms, per_doc_us=args.per_doc_us)
+
+        for level in levels:
+            print(f"\n⏱️  Level {level} trong {args.stage_seconds:.0f}s...", flush=True)
+            summary = run_stage(base_url, level, args, products, customers)
+            print_stage(summary)
+            stages.append(summary)
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "target": args.target or "in-process threading server + fake Firestore",
+            "sizes": sizes,
+            "latency_ms": None if args.target else args.latency_ms,
+            "stage_seconds": args.stage_seconds,
+            "poll_interval": args.poll_interval,
+            "think_time": args.think_time,
+        },
+        "stages": stages,
+    }
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, "load-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, ensure_ascii=False, indent=2)
+    print(f"\n💾 Đã lưu báo cáo: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
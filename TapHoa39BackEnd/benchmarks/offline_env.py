@@ -0,0 +1,89 @@
+"""Wire the backend to the in-memory Firestore and the KiotViet stub.
+
+Shared by ``run_benchmarks`` and ``load_test``. Services resolve their
+Firestore clients lazily on first use, so the environment must be entered
+before the first request or service call (importing earlier is fine).
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from benchmarks.fake_firestore import FakeFirestoreFactory
+from benchmarks.kiotviet_stub import KiotVietStub, route_kiotviet_to
+from benchmarks.synthetic_data import DEFAULT_SEED, INVOICES_ACCOUNT, seed_dataset
+from firebase.init_firebase import use_firestore_client_factory
+
+# Fields the services filter invoices on (Firestore has these indexed already).
+INVOICE_INDEXES = ("createdDate", "customerId", "customer.Id", "customer.id", "customer.CustomerId")
+
+
+class OfflineEnvironment:
+    def __init__(self, sizes: Dict[str, int], seed: int = DEFAULT_SEED, days: int = 365,
+                 kiotviet_latency_ms: float = 0.0):
+        self.sizes = sizes
+        self.seed = seed
+        self.days = days
+        self.kiotviet_latency_ms = kiotviet_latency_ms
+        self.factory = FakeFirestoreFactory()
+        self.dataset: Dict[str, Any] = {}
+        self.stub: Optional[KiotVietStub] = None
+        self._undo_routing = None
+        self._ledger_dir: Optional[str] = None
+        self._previous_ledger_path: Optional[str] = None
+
+    def __enter__(self) -> "OfflineEnvironment":
+        os.environ.setdefault("CACHE_STATS_LOG_INTERVAL", "0")
+        use_firestore_client_factory(self.factory)
+        # The sync checksum ledger must describe this fake Firestore, not a previous run's;
+        # the job store likewise must not see jobs of a previous run.
+        self._ledger_dir = tempfile.mkdtemp(prefix="taphoa39-bench-ledger-")
+        self._previous_paths = {name: os.environ.get(name)
+                                for name in ("SYNC_LEDGER_PATH", "JOB_STORE_PATH", "SYNC_SCHEDULER_ENABLED")}
+        os.environ["SYNC_LEDGER_PATH"] = os.path.join(self._ledger_dir, "sync_ledger.sqlite3")
+        os.environ["JOB_STORE_PATH"] = os.path.join(self._ledger_dir, "jobs.sqlite3")
+        # Scheduled syncs would compete with the measured ones.
+        os.environ["SYNC_SCHEDULER_ENABLED"] = "0"
+
+        print(f"🧪 Sinh dữ liệu: {self.sizes['products']} sản phẩm, {self.sizes['customers']} khách hàng, "
+              f"{self.sizes['invoices']} hóa đơn...")
+        started = time.perf_counter()
+        self.dataset = seed_dataset(self.factory, self.sizes, seed=self.seed, days=self.days)
+        invoices_client = self.factory.client(INVOICES_ACCOUNT)
+        for field_path in INVOICE_INDEXES:
+            invoices_client.ensure_index("invoices", field_path)
+        print(f"   xong trong {time.perf_counter() - started:.1f}s")
+        # The seeded documents live for the whole run: keep them out of the GC's
+        # full collections so pauses do not land inside random measurements.
+        gc.collect()
+        gc.freeze()
+
+        self.stub = KiotVietStub(self.dataset["products"], self.dataset["customers"],
+                                 latency_ms=self.kiotviet_latency_ms).start()
+        self._undo_routing = route_kiotviet_to(self.stub.url)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._undo_routing is not None:
+            self._undo_routing()
+            self._undo_routing = None
+        if self.stub is not None:
+            self.stub.stop()
+            self.stub = None
+        use_firestore_client_factory(None)
+        if self._ledger_dir is not None:
+            for name, previous in self._previous_paths.items():
+                if previous is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = previous
+            shutil.rmtree(self._ledger_dir, ignore_errors=True)
+            self._ledger_dir = None
+
+    def set_firestore_latency(self, latency_ms: float, per_doc_us: float = 0.0) -> None:
+        self.factory.set_latency(latency_ms, per_doc_us=per_doc_us)
@@ -0,0 +1,430 @@
+"""Offline benchmarks of the backend hot paths against the in-memory Firestore fake.
+
+Run from ``TapHoa39BackEnd``::
+
+    python -m benchmarks.run_benchmarks                      # full size: 20k products, 5k customers, 500k invoices
+    python -m benchmarks.run_benchmarks --scale 0.05 --only products.,summaries.
+    python -m benchmarks.run_benchmarks --output benchmarks/baselines/main.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baselines/main.json
+
+Every Firestore RPC costs ``--latency-ms`` (default 5ms) so round-trip heavy
+code paths show up the way they do in production. Results (median/min/max
+wall time plus Firestore RPCs, document reads and writes per run) are written
+as JSON; ``--compare`` prints the ratio against a previous run and exits with
+status 1 when a benchmark got slower than ``--threshold`` or reads more documents.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fake_firestore import FakeFirestoreFactory
+from benchmarks.kiotviet_stub import KiotVietStub
+from benchmarks.offline_env import OfflineEnvironment
+from benchmarks.synthetic_data import ANCHOR_DATE, DEFAULT_SEED, DEFAULT_SIZES, build_invoice, mutate_customers, mutate_products
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+
+class BenchmarkContext:
+    """Everything a benchmark needs: fake Firestore, KiotViet stub, services and the Flask test client."""
+
+    def __init__(self, factory: FakeFirestoreFactory, stub: KiotVietStub, dataset: Dict[str, Any], seed: int):
+        from firebase.firebase_service.cache import Cache
+        from firebase.firebase_service.customer_service import FirestoreCustomerService
+        from firebase.firebase_service.invoice_service import FirestoreInvoiceService
+        from firebase.firebase_service.product_service import FirestoreProductService
+        from app import app
+
+        self.factory = factory
+        self.stub = stub
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.product_service = FirestoreProductService(Cache("bench-products"))
+        self.invoice_service = FirestoreInvoiceService(Cache("bench-invoices"))
+        self.customer_service = FirestoreCustomerService(Cache("bench-customers"))
+        self.app = app
+        self.client = app.test_client()
+
+    def new_invoice(self) -> Dict[str, Any]:
+        created = ANCHOR_DATE + timedelta(hours=10, seconds=self.rng.randrange(36_000))
+        return build_invoice(self.rng, self.dataset["products"], self.dataset["customers"], created,
+                             invoice_id=f"BENCH{self.rng.getrandbits(40):012d}")
+
+
+class Benchmark:
+    def __init__(self, name: str, run: Callable[[BenchmarkContext, int], Optional[Dict[str, Any]]],
+                 setup: Optional[Callable[[BenchmarkContext, int], None]] = None, repeat: Optional[int] = None,
+                 ops: int = 1, description: str = ""):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.repeat = repeat
+        self.ops = ops
+        self.description = description
+
+
+def _check_status(response, expected: int = 200) -> None:
+    if response.status_code != expected:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def _run_product_sync(ctx: BenchmarkContext, mode: str) -> Dict[str, Any]:
+    result = ctx.product_service.sync_products_from_kiotviet(mode=mode)
+    if not result.get("success"):
+        raise RuntimeError(result.get("error") or result.get("message"))
+    return {"stats": {k: v for k, v in result["stats"].items() if k != "breakdown"}, "breakdown": result["stats"].get("breakdown")}
+
+
+def _sync_products(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    return _run_product_sync(ctx, "full")
+
+
+def _sync_products_delta(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    return _run_product_sync(ctx, "delta")
+
+
+def _mutate_catalogue(ctx: BenchmarkContext, iteration: int) -> None:
+    mutate_products(ctx.dataset["products"], 0.02, seed=DEFAULT_SEED + 100 + iteration)
+    ctx.stub.set_products(ctx.dataset["products"])
+
+
+def _mutate_catalogue_later(ctx: BenchmarkContext, iteration: int) -> None:
+    # Each round's edits are dated after the previous sync's high-water mark.
+    mutate_products(ctx.dataset["products"], 0.02, seed=DEFAULT_SEED + 200 + iteration, day=2 + iteration)
+    ctx.stub.set_products(ctx.dataset["products"])
+
+
+def _compare_products(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    report = ctx.product_service.get_compare_report("ledger", refresh=True)
+    return {"counts": report["counts"], "total_kiotviet": report["total_kiotviet"]}
+
+
+def _clear_product_cache(ctx: BenchmarkContext, _: int) -> None:
+    ctx.product_service.invalidate_all_product_caches()
+
+
+def _clear_app_product_cache(ctx: BenchmarkContext, _: int) -> None:
+    ctx.app.services["products"].invalidate_all_product_caches()
+
+
+def _read_all_products(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    return {"products": len(ctx.product_service.read_all_products())}
+
+
+def _http_get_products(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    response = ctx.client.get("/api/firebase/get/products")
+    _check_status(response)
+    return {"bytes": len(response.get_data())}
+
+
+def _checkout(ctx: BenchmarkContext, _: int) -> None:
+    """What one POS terminal does per sale: post the invoice, then decrement stock."""
+    for _ in range(CHECKOUTS_PER_RUN):
+        invoice = ctx.new_invoice()
+        _check_status(ctx.client.post("/api/firebase/add_invoice", json=invoice))
+        onhand_updates = [
+            {"productId": item["product"]["Id"], "minus": item["quantity"], "invoiceId": invoice["id"]}
+            for item in invoice["cartItems"]
+        ]
+        _check_status(ctx.client.put("/api/firebase/products/update_onhand_batch", json=onhand_updates))
+
+
+def _daily_summary(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    summary = ctx.invoice_service.calculate_daily_summary(ctx.dataset["last_day"])
+    return {"revenue": summary.get("revenue") if isinstance(summary, dict) else None}
+
+
+def _monthly_summary(ctx: BenchmarkContext, _: int) -> None:
+    ctx.invoice_service.calculate_monthly_summary(str(ANCHOR_DATE.year), str(ANCHOR_DATE.month))
+
+
+def _yearly_summary(ctx: BenchmarkContext, _: int) -> None:
+    ctx.invoice_service.calculate_yearly_summary(str(ANCHOR_DATE.year))
+
+
+def _top_products_day(ctx: BenchmarkContext, _: int) -> None:
+    ctx.invoice_service.calculate_top_products_summary(date=ctx.dataset["last_day"])
+
+
+def _top_products_month(ctx: BenchmarkContext, _: int) -> None:
+    ctx.invoice_service.calculate_top_products_summary(year=str(ANCHOR_DATE.year), month=str(ANCHOR_DATE.month))
+
+
+def _clear_customer_cache(ctx: BenchmarkContext, _: int) -> None:
+    ctx.customer_service.cache.store.clear()
+
+
+def _recalculate_customers(ctx: BenchmarkContext, iteration: int) -> Dict[str, Any]:
+    rng = random.Random(DEFAULT_SEED + iteration)
+    customers = rng.sample(ctx.dataset["customers"], min(RECALCULATIONS_PER_RUN, len(ctx.dataset["customers"])))
+    updated = sum(
+        1 for customer in customers
+        if ctx.customer_service.recalculate_customer_totals(str(customer["Id"])).get("updated")
+    )
+    return {"updated": updated}
+
+
+def _refresh_customer_aggregates(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    updated, errors = ctx.customer_service.refresh_customer_aggregates()
+    return {"updated": len(updated), "errors": len(errors)}
+
+
+def _refresh_customer_aggregates_per_customer(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    updated, errors = ctx.customer_service.refresh_customer_aggregates(mode="per_customer")
+    return {"updated": len(updated), "errors": len(errors)}
+
+
+def _sync_customers(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    from firebase.firebase_khachhang.import_to_firestore import update_customer_from_kiotviet_to_firestore
+
+    result = update_customer_from_kiotviet_to_firestore()
+    if not result.get("success"):
+        raise RuntimeError(result.get("error") or result.get("message"))
+    return {"stats": {k: v for k, v in result["stats"].items() if k != "breakdown"}, "breakdown": result["stats"].get("breakdown")}
+
+
+def _mutate_customers(ctx: BenchmarkContext, iteration: int) -> None:
+    mutate_customers(ctx.dataset["customers"], 0.02, seed=DEFAULT_SEED + 300 + iteration)
+    ctx.stub.set_customers(ctx.dataset["customers"])
+
+
+def _bulk_write_docs(ctx: BenchmarkContext):
+    from firebase.firebase_service.product_service import db
+
+    collection = db.collection("bench_bulk_writes")
+    return db, [(collection.document(str(product["Id"])), product) for product in ctx.dataset["products"]]
+
+
+def _bulk_write_sequential(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    db, docs = _bulk_write_docs(ctx)
+    for start in range(0, len(docs), 500):
+        batch = db.batch()
+        for reference, data in docs[start:start + 500]:
+            batch.set(reference, data)
+        batch.commit()
+    return {"written": len(docs)}
+
+
+def _bulk_write_pipelined(ctx: BenchmarkContext, _: int) -> Dict[str, Any]:
+    from firebase.bulk_write import BulkWritePipeline
+
+    db, docs = _bulk_write_docs(ctx)
+    with BulkWritePipeline(db, label="bench_bulk_writes") as pipeline:
+        for reference, data in docs:
+            pipeline.set(reference, data)
+    return pipeline.result.as_dict()
+
+
+CHECKOUTS_PER_RUN = 20
+RECALCULATIONS_PER_RUN = 20
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("products.sync_full", _sync_products, repeat=1,
+              description="First KiotViet sync: every product is written."),
+    Benchmark("products.sync_incremental", _sync_products, setup=_mutate_catalogue,
+              description="Full KiotViet sync after 2% of the catalogue changed."),
+    Benchmark("products.sync_delta", _sync_products_delta, setup=_mutate_catalogue_later,
+              description="Delta KiotViet sync (modified since the high-water mark) after 2% changed."),
+    Benchmark("bulk_write.sequential", _bulk_write_sequential,
+              description="Baseline: one 500-write batch committed at a time."),
+    Benchmark("bulk_write.pipelined", _bulk_write_pipelined,
+              description="BulkWritePipeline with default settings (established collection: no ramp-up)."),
+    Benchmark("products.compare", _compare_products,
+              description="KiotViet vs Firestore diff report from the sync ledger (no refetch)."),
+    Benchmark("products.read_all_cold", _read_all_products, setup=_clear_product_cache),
+    Benchmark("products.read_all_warm", _read_all_products),
+    Benchmark("http.get_products_cold", _http_get_products, setup=_clear_app_product_cache),
+    Benchmark("invoices.checkout", _checkout, ops=CHECKOUTS_PER_RUN,
+              description="POST /add_invoice + PUT /products/update_onhand_batch, end to end."),
+    Benchmark("summaries.daily", _daily_summary),
+    Benchmark("summaries.monthly", _monthly_summary),
+    Benchmark("summaries.yearly", _yearly_summary),
+    Benchmark("top_products.day", _top_products_day),
+    Benchmark("top_products.month", _top_products_month),
+    Benchmark("customers.recalculate", _recalculate_customers, setup=_clear_customer_cache, ops=RECALCULATIONS_PER_RUN),
+    Benchmark("customers.refresh_aggregates", _refresh_customer_aggregates, setup=_clear_customer_cache, repeat=1,
+              description="One projected scan of the invoices, totals grouped per customer."),
+    Benchmark("customers.refresh_aggregates_per_customer", _refresh_customer_aggregates_per_customer,
+              setup=_clear_customer_cache, repeat=1, description="Invoice queries per customer (N+1)."),
+    Benchmark("customers.sync_full", _sync_customers, repeat=1,
+              description="First KiotViet customer sync: checksums read from Firestore, every customer written."),
+    Benchmark("customers.sync_incremental", _sync_customers, setup=_mutate_customers,
+              description="Customer sync from the ledger after 2% of the customers changed."),
+]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _sum_stats(per_client: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for stats in per_client.values():
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def run_benchmark(ctx: BenchmarkContext, benchmark: Benchmark, repeat: int, verbose: bool) -> Dict[str, Any]:
+    repeat = benchmark.repeat or repeat
+    timings: List[float] = []
+    firestore: List[Dict[str, int]] = []
+    detail: Optional[Dict[str, Any]] = None
+
+    for iteration in range(repeat):
+        sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with sink:
+            if benchmark.setup is not None:
+                benchmark.setup(ctx, iteration)
+            ctx.factory.reset_stats()
+            started = time.perf_counter()
+            detail = benchmark.run(ctx, iteration)
+            timings.append((time.perf_counter() - started) * 1000)
+            firestore.append(_sum_stats(ctx.factory.reset_stats()))
+
+    median = statistics.median(timings)
+    result: Dict[str, Any] = {
+        "repeat": repeat,
+        "ops": benchmark.ops,
+        "median_ms": round(median, 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "per_op_ms": round(median / benchmark.ops, 2),
+        "firestore": {key: round(statistics.mean(run[key] for run in firestore), 1) for key in firestore[-1]},
+    }
+    if benchmark.description:
+        result["description"] = benchmark.description
+    if detail:
+        result["detail"] = detail
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCHMARK_DIR, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print current vs baseline and return the names of regressed benchmarks."""
+    regressions: List[str] = []
+    print(f"\n{'benchmark':32} {'baseline':>11} {'current':>11} {'ratio':>7} {'reads':>15}")
+    for name, result in current["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or "median_ms" not in result or "median_ms" not in previous:
+            print(f"{name:32} {'-':>11} {result.get('median_ms', '-'):>11}")
+            continue
+        ratio = result["median_ms"] / previous["median_ms"] if previous["median_ms"] else 1.0
+        reads_before = previous.get("firestore", {}).get("reads", 0)
+        reads_now = result.get("firestore", {}).get("reads", 0)
+        regressed = ratio > 1 + threshold or reads_now > reads_before * (1 + threshold)
+        marker = " ❌" if regressed else (" ✅" if ratio < 1 - threshold else "")
+        print(
+            f"{name:32} {previous['median_ms']:>9.1f}ms {result['median_ms']:>9.1f}ms {ratio:>6.2f}x "
+            f"{reads_before:>7.0f}→{reads_now:<7.0f}{marker}"
+        )
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline backend benchmarks (in-memory Firestore, stubbed KiotViet).")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the dataset sizes (default 1.0)")
+    parser.add_argument("--days", type=int, default=365, help="days of invoice history (default 365)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Firestore round trip per RPC")
+    parser.add_argument("--per-doc-us", type=float, default=2.0, help="extra transfer time per document read")
+    parser.add_argument("--kiotviet-latency-ms", type=float, default=50.0, help="KiotViet stub latency per request")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="comma separated name prefixes, e.g. products.,summaries.daily")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", help="JSON result path (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging (default 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="keep the services' own log output")
+    args = parser.parse_args(argv)
+
+    prefixes = [prefix.strip() for prefix in args.only.split(",") if prefix.strip()]
+    selected = [b for b in BENCHMARKS if not prefixes or any(b.name.startswith(p) for p in prefixes)]
+    if not selected:
+        parser.error(f"no benchmark matches --only {args.only!r}")
+
+    sizes = {name: max(1, int(count * args.scale)) for name, count in DEFAULT_SIZES.items()}
+
+    with OfflineEnvironment(sizes, seed=args.seed, days=args.days,
+                            kiotviet_latency_ms=args.kiotviet_latency_ms) as env:
+        dataset = env.dataset
+        with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+            ctx = BenchmarkContext(env.factory, env.stub, dataset, seed=args.seed)
+        env.set_firestore_latency(args.latency_ms, per_doc_us=args.per_doc_us)
+
+        results: Dict[str, Any] = {}
+        for benchmark in selected:
+            print(f"⏱️  {benchmark.name}...", end=" ", flush=True)
+            try:
+                results[benchmark.name] = run_benchmark(ctx, benchmark, args.repeat, args.verbose)
+                result = results[benchmark.name]
+                print(f"{result['median_ms']:.1f}ms (reads={result['firestore'].get('reads', 0):.0f}, "
+                      f"writes={result['firestore'].get('writes', 0):.0f}, rpcs={result['firestore'].get('rpcs', 0):.0f})")
+            except Exception as exc:
+                results[benchmark.name] = {"error": f"{type(exc).__name__}: {exc}"}
+                print(f"❌ {exc}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sizes": dataset["sizes"],
+            "days": args.days,
+            "latency_ms": args.latency_ms,
+            "per_doc_us": args.per_doc_us,
+            "kiotviet_latency_ms": args.kiotviet_latency_ms,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "benchmarks": results,
+    }
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, ensure_ascii=False, indent=2)
+    print(f"\n💾 Đã lưu kết quả: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        if baseline.get("meta", {}).get("sizes") != report["meta"]["sizes"]:
+            print("⚠️ Baseline dùng kích thước dữ liệu khác, so sánh chỉ mang tính tham khảo.")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ Chậm hơn baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
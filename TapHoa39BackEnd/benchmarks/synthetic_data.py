@@ -0,0 +1,235 @@
+"""Deterministic synthetic catalogue, customers and invoices for the benchmarks.
+
+Products and customers use the KiotViet API shape (what the sync endpoints
+receive); invoices use the shape the POS frontend posts to ``/add_invoice``.
+Everything is generated from a seed so two runs compare like for like.
+"""
+
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PRODUCTS_ACCOUNT = "FIREBASE_SERVICE_ACCOUNT_HANGHOA"
+CUSTOMERS_ACCOUNT = "FIREBASE_SERVICE_ACCOUNT_CUSTOMER"
+INVOICES_ACCOUNT = "FIREBASE_SERVICE_ACCOUNT_HOADON"
+
+DEFAULT_SIZES = {"products": 20_000, "customers": 5_000, "invoices": 500_000}
+DEFAULT_SEED = 39
+# Invoices are spread over the `days` days ending on this date.
+ANCHOR_DATE = datetime(2025, 6, 30)
+
+_WORDS = (
+    "Mì", "Gạo", "Nước", "Sữa", "Bánh", "Kẹo", "Dầu", "Nước mắm", "Bột giặt", "Dầu gội",
+    "Trà", "Cà phê", "Bia", "Nước ngọt", "Xúc xích", "Trứng", "Đường", "Muối", "Tương ớt", "Khăn giấy",
+)
+_BRANDS = ("Hảo Hảo", "Vinamilk", "Omo", "Tiger", "Oishi", "Acecook", "TH", "Neptune", "Chinsu", "Lavie")
+_UNITS = ("gói", "chai", "lon", "hộp", "kg", "cái")
+_FIRST_NAMES = ("An", "Bình", "Chi", "Dũng", "Hà", "Hùng", "Lan", "Minh", "Nam", "Thảo", "Trang", "Tuấn")
+_LAST_NAMES = ("Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Võ", "Đặng", "Bùi")
+
+PRODUCT_ID_BASE = 10_000_000
+CUSTOMER_ID_BASE = 500_000
+
+
+def _iso(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+def generate_products(count: int = DEFAULT_SIZES["products"], seed: int = DEFAULT_SEED) -> List[Dict[str, Any]]:
+    """KiotViet ``Products`` resource items; every 4th product has a larger "thùng" unit."""
+    rng = random.Random(seed)
+    products: List[Dict[str, Any]] = []
+    master_id: Optional[int] = None
+    for index in range(count):
+        product_id = PRODUCT_ID_BASE + index
+        name = f"{rng.choice(_WORDS)} {rng.choice(_BRANDS)} {index}"
+        cost = float(rng.randrange(2_000, 400_000, 500))
+        is_child = master_id is not None and index % 4 == 1
+        created = ANCHOR_DATE - timedelta(days=rng.randrange(30, 1500), seconds=rng.randrange(86_400))
+        modified = created + timedelta(days=rng.randrange(0, 30))
+        product = {
+            "Id": product_id,
+            "Code": f"SP{product_id}",
+            "Name": name,
+            "FullName": f"{name} ({'thùng' if is_child else rng.choice(_UNITS)})",
+            "CategoryId": 1000 + rng.randrange(60),
+            "isActive": rng.random() > 0.03,
+            "isDeleted": rng.random() < 0.01,
+            "Cost": cost * (24 if is_child else 1),
+            "BasePrice": round(cost * rng.uniform(1.1, 1.4), -2) * (24 if is_child else 1),
+            "OnHand": float(rng.randrange(0, 500)),
+            "OnHandNV": 0.0,
+            "Unit": "thùng" if is_child else rng.choice(_UNITS),
+            "MasterUnitId": master_id if is_child else None,
+            "MasterProductId": master_id if is_child else None,
+            "ConversionValue": 24.0 if is_child else 1.0,
+            "Description": None,
+            "IsRewardPoint": rng.random() < 0.2,
+            "ModifiedDate": _iso(modified),
+            "Image": f"https://cdn.example.invalid/products/{product_id}.jpg",
+            "CreatedDate": _iso(created),
+            "ProductAttributes": [],
+            "NormalizedName": name.lower(),
+            "NormalizedCode": f"sp{product_id}",
+            "OrderTemplate": None,
+        }
+        products.append(product)
+        master_id = product_id if index % 4 == 0 else master_id
+    return products
+
+
+def mutate_products(products: List[Dict[str, Any]], ratio: float, seed: int = DEFAULT_SEED + 1, day: int = 1) -> int:
+    """Change price/stock of ``ratio`` of the products in place (simulates a day of edits in KiotViet)."""
+    rng = random.Random(seed)
+    changed = rng.sample(range(len(products)), int(len(products) * ratio))
+    now = ANCHOR_DATE + timedelta(days=day)
+    for index in changed:
+        product = products[index]
+        product["BasePrice"] = round(product["BasePrice"] * rng.uniform(0.95, 1.1), -2)
+        product["OnHand"] = float(rng.randrange(0, 500))
+        product["ModifiedDate"] = _iso(now + timedelta(seconds=index))
+    return len(changed)
+
+
+def generate_customers(count: int = DEFAULT_SIZES["customers"], seed: int = DEFAULT_SEED) -> List[Dict[str, Any]]:
+    """KiotViet ``/api/customers`` items."""
+    rng = random.Random(seed + 7)
+    customers: List[Dict[str, Any]] = []
+    for index in range(count):
+        customer_id = CUSTOMER_ID_BASE + index
+        name = f"{rng.choice(_LAST_NAMES)} {rng.choice(_FIRST_NAMES)} {index}"
+        customers.append({
+            "Id": customer_id,
+            "BranchId": 878979,
+            "Code": f"KH{customer_id:06d}",
+            "Name": name,
+            "CompareCode": f"kh{customer_id:06d}",
+            "CompareName": name.lower(),
+            "ContactNumber": f"09{rng.randrange(10**8):08d}",
+            "CreatedDate": _iso(ANCHOR_DATE - timedelta(days=rng.randrange(1, 1500))),
+            "Debt": 0.0,
+            "IsActive": True,
+            "isDeleted": False,
+            "Address": f"{rng.randrange(1, 300)} đường số {rng.randrange(1, 40)}",
+            "TotalInvoiced": 0,
+            "TotalPoint": 0.0,
+            "TotalReturn": 0.0,
+            "TotalRevenue": 0.0,
+            "RewardPoint": 0.0,
+        })
+    return customers
+
+
+def mutate_customers(customers: List[Dict[str, Any]], ratio: float, seed: int = DEFAULT_SEED + 2) -> int:
+    """Change debt/contact of ``ratio`` of the customers in place."""
+    rng = random.Random(seed)
+    changed = rng.sample(range(len(customers)), int(len(customers) * ratio))
+    for index in changed:
+        customer = customers[index]
+        customer["Debt"] = float(rng.randrange(0, 50) * 10_000)
+        customer["ContactNumber"] = f"09{rng.randrange(10**8):08d}"
+    return len(changed)
+
+
+def customer_document(customer: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    data = dict(customer)
+    data["id"] = str(customer["Id"])
+    return data["id"], data
+
+
+def build_invoice(rng: random.Random, products: List[Dict[str, Any]], customers: List[Dict[str, Any]],
+                  created: datetime, invoice_id: Optional[str] = None) -> Dict[str, Any]:
+    """One checkout as posted by the POS frontend (``InvoiceTab``)."""
+    cart_items = []
+    total_price = 0.0
+    total_cost = 0.0
+    total_quantity = 0
+    for product in rng.sample(products, rng.choice((1, 1, 2, 2, 3, 4, 6))):
+        quantity = rng.choice((1, 1, 1, 2, 3, 5))
+        unit_price = product["BasePrice"]
+        cart_items.append({
+            "product": {
+                "Id": product["Id"],
+                "Code": product["Code"],
+                "FullName": product["FullName"],
+                "BasePrice": product["BasePrice"],
+                "Cost": product["Cost"],
+                "Unit": product["Unit"],
+                "OnHand": product["OnHand"],
+            },
+            "quantity": quantity,
+            "unitPrice": unit_price,
+            "totalPrice": unit_price * quantity,
+            "unitPriceSaleOff": 0,
+        })
+        total_price += unit_price * quantity
+        total_cost += product["Cost"] * quantity
+        total_quantity += quantity
+
+    customer = rng.choice(customers) if customers and rng.random() < 0.35 else None
+    debt = round(total_price * rng.choice((0.5, 1.0)), -2) if customer and rng.random() < 0.1 else 0.0
+    invoice_id = invoice_id or f"HD{created.strftime('%y%m%d%H%M%S')}{rng.randrange(10**6):06d}"
+    invoice: Dict[str, Any] = {
+        "id": invoice_id,
+        "name": f"Hóa đơn {invoice_id[-4:]}",
+        "cartItems": cart_items,
+        "createdDate": _iso(created),
+        "totalPrice": total_price,
+        "discountAmount": 0,
+        "customer": None,
+        "customerPaid": total_price - debt,
+        "totalQuantity": total_quantity,
+        "debt": debt,
+        "note": "",
+        "totalCost": total_cost,
+        "status": "checked",
+        "onHandSynced": True,
+    }
+    if customer is not None:
+        invoice["customer"] = {
+            "Id": customer["Id"],
+            "Code": customer["Code"],
+            "Name": customer["Name"],
+            "ContactNumber": customer["ContactNumber"],
+        }
+        invoice["customerId"] = str(customer["Id"])
+    return invoice
+
+
+def generate_invoices(count: int, products: List[Dict[str, Any]], customers: List[Dict[str, Any]],
+                      days: int = 365, seed: int = DEFAULT_SEED) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(doc_id, invoice)`` spread evenly over ``days`` opening hours (7h-22h)."""
+    rng = random.Random(seed + 13)
+    per_day = max(1, count // days)
+    for index in range(count):
+        day = days - 1 - min(days - 1, index // per_day)
+        created = ANCHOR_DATE - timedelta(days=day) + timedelta(seconds=rng.randrange(7 * 3600, 22 * 3600))
+        invoice = build_invoice(rng, products, customers, created, invoice_id=f"HD{index:07d}")
+        yield invoice["id"], invoice
+
+
+def seed_dataset(factory, sizes: Optional[Dict[str, int]] = None, seed: int = DEFAULT_SEED,
+                 days: int = 365) -> Dict[str, Any]:
+    """Load products, customers and invoices into a ``FakeFirestoreFactory``.
+
+    Products are stored as received from KiotViet (no sync checksum yet), so the
+    first sync benchmark rewrites all of them like a fresh deployment would.
+    """
+    sizes = {**DEFAULT_SIZES, **(sizes or {})}
+    products = generate_products(sizes["products"], seed)
+    customers = generate_customers(sizes["customers"], seed)
+
+    factory.client(PRODUCTS_ACCOUNT).load("products", ((str(p["Id"]), p) for p in products))
+    factory.client(CUSTOMERS_ACCOUNT).load("customers", (customer_document(c) for c in customers))
+    invoice_count = factory.client(INVOICES_ACCOUNT).load(
+        "invoices", generate_invoices(sizes["invoices"], products, customers, days=days, seed=seed)
+    )
+    return {
+        "products": products,
+        "customers": customers,
+        "sizes": {"products": len(products), "customers": len(customers), "invoices": invoice_count},
+        "first_day": (ANCHOR_DATE - timedelta(days=days - 1)).date().isoformat(),
+        "last_day": ANCHOR_DATE.date().isoformat(),
+    }
@@ -0,0 +1,359 @@
+"""Pipelined Firestore writes for syncs, imports and bulk deletes.
+
+Committing one ``WriteBatch`` at a time leaves the connection idle while each
+500-write batch makes its round trip. ``BulkWritePipeline`` keeps up to
+``FIRESTORE_BULK_MAX_IN_FLIGHT`` batches committing at once on a small thread
+pool:
+
+- writes are queued with ``set``/``update``/``delete`` and cut into batches of
+  ``batch_size`` (at most 500, Firestore's limit per commit);
+- writes to established collections go out unthrottled. Firestore's 500/50/5
+  rule (at most ``FIRESTORE_BULK_INITIAL_OPS_PER_SECOND`` (500) writes per
+  second to start with, 50% more every 5 minutes, up to
+  ``FIRESTORE_BULK_MAX_OPS_PER_SECOND``) applies where it belongs: to
+  pipelines filling a new collection (``ramp_up=True``) and after a
+  ``ResourceExhausted``, which starts the ramp (or halves its rate). A ramp
+  still in progress carries over to the next pipeline with the same label;
+- a batch failing with contention or a transient error (Aborted, Conflict,
+  DeadlineExceeded, ResourceExhausted, ServiceUnavailable, InternalServerError)
+  is retried with jittered backoff; if it still fails, its writes are retried
+  one document at a time, so one bad document does not sink the other 499.
+  Documents that still fail end up in ``result.errors`` instead of raising;
+- ``on_batch_committed(writes)`` is called with the writes of every commit
+  that succeeded and ``on_progress(result)`` after every batch. Callbacks run
+  one at a time (never concurrently), on the pipeline threads.
+
+Usage::
+
+    with BulkWritePipeline(db, label="products") as pipeline:
+        for product in products:
+            pipeline.set(products_ref.document(str(product["Id"])), product, merge=True)
+    print(pipeline.result.written, pipeline.result.failed)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from google.api_core import exceptions as gexc
+
+from Utility.metrics import metrics
+
+MAX_BATCH_WRITES = 500
+MAX_IN_FLIGHT = int(os.getenv("FIRESTORE_BULK_MAX_IN_FLIGHT", "4"))
+INITIAL_OPS_PER_SECOND = float(os.getenv("FIRESTORE_BULK_INITIAL_OPS_PER_SECOND", "500"))
+MAX_OPS_PER_SECOND = float(os.getenv("FIRESTORE_BULK_MAX_OPS_PER_SECOND", "10000"))
+UNTHROTTLED = 0.0
+MAX_ATTEMPTS = int(os.getenv("FIRESTORE_BULK_MAX_ATTEMPTS", "5"))
+RAMP_UP_STEP_SECONDS = 5 * 60
+RAMP_UP_FACTOR = 1.5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+RETRYABLE_ERRORS = (
+    gexc.Aborted,
+    gexc.Conflict,
+    gexc.DeadlineExceeded,
+    gexc.ResourceExhausted,
+    gexc.ServiceUnavailable,
+    gexc.InternalServerError,
+)
+
+metrics.describe("firestore_bulk_writes_total", "Documents written by bulk pipelines, by label and status.")
+metrics.describe("firestore_bulk_commit_seconds", "Bulk pipeline batch commits, by label.")
+metrics.describe("firestore_bulk_retries_total", "Bulk pipeline commits retried, by label and reason.")
+metrics.describe("firestore_bulk_throttled_seconds_total", "Time bulk pipelines waited for the ramp-up limiter.")
+
+
+class Write(NamedTuple):
+    kind: str  # "set", "update" or "delete"
+    reference: Any
+    data: Optional[Dict[str, Any]] = None
+    merge: bool = False
+    context: Any = None  # whatever the caller wants back in on_batch_committed
+
+
+@dataclass
+class BulkWriteResult:
+    written: int = 0
+    failed: int = 0
+    batches: int = 0
+    retries: int = 0
+    throttled_seconds: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "retries": self.retries,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+            "errors": list(self.errors),
+        }
+
+
+class RampUpLimiter:
+    """Write-rate limiter for the 500/50/5 rule; ``acquire(n)`` blocks until ``n`` writes may go out.
+
+    ``initial=UNTHROTTLED`` lets everything through until the first ``back_off()``.
+    """
+
+    def __init__(self, initial: float = INITIAL_OPS_PER_SECOND, maximum: float = MAX_OPS_PER_SECOND,
+                 step_seconds: float = RAMP_UP_STEP_SECONDS, factor: float = RAMP_UP_FACTOR,
+                 ramp_start: float = INITIAL_OPS_PER_SECOND):
+        self.maximum = maximum
+        self.ramp_start = ramp_start
+        self.step_seconds = step_seconds
+        self.factor = factor
+        self._base = initial
+        self._ramp_started = time.monotonic()
+        # Up to one second of writes may go out at once.
+        self._tokens = initial
+        self._updated = self._ramp_started
+        self._lock = threading.Lock()
+
+    def _rate(self, now: float) -> float:
+        steps = int((now - self._ramp_started) // self.step_seconds)
+        return min(self.maximum, self._base * self.factor ** steps)
+
+    @property
+    def rate(self) -> float:
+        with self._lock:
+            return self._rate(time.monotonic())
+
+    @property
+    def ramping(self) -> bool:
+        """Throttled and not yet back at the maximum rate."""
+        return self._base > 0 and self.rate < self.maximum
+
+    def acquire(self, count: int) -> float:
+        """Reserve ``count`` writes and return how long the caller waited for them."""
+        if self._base <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            rate = self._rate(now)
+            self._tokens = min(rate, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= count
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def back_off(self) -> None:
+        """Firestore pushed back: start the ramp, or halve its current rate, and ramp up again from there."""
+        with self._lock:
+            now = time.monotonic()
+            if self._base <= 0:
+                self._base = self.ramp_start
+                self._tokens = 0.0
+            else:
+                self._base = max(1.0, self._rate(now) / 2)
+                self._tokens = min(self._tokens, self._base)
+            self._ramp_started = now
+            self._updated = now
+
+
+_limiters: Dict[str, RampUpLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter_for(label: str, ramp_up: bool, maximum: float) -> RampUpLimiter:
+    """The label's ramp still in progress if there is one, else a new limiter."""
+    with _limiters_lock:
+        limiter = _limiters.get(label)
+        if limiter is None or not limiter.ramping:
+            limiter = RampUpLimiter(INITIAL_OPS_PER_SECOND if ramp_up else UNTHROTTLED, maximum)
+            _limiters[label] = limiter
+        return limiter
+
+
+def _backoff_seconds(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+class BulkWritePipeline:
+    def __init__(self, client: Any, *, batch_size: int = MAX_BATCH_WRITES, max_in_flight: int = MAX_IN_FLIGHT,
+                 ramp_up: bool = False, max_ops_per_second: float = MAX_OPS_PER_SECOND,
+                 max_attempts: int = MAX_ATTEMPTS,
+                 on_batch_committed: Optional[Callable[[List[Write]], None]] = None,
+                 on_progress: Optional[Callable[[BulkWriteResult], None]] = None,
+                 label: str = "firestore"):
+        self.client = client
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_WRITES))
+        self.max_attempts = max(1, max_attempts)
+        self.label = label
+        self.result = BulkWriteResult()
+        # ramp_up: the pipeline fills a new collection, so it starts at the bottom of the ramp.
+        self.limiter = _limiter_for(label, ramp_up, max_ops_per_second)
+        self._on_batch_committed = on_batch_committed
+        self._on_progress = on_progress
+        self._pending: List[Write] = []
+        self._futures: Set[Future] = set()
+        self._callback_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._callback_lock = threading.Lock()
+        # Caps queued + committing batches, so a fast producer cannot buffer the whole job in memory.
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix=f"bulk-{label}")
+        self._closed = False
+
+    # -- Queueing ----------------------------------------------------------
+    def set(self, reference: Any, data: Dict[str, Any], *, merge: bool = False, context: Any = None) -> None:
+        self._add(Write("set", reference, data, merge, context))
+
+    def update(self, reference: Any, data: Dict[str, Any], *, context: Any = None) -> None:
+        self._add(Write("update", reference, data, False, context))
+
+    def delete(self, reference: Any, *, context: Any = None) -> None:
+        self._add(Write("delete", reference, None, False, context))
+
+    def _add(self, write: Write) -> None:
+        if self._closed:
+            raise RuntimeError("BulkWritePipeline is closed")
+        self._pending.append(write)
+        if len(self._pending) >= self.batch_size:
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        writes, self._pending = self._pending, []
+        if not writes:
+            return
+        self._raise_callback_error()
+        self._slots.acquire()
+        waited = self.limiter.acquire(len(writes))
+        if waited:
+            metrics.inc("firestore_bulk_throttled_seconds_total", waited, {"label": self.label})
+            with self._lock:
+                self.result.throttled_seconds += waited
+        future = self._executor.submit(self._commit, writes)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._batch_done)
+
+    def _batch_done(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+        self._slots.release()
+
+    # -- Completion --------------------------------------------------------
+    def flush(self) -> BulkWriteResult:
+        """Commit everything queued so far and wait for it."""
+        self._dispatch()
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                break
+            for future in futures:
+                future.result()
+        self._raise_callback_error()
+        return self.result
+
+    def close(self) -> BulkWriteResult:
+        if self._closed:
+            return self.result
+        try:
+            return self.flush()
+        finally:
+            self._closed = True
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "BulkWritePipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Let in-flight batches finish, but drop what was still queued and keep the original error.
+            self._pending = []
+            self._closed = True
+            self._executor.shutdown(wait=True)
+
+    def _raise_callback_error(self) -> None:
+        if self._callback_error is not None:
+            error, self._callback_error = self._callback_error, None
+            raise error
+
+    # -- Commit (pipeline threads) -----------------------------------------
+    def _commit(self, writes: List[Write]) -> None:
+        error = self._commit_with_retry(writes)
+        if error is None:
+            self._finish(writes, [])
+            return
+        if len(writes) == 1:
+            self._finish([], [(writes[0], error)])
+            return
+        # The batch was atomic, so none of it landed: retry each document on its own.
+        print(f"⚠️ Batch {self.label} ({len(writes)} ghi) lỗi ({type(error).__name__}), thử lại từng document...")
+        committed: List[Write] = []
+        failed = []
+        for write in writes:
+            single_error = self._commit_with_retry([write])
+            if single_error is None:
+                committed.append(write)
+            else:
+                failed.append((write, single_error))
+        self._finish(committed, failed)
+
+    def _commit_with_retry(self, writes: List[Write]) -> Optional[Exception]:
+        """Commit ``writes`` as one batch; returns the final error, or None once committed."""
+        for attempt in range(self.max_attempts):
+            batch = self.client.batch()
+            for write in writes:
+                if write.kind == "set":
+                    batch.set(write.reference, write.data, merge=write.merge)
+                elif write.kind == "update":
+                    batch.update(write.reference, write.data)
+                else:
+                    batch.delete(write.reference)
+            started = time.perf_counter()
+            try:
+                batch.commit()
+            except RETRYABLE_ERRORS as exc:
+                if isinstance(exc, gexc.ResourceExhausted):
+                    self.limiter.back_off()
+                if attempt + 1 >= self.max_attempts:
+                    return exc
+                metrics.inc("firestore_bulk_retries_total", labels={"label": self.label, "reason": type(exc).__name__})
+                with self._lock:
+                    self.result.retries += 1
+                time.sleep(_backoff_seconds(attempt))
+            except gexc.GoogleAPICallError as exc:
+                return exc
+            else:
+                metrics.observe("firestore_bulk_commit_seconds", time.perf_counter() - started, {"label": self.label})
+                return None
+
+    def _finish(self, committed: List[Write], failed: List[Any]) -> None:
+        if committed:
+            metrics.inc("firestore_bulk_writes_total", len(committed), {"label": self.label, "status": "ok"})
+        if failed:
+            metrics.inc("firestore_bulk_writes_total", len(failed), {"label": self.label, "status": "failed"})
+        with self._callback_lock:
+            with self._lock:
+                self.result.batches += 1
+                self.result.written += len(committed)
+                self.result.failed += len(failed)
+                for write, error in failed:
+                    self.result.errors.append({
+                        "id": getattr(write.reference, "id", None),
+                        "kind": write.kind,
+                        "error": str(error),
+                    })
+            try:
+                if committed and self._on_batch_committed:
+                    self._on_batch_committed(committed)
+                if self._on_progress:
+                    self._on_progress(self.result)
+            except Exception as exc:  # surfaced to the producer on its next call
+                self._callback_error = self._callback_error or exc
@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 from firebase.init_firebase import init_firestore
 from google.cloud import firestore
+from Utility.sync_ledger import CLEARED_CHECKSUM, get_sync_ledger
 
 load_dotenv()
 
@@ -68,7 +69,7 @@ def update_products_from_banhang_app_to_firestore(update_payload):
                 target_onhand = int(current_onhand) - int(minus_value)
 
             # Update product OnHand
-            transaction.update(doc_ref, {"OnHand": target_onhand})
+            transaction.update(doc_ref, {"OnHand": target_onhand, **CLEARED_CHECKSUM})
 
             # Create processed marker if available — use transaction.set
             if proc_ref is not None:
@@ -109,6 +110,9 @@ def update_products_from_banhang_app_to_firestore(update_payload):
                 # Best-effort logging; continue with next item
                 print(f"Error processing product {product_id}: {exc}")
 
+        # OnHand changed outside the KiotViet sync: let its next run compare these again.
+        get_sync_ledger(COLLECTION_NAME).forget(product["Id"] for product in updated_products)
+
         return {
             "message": f"Đã cập nhật số lượng {len(updated_products)} sản phẩm",
             "updated_products": updated_products,
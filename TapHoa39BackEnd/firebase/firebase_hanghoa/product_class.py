@@ -1,11 +1,53 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Any, List, Optional
+from operator import attrgetter
+from typing import Any, Dict, List, Optional
 
 from dateutil.parser import isoparse
 
 
-@dataclass
+# The converters live at module level: from_dict runs for every product of a
+# sync, and nested helpers would be re-created on each call.
+def _safe_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _safe_int(value: Any, default: Optional[int] = None) -> Optional[int]:
+    try:
+        return int(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _safe_bool(value: Any, default: bool) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value in ("true", "True", 1, "1"):
+        return True
+    if value in ("false", "False", 0, "0"):
+        return False
+    return default
+
+
+def _safe_datetime(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        # The C parser covers what KiotViet sends; isoparse handles the rest.
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return isoparse(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# slots: no per-instance __dict__, and to_firestore() builds the only dict a sync needs.
+@dataclass(slots=True)
 class Product:
     Id: int
     Code: Optional[str] = None
@@ -32,63 +74,43 @@ class Product:
     NormalizedCode: Optional[str] = None
     OrderTemplate: Optional[str] = None
 
-    @staticmethod
-    def from_dict(data: dict) -> "Product":
+    @classmethod
+    def from_dict(cls, data: dict) -> "Product":
         if "Id" not in data:
             raise KeyError("Id")
 
-        def safe_float(value: Any, default: float = 0.0) -> float:
-            try:
-                return float(value)
-            except (TypeError, ValueError):
-                return default
-
-        def safe_int(value: Any, default: Optional[int] = None) -> Optional[int]:
-            try:
-                return int(value) if value is not None else default
-            except (TypeError, ValueError):
-                return default
-
-        def safe_bool(value: Any, default: bool) -> bool:
-            if isinstance(value, bool):
-                return value
-            if value in ("true", "True", 1, "1"):
-                return True
-            if value in ("false", "False", 0, "0"):
-                return False
-            return default
-
-        def safe_datetime(value: Any) -> Optional[datetime]:
-            if not value:
-                return None
-            try:
-                return isoparse(value)
-            except (TypeError, ValueError):
-                return None
-
-        return Product(
-            Id=safe_int(data.get("Id"), 0) or 0,
-            Code=data.get("Code"),
-            Name=data.get("Name"),
-            FullName=data.get("FullName"),
-            CategoryId=safe_int(data.get("CategoryId")),
-            isActive=safe_bool(data.get("isActive"), True),
-            isDeleted=safe_bool(data.get("isDeleted"), False),
-            Cost=safe_float(data.get("Cost"), 0.0),
-            BasePrice=safe_float(data.get("BasePrice"), 0.0),
-            OnHand=safe_float(data.get("OnHand"), 0.0),
-            Unit=data.get("Unit"),
-            MasterUnitId=safe_int(data.get("MasterUnitId")),
-            MasterProductId=safe_int(data.get("MasterProductId")),
-            ConversionValue=safe_float(data.get("ConversionValue"), 0.0),
-            Description=data.get("Description"),
-            IsRewardPoint=safe_bool(data.get("IsRewardPoint"), False),
-            ModifiedDate=safe_datetime(data.get("ModifiedDate")),
-            Image=data.get("Image"),
-            CreatedDate=safe_datetime(data.get("CreatedDate")),
-            ProductAttributes=data.get("ProductAttributes", []) or [],
-            OnHandNV=safe_float(data.get("OnHandNV"), 0.0),
-            NormalizedName=data.get("NormalizedName"),
-            NormalizedCode=data.get("NormalizedCode"),
-            OrderTemplate=data.get("OrderTemplate"),
-        )
\ No newline at end of file
+        get = data.get
+        return cls(
+            Id=_safe_int(get("Id"), 0) or 0,
+            Code=get("Code"),
+            Name=get("Name"),
+            FullName=get("FullName"),
+            CategoryId=_safe_int(get("CategoryId")),
+            isActive=_safe_bool(get("isActive"), True),
+            isDeleted=_safe_bool(get("isDeleted"), False),
+            Cost=_safe_float(get("Cost"), 0.0),
+            BasePrice=_safe_float(get("BasePrice"), 0.0),
+            OnHand=_safe_float(get("OnHand"), 0.0),
+            Unit=get("Unit"),
+            MasterUnitId=_safe_int(get("MasterUnitId")),
+            MasterProductId=_safe_int(get("MasterProductId")),
+            ConversionValue=_safe_float(get("ConversionValue"), 0.0),
+            Description=get("Description"),
+            IsRewardPoint=_safe_bool(get("IsRewardPoint"), False),
+            ModifiedDate=_safe_datetime(get("ModifiedDate")),
+            Image=get("Image"),
+            CreatedDate=_safe_datetime(get("CreatedDate")),
+            ProductAttributes=get("ProductAttributes", []) or [],
+            OnHandNV=_safe_float(get("OnHandNV"), 0.0),
+            NormalizedName=get("NormalizedName"),
+            NormalizedCode=get("NormalizedCode"),
+            OrderTemplate=get("OrderTemplate"),
+        )
+
+    def to_firestore(self) -> Dict[str, Any]:
+        """A new dict of every field, in declaration order (what ``__dict__`` used to give)."""
+        return dict(zip(PRODUCT_FIELD_NAMES, _product_values(self)))
+
+
+PRODUCT_FIELD_NAMES = tuple(f.name for f in fields(Product))
+_product_values = attrgetter(*PRODUCT_FIELD_NAMES)
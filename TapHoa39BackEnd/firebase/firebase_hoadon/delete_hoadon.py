@@ -1,9 +1,8 @@
-import time
 from datetime import datetime
 from typing import List, Tuple
 
-from google.api_core.exceptions import ResourceExhausted
 from google.cloud import firestore
+from firebase.bulk_write import BulkWritePipeline
 from firebase.init_firebase import init_firestore
 from dotenv import load_dotenv
 
@@ -14,8 +13,6 @@ load_dotenv()
 DB = init_firestore("FIREBASE_SERVICE_ACCOUNT_HOADON", app_name="hoadon_app")
 INV_COLLECTION = "invoices"
 BATCH_LIMIT = 400
-MAX_COMMIT_RETRIES = 5
-INITIAL_BACKOFF_SECONDS = 2
 
 
 def _collect_docs_for_month_by_string_date(year: int, month: int, field: str) -> List[firestore.DocumentSnapshot]:
@@ -90,19 +87,6 @@ def _find_docs_to_delete(year: int, month: int) -> Tuple[List[firestore.Document
     return [], ""
 
 
-def _commit_with_retry(batch: firestore.WriteBatch) -> None:
-    delay = INITIAL_BACKOFF_SECONDS
-    for attempt in range(1, MAX_COMMIT_RETRIES + 1):
-        try:
-            batch.commit()
-            return
-        except ResourceExhausted:
-            if attempt == MAX_COMMIT_RETRIES:
-                raise
-            time.sleep(delay)
-            delay *= 2
-
-
 def delete_invoices_by_month(year: int, month: int) -> dict:
     """
     Delete all invoices in [YYYY-MM-01, YYYY-MM-last] from Firestore.
@@ -110,20 +94,20 @@ def delete_invoices_by_month(year: int, month: int) -> dict:
     """
     docs, field_used = _find_docs_to_delete(year, month)
     total = len(docs)
-    deleted = 0
 
     if total == 0:
         return {"deleted": 0, "total_matched": 0, "field": field_used}
 
-    for i in range(0, total, BATCH_LIMIT):
-        batch = DB.batch()
-        chunk = docs[i : i + BATCH_LIMIT]
-        for snap in chunk:
-            batch.delete(snap.reference)
-        _commit_with_retry(batch)
-        deleted += len(chunk)
+    # Retries (ResourceExhausted included) and throttling are handled by the pipeline.
+    with BulkWritePipeline(DB, batch_size=BATCH_LIMIT, label="invoices_delete") as pipeline:
+        for snap in docs:
+            pipeline.delete(snap.reference)
 
-    return {"deleted": deleted, "total_matched": total, "field": field_used}
+    summary = {"deleted": pipeline.result.written, "total_matched": total, "field": field_used}
+    if pipeline.result.failed:
+        summary["failed"] = pipeline.result.failed
+        summary["errors"] = pipeline.result.errors
+    return summary
 
 
 if __name__ == "__main__":
@@ -1,110 +1,204 @@
-import json
-import firebase_admin
-import requests
-from firebase_admin import credentials, firestore
-from FromKiotViet.get_all_customer import get_entire_customer
-from FromKiotViet.get_authorization import auth_token
-from Utility.get_env import LatestBranchId, retailer
-import requests
-import hashlib
-import os
+"""Customer sync from KiotViet into Firestore.
+
+Works like the product sync (``FirestoreProductService.sync_products_from_kiotviet``):
+
+- each customer doc carries ``SyncChecksum``, the fingerprint of the KiotViet
+  record last written; what Firestore holds comes from the local checksum
+  ledger (``Utility.sync_ledger``, namespace ``customers``), or from a
+  projected read of just that field when the ledger is due for verification
+  or ``SyncState/customers`` names another host's ledger;
+- KiotViet pages are fetched in parallel and compared as they arrive
+  (``FromKiotViet.get_all_customer.iter_customer_pages``);
+- changed customers are merged and ``isDeleted`` ones deleted through a
+  ``BulkWritePipeline``; the ledger records each batch once it committed
+  (deleted ids as ``DELETED_CHECKSUM``, so they are not deleted again).
+"""
+
+import time
+from datetime import datetime
+
 from dotenv import load_dotenv
 
+from FromKiotViet.get_all_customer import iter_customer_pages
+from FromKiotViet.resource_pager import IncompleteListingError
+from FromKiotViet.Model.customer import CUSTOMER_FIELD_NAMES
 from firebase.init_firebase import init_firestore
+from firebase.bulk_write import BulkWritePipeline
+from Utility.jobs import report_progress
+from Utility.fingerprint import Fingerprinter
+from Utility.sync_ledger import SYNC_STATE_COLLECTION, get_sync_ledger
 
 load_dotenv()
 
-# API_URL = f"http://127.0.0.1:5000/api/customers"
-
 COLLECTION_NAME = "customers"
-
+# Ledger value of a customer the sync deleted from Firestore.
+DELETED_CHECKSUM = "deleted"
 
 db = init_firestore("FIREBASE_SERVICE_ACCOUNT_CUSTOMER")
+sync_state_ref = db.collection(SYNC_STATE_COLLECTION).document(COLLECTION_NAME)
 
-
-# Hàm băm item để so sánh nhanh
-def hash_item(item):
-    # Đảm bảo thứ tự khóa và bỏ qua các trường không cần so sánh
-    item_copy = dict(item)
-    return hashlib.md5(json.dumps(item_copy, sort_keys=True).encode()).hexdigest()
-
-
-def fetch_firestore_customers():
-    print("Đang tải dữ liệu từ Firestore...")
-    customers_ref = db.collection(COLLECTION_NAME)
-    docs = customers_ref.stream()
-    firestore_items = {}
-    for doc in docs:
-        data = doc.to_dict()
-        item_id = data.get('Id')
-        if item_id:
-            firestore_items[item_id] = {
-                'data': data,
-                'hash': hash_item(data)
-            }
-    print(f"Đã tải {len(firestore_items)} khách hàng từ Firestore.")
-    return firestore_items
-
-
-def fetch_api_customers():
-    print("Đang gọi API /api/customers...")
-    items=get_entire_customer()
-    # response = requests.get(API_URL)  # Sửa lại URL phù hợp
-    # response.raise_for_status()
-    # items = response.json()
-    print(f"Đã nhận {len(items)} khách hàng từ API.")
-    return items
+CUSTOMER_FINGERPRINT = Fingerprinter(CUSTOMER_FIELD_NAMES)
 
 
-def update_changed_customer(api_items, firestore_items):
-    changed_items = []
-    deleted_items = []
+def get_customer_ledger():
+    return get_sync_ledger(COLLECTION_NAME)
 
-    for item in api_items:
-        item_id = item.get('Id')
-        if not item_id:
-            continue
 
-        if item.get('isDeleted', False):
-            deleted_items.append(item_id)
-            continue
-
-        new_hash = hash_item(item)
-        old_hash = firestore_items.get(item_id, {}).get('hash')
-
-        if new_hash != old_hash:
-            changed_items.append(item)
-
-    print(f"Phát hiện {len(changed_items)} khách hàng thay đổi. Đang cập nhật...")
-    print(f"Phát hiện {len(deleted_items)} khách hàng cần xóa khỏi Firestore.")
-
-    # Ghi theo batch (500 item mỗi batch)
-    BATCH_SIZE = 500
-    for i in range(0, len(changed_items), BATCH_SIZE):
-        batch = db.batch()
-        for item in changed_items[i:i + BATCH_SIZE]:
-            doc_ref = db.collection(COLLECTION_NAME).document(str(item['Id']))
-            batch.set(doc_ref, item)
-        batch.commit()
-        print(f"Đã cập nhật batch {i // BATCH_SIZE + 1}")
-
-    # Xóa theo batch (500 item mỗi batch)
-    for i in range(0, len(deleted_items), BATCH_SIZE):
-        batch = db.batch()
-        for item_id in deleted_items[i:i + BATCH_SIZE]:
-            doc_ref = db.collection(COLLECTION_NAME).document(str(item_id))
-            batch.delete(doc_ref)
-        batch.commit()
-        print(f"Đã xóa batch {i // BATCH_SIZE + 1}")
-
-    print("Đã hoàn tất cập nhật và xóa.")
+def load_customer_checksums(ledger):
+    """``(checksums, source)``: from the ledger, or from Firestore (projected) when it is due for verification."""
+    snapshot = sync_state_ref.get()
+    if not ledger.needs_verification((snapshot.to_dict() or {}) if snapshot.exists else {}):
+        return ledger.load(), "ledger"
+    print("  📥 Lấy checksums khách hàng từ Firestore (kiểm tra sổ checksum)...")
+    checksums = {}
+    for doc in db.collection(COLLECTION_NAME).select(["SyncChecksum"]).stream():
+        checksums[doc.id] = (doc.to_dict() or {}).get("SyncChecksum")
+    ledger.replace_all(checksums)
+    ledger.claim(sync_state_ref)
+    return checksums, "firestore"
 
 
 def update_customer_from_kiotviet_to_firestore():
-    firestore_customers = fetch_firestore_customers()
-    api_customers = fetch_api_customers()
-    update_changed_customer(api_customers, firestore_customers)
-    return {"message": "All customers have already been updated from kiotviet to firestore"}
-
-# update_customer_from_kiotviet_to_firestore()
-
+    start_time = time.time()
+    try:
+        print("🔄 Bắt đầu đồng bộ khách hàng từ KiotViet...")
+        report_progress(stage="checksums")
+        ledger = get_customer_ledger()
+        checksum_start = time.time()
+        existing_checksums, checksum_source = load_customer_checksums(ledger)
+        checksum_time = time.time() - checksum_start
+        print(f"  ✅ Đã lấy {len(existing_checksums)} checksums ({checksum_source}) trong {checksum_time:.2f}s")
+
+        customers_ref = db.collection(COLLECTION_NAME)
+        api_start = time.time()
+        compare_time = 0.0
+        update_time = 0.0
+        total_api_items = 0
+        unchanged_count = 0
+        upserted_ids = []
+        deleted_ids = []
+
+        def record_committed(writes):
+            ledger.record(
+                (write.context, DELETED_CHECKSUM if write.kind == "delete" else write.data["SyncChecksum"])
+                for write in writes
+            )
+            for write in writes:
+                (deleted_ids if write.kind == "delete" else upserted_ids).append(write.context)
+
+        def log_write_progress(result):
+            if result.batches % 5 == 0:
+                print(f"    Đã ghi {result.written} khách hàng...")
+
+        pipeline = BulkWritePipeline(db, on_batch_committed=record_committed,
+                                     on_progress=log_write_progress, label="customers_sync")
+
+        def queue(write, *args, **kwargs):
+            # Blocks only while the pipeline is full or throttled; that wait counts as update time.
+            nonlocal update_time
+            update_start = time.time()
+            write(*args, **kwargs)
+            update_time += time.time() - update_start
+
+        # Deleted in KiotViet but already absent from Firestore (known only after a Firestore read).
+        already_deleted = []
+        listing_error = None
+
+        def customer_pages():
+            # Keep what could be fetched; a missing page only surfaces once the rest is processed.
+            nonlocal listing_error
+            try:
+                yield from iter_customer_pages()
+            except IncompleteListingError as exc:
+                listing_error = exc
+
+        report_progress(stage="compare", received=0)
+        for _, page in customer_pages():
+            for item in page:
+                total_api_items += 1
+                compare_start = time.time()
+                doc_id = str(item.get("Id") or "")
+                if not doc_id:
+                    compare_time += time.time() - compare_start
+                    continue
+                stored_checksum = existing_checksums.get(doc_id)
+
+                if item.get("isDeleted", False):
+                    if checksum_source == "firestore":
+                        needs_delete = doc_id in existing_checksums
+                    else:
+                        needs_delete = stored_checksum != DELETED_CHECKSUM
+                    compare_time += time.time() - compare_start
+                    if needs_delete:
+                        queue(pipeline.delete, customers_ref.document(doc_id), context=doc_id)
+                    else:
+                        unchanged_count += 1
+                        if checksum_source == "firestore":
+                            already_deleted.append((doc_id, DELETED_CHECKSUM))
+                    continue
+
+                checksum = CUSTOMER_FINGERPRINT(item)
+                if stored_checksum == checksum:
+                    unchanged_count += 1
+                    compare_time += time.time() - compare_start
+                    continue
+                customer_to_store = dict(item)
+                customer_to_store["SyncChecksum"] = checksum
+                customer_to_store["SyncTimestamp"] = datetime.utcnow().isoformat()
+                compare_time += time.time() - compare_start
+                queue(pipeline.set, customers_ref.document(doc_id), customer_to_store, merge=True, context=doc_id)
+            report_progress(received=total_api_items, written=pipeline.result.written)
+
+        update_start = time.time()
+        write_result = pipeline.close()
+        update_time += time.time() - update_start
+        ledger.record(already_deleted)
+        api_time = time.time() - api_start - compare_time - update_time
+        total_time = time.time() - start_time
+
+        print(f"  ✅ Đã lấy {total_api_items} khách hàng từ KiotViet trong {api_time:.2f}s")
+        print(f"  ✅ So sánh hoàn tất trong {compare_time:.2f}s: {len(upserted_ids)} cập nhật, "
+              f"{len(deleted_ids)} xóa, {unchanged_count} không đổi")
+        if write_result.failed:
+            print(f"  ⚠️ {write_result.failed} khách hàng ghi/xóa thất bại, sẽ được so sánh lại ở lần đồng bộ sau: "
+                  f"{write_result.errors[:5]}")
+        if listing_error is not None:
+            print(f"⚠️ Đồng bộ khách hàng chưa đầy đủ sau {total_time:.2f}s: {listing_error}")
+        else:
+            print(f"✅ Đồng bộ khách hàng hoàn tất trong {total_time:.2f}s ({write_result.batches} batches)")
+
+        result = {
+            "success": listing_error is None,
+            "message": ("All customers have already been updated from kiotviet to firestore"
+                        if listing_error is None else "Đồng bộ khách hàng chưa đầy đủ"),
+            "checksum_source": checksum_source,
+            "stats": {
+                "total_api_items": total_api_items,
+                "updated_or_created": len(upserted_ids),
+                "deleted": len(deleted_ids),
+                "unchanged": unchanged_count,
+                "write_failures": write_result.failed,
+                "total_time_seconds": round(total_time, 2),
+                "breakdown": {
+                    "checksum_fetch": round(checksum_time, 2),
+                    "api_fetch": round(api_time, 2),
+                    "compare": round(compare_time, 2),
+                    "update": round(update_time, 2)
+                }
+            }
+        }
+        if listing_error is not None:
+            result["error"] = str(listing_error)
+            result["error_type"] = type(listing_error).__name__
+            result["failed_pages"] = listing_error.failed_pages
+        return result
+    except Exception as exc:
+        import traceback
+        print(f"❌ Lỗi khi đồng bộ khách hàng từ KiotViet: {exc}")
+        print(traceback.format_exc())
+        return {
+            "success": False,
+            "message": "Đồng bộ khách hàng thất bại",
+            "error": str(exc),
+            "error_type": type(exc).__name__
+        }
@@ -1,21 +1,206 @@
+import os
+import sys
+import threading
 import time
+import weakref
+
+from Utility.message_bus import get_bus
+from Utility.metrics import metrics
+from Utility.tracing import add_event
+
+STAT_FIELDS = ("hits", "misses", "expirations", "invalidations", "sets")
+# Lists/dicts bigger than this are measured on a sample and extrapolated.
+SIZE_SAMPLE = 200
+# Bus channel carrying invalidations to the other worker processes.
+CACHE_CHANNEL = "cache"
+# Keys per bus message, keeps a full-catalog invalidation well under the datagram limit.
+KEYS_PER_MESSAGE = 500
+
+_caches = weakref.WeakSet()
+
+
+def _apply_remote(payload):
+    """Bus handler: replay another worker's invalidation on the same-named cache here."""
+    for cache in list(_caches):
+        if cache.name != payload.get("cache"):
+            continue
+        op = payload.get("op")
+        if op == "invalidate":
+            for key in payload.get("keys", ()):
+                cache._drop(key)
+        elif op == "version":
+            cache._merge_version(payload.get("version", 0))
+
+
+def key_prefix(key):
+    """Group keys for statistics: "invoices_by_customer_id:42" -> "invoices_by_customer_id", "123" -> "<id>"."""
+    key = str(key)
+    if ":" in key:
+        return key.split(":", 1)[0]
+    if key.isdigit():
+        return "<id>"
+    return key
+
+
+def approx_size(value, _depth=0):
+    """Rough deep size in bytes; large containers are sampled."""
+    size = sys.getsizeof(value)
+    if _depth > 6:
+        return size
+    if isinstance(value, dict):
+        items = list(value.items())
+        sample = items[:SIZE_SAMPLE]
+        inner = sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in sample)
+        return size + (inner * len(items) // len(sample) if sample else 0)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = value if isinstance(value, (list, tuple)) else list(value)
+        sample = items[:SIZE_SAMPLE]
+        inner = sum(approx_size(v, _depth + 1) for v in sample)
+        return size + (inner * len(items) // len(sample) if sample else 0)
+    return size
+
 
 class Cache:
-    def __init__(self):
+    def __init__(self, name="default"):
+        self.name = name
         self.store = {}
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        # Catalog version: bumped whenever a whole collection changes, shared across workers.
+        self.version = 0
+        self._bus = get_bus()
+        self._bus.subscribe(CACHE_CHANNEL, _apply_remote)
+        _caches.add(self)
 
-    def set(self, key, value, ttl=300):
-        self.store[key] = {"data": value, "expires": time.time() + ttl}
+    def _count(self, key, field):
+        prefix = key_prefix(key)
+        with self._stats_lock:
+            stats = self._stats.get(prefix)
+            if stats is None:
+                stats = self._stats[prefix] = dict.fromkeys(STAT_FIELDS, 0)
+            stats[field] += 1
 
-    def get(self, key):
+    def _lookup(self, key, count_hit):
         item = self.store.get(key)
         if item and time.time() < item["expires"]:
+            if count_hit:
+                self._count(key, "hits")
+                add_event("cache.hit", cache=self.name, key=key)
             return item["data"]
+        if item is not None:
+            self._count(key, "expirations")
+        self._count(key, "misses")
+        add_event("cache.miss", cache=self.name, key=key)
         self.store.pop(key, None)
         return None
 
+    def set(self, key, value, ttl=300):
+        self.store[key] = {"data": value, "expires": time.time() + ttl}
+        self._count(key, "sets")
+
+    def get(self, key):
+        return self._lookup(key, count_hit=True)
+
     def has(self, key):
-        return self.get(key) is not None
+        # Callers follow a positive has() with get(), which records the hit.
+        return self._lookup(key, count_hit=False) is not None
+
+    def _drop(self, key):
+        if self.store.pop(key, None) is not None:
+            self._count(key, "invalidations")
 
     def invalidate(self, key):
-        self.store.pop(key, None)
+        self._drop(key)
+        self._bus.publish(CACHE_CHANNEL, {"cache": self.name, "op": "invalidate", "keys": [key]})
+
+    def invalidate_many(self, keys):
+        """Invalidate several keys here and in the other workers with a few bus messages."""
+        keys = list(keys)
+        for key in keys:
+            self._drop(key)
+        for start in range(0, len(keys), KEYS_PER_MESSAGE):
+            self._bus.publish(
+                CACHE_CHANNEL,
+                {"cache": self.name, "op": "invalidate", "keys": keys[start:start + KEYS_PER_MESSAGE]},
+            )
+
+    def _merge_version(self, version):
+        if version > self.version:
+            self.version = version
+
+    def bump_version(self):
+        """Move the catalog version forward (wall-clock ms, so concurrent bumps in two workers still merge)."""
+        self._merge_version(max(self.version + 1, int(time.time() * 1000)))
+        self._bus.publish(CACHE_CHANNEL, {"cache": self.name, "op": "version", "version": self.version})
+        return self.version
+
+    def stats(self, include_memory=True):
+        """Per key-prefix counters plus live entry counts and approximate memory."""
+        now = time.time()
+        with self._stats_lock:
+            prefixes = {prefix: dict(counters) for prefix, counters in self._stats.items()}
+
+        for key, item in list(self.store.items()):
+            prefix = key_prefix(key)
+            stats = prefixes.setdefault(prefix, dict.fromkeys(STAT_FIELDS, 0))
+            if now < item["expires"]:
+                stats["entries"] = stats.get("entries", 0) + 1
+                if include_memory:
+                    stats["approx_bytes"] = stats.get("approx_bytes", 0) + approx_size(item["data"])
+            else:
+                stats["stale_entries"] = stats.get("stale_entries", 0) + 1
+
+        for stats in prefixes.values():
+            stats.setdefault("entries", 0)
+            stats.setdefault("stale_entries", 0)
+            if include_memory:
+                stats.setdefault("approx_bytes", 0)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+
+        return {"name": self.name, "version": self.version, "prefixes": prefixes}
+
+
+def all_cache_stats(include_memory=True):
+    return [cache.stats(include_memory=include_memory) for cache in sorted(_caches, key=lambda c: c.name)]
+
+
+def _collect_cache_metrics():
+    for cache_stats in all_cache_stats():
+        for prefix, stats in cache_stats["prefixes"].items():
+            labels = {"cache": cache_stats["name"], "prefix": prefix}
+            for field in STAT_FIELDS:
+                yield f"cache_{field}_total", "counter", f"Cache {field} by key prefix.", labels, stats[field]
+            yield "cache_entries", "gauge", "Live cache entries by key prefix.", labels, stats["entries"]
+            yield "cache_approx_bytes", "gauge", "Approximate cached payload size by key prefix.", labels, stats["approx_bytes"]
+
+
+metrics.register_collector(_collect_cache_metrics)
+
+
+def start_cache_stats_logger(interval=None):
+    """Print a cache summary every ``interval`` seconds (env CACHE_STATS_LOG_INTERVAL, 0 = off)."""
+    if interval is None:
+        interval = float(os.getenv("CACHE_STATS_LOG_INTERVAL", "0") or 0)
+    if interval <= 0:
+        return None
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                for cache_stats in all_cache_stats():
+                    for prefix, stats in sorted(cache_stats["prefixes"].items()):
+                        hit_rate = "-" if stats["hit_rate"] is None else f"{stats['hit_rate'] * 100:.1f}%"
+                        print(
+                            f"📊 cache[{cache_stats['name']}] {prefix}: hit_rate={hit_rate} "
+                            f"hits={stats['hits']} misses={stats['misses']} expired={stats['expirations']} "
+                            f"invalidated={stats['invalidations']} entries={stats['entries']} "
+                            f"~{stats['approx_bytes'] / 1024:.0f}KB"
+                        )
+            except Exception as exc:  # pragma: no cover - logging must never kill the thread
+                print(f"⚠️ Cache stats logger error: {exc}")
+
+    thread = threading.Thread(target=_loop, name="cache-stats-logger", daemon=True)
+    thread.start()
+    return thread
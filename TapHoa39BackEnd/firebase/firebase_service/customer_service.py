@@ -8,11 +8,58 @@ try:
 except ImportError:  # pragma: no cover
     from google.cloud.firestore_v1.base_query import FieldFilter  # type: ignore
 
+from firebase.bulk_write import BulkWritePipeline
 from firebase.init_firebase import init_firestore
+from Utility.jobs import report_progress
+from Utility.sync_ledger import CLEARED_CHECKSUM, get_sync_ledger
 
 COLLECTION_NAME = "customers"
 INVOICE_COLLECTION_NAME = "invoices"
 
+# Where an invoice may keep the customer id, its debt, total and paid amount
+# (first match wins, see _extract_customer_id / _resolve_invoice_debt).
+CUSTOMER_ID_FIELDS = ("customerId", "CustomerId", "customer_id")
+NESTED_CUSTOMER_ID_FIELDS = ("Id", "id", "CustomerId")
+DEBT_PATHS = (
+    ("debt",),
+    ("Debt",),
+    ("customerDebt",),
+    ("CustomerDebt",),
+    ("remainAmount",),
+    ("RemainAmount",),
+    ("remainingAmount",),
+    ("remainingDebt",),
+    ("customer", "debt"),
+    ("customer", "Debt"),
+    ("payment", "debt"),
+    ("payment", "Debt"),
+    ("payment", "remaining"),
+    ("payment", "remainingAmount"),
+)
+TOTAL_PRICE_PATHS = (("totalPrice",), ("TotalPrice",))
+PAID_PATHS = (
+    ("totalPaid",),
+    ("TotalPaid",),
+    ("paid",),
+    ("Paid",),
+    ("customerPaid",),
+    ("CustomerPaid",),
+    ("payment", "totalPaid"),
+    ("payment", "TotalPaid"),
+    ("payment", "paid"),
+    ("payment", "Paid"),
+    ("payment", "received"),
+    ("payment", "receivedAmount"),
+)
+# The only invoice fields the aggregate refresh reads.
+AGGREGATE_INVOICE_FIELDS = tuple(dict.fromkeys(
+    [*CUSTOMER_ID_FIELDS, *(f"customer.{key}" for key in NESTED_CUSTOMER_ID_FIELDS)]
+    + [".".join(path) for path in (*DEBT_PATHS, *TOTAL_PRICE_PATHS, *PAID_PATHS)]
+    + ["payments"]
+))
+# "scan": read the invoices once and total them per customer; "per_customer": query each customer's invoices.
+AGGREGATE_REFRESH_MODES = ("scan", "per_customer")
+
 db = init_firestore("FIREBASE_SERVICE_ACCOUNT_CUSTOMER")
 customers_ref = db.collection(COLLECTION_NAME)
 invoice_db = init_firestore("FIREBASE_SERVICE_ACCOUNT_HOADON")
@@ -25,6 +72,11 @@ class FirestoreCustomerService:
         self.customers_ref = customers_ref
         self.invoices_ref = invoices_ref
 
+    @property
+    def ledger(self):
+        """Checksum ledger of the KiotViet customer sync (firebase_khachhang/import_to_firestore.py)."""
+        return get_sync_ledger(COLLECTION_NAME)
+
     @staticmethod
     def _to_float(value):
         if value is None:
@@ -64,14 +116,14 @@ class FirestoreCustomerService:
         if not isinstance(invoice, dict):
             return None
 
-        for key in ("customerId", "CustomerId", "customer_id"):
+        for key in CUSTOMER_ID_FIELDS:
             value = invoice.get(key)
             if value is not None and str(value).strip():
                 return str(value).strip()
 
         customer_info = invoice.get("customer")
         if isinstance(customer_info, dict):
-            for key in ("Id", "id", "CustomerId"):
+            for key in NESTED_CUSTOMER_ID_FIELDS:
                 value = customer_info.get(key)
                 if value is not None and str(value).strip():
                     return str(value).strip()
@@ -91,24 +143,7 @@ class FirestoreCustomerService:
         if not isinstance(invoice, dict):
             return 0.0
 
-        candidate_paths = (
-            ("debt",),
-            ("Debt",),
-            ("customerDebt",),
-            ("CustomerDebt",),
-            ("remainAmount",),
-            ("RemainAmount",),
-            ("remainingAmount",),
-            ("remainingDebt",),
-            ("customer", "debt"),
-            ("customer", "Debt"),
-            ("payment", "debt"),
-            ("payment", "Debt"),
-            ("payment", "remaining"),
-            ("payment", "remainingAmount"),
-        )
-
-        for path in candidate_paths:
+        for path in DEBT_PATHS:
             value = cls._get_nested_value(invoice, path)
             if value is None:
                 continue
@@ -119,7 +154,7 @@ class FirestoreCustomerService:
                 return abs(round(amount, 2))
 
         total_price = None
-        for path in (("totalPrice",), ("TotalPrice",)):
+        for path in TOTAL_PRICE_PATHS:
             value = cls._get_nested_value(invoice, path)
             if value is None:
                 continue
@@ -130,22 +165,7 @@ class FirestoreCustomerService:
             total_price = 0.0
 
         total_paid = 0.0
-        paid_paths = (
-            ("totalPaid",),
-            ("TotalPaid",),
-            ("paid",),
-            ("Paid",),
-            ("customerPaid",),
-            ("CustomerPaid",),
-            ("payment", "totalPaid"),
-            ("payment", "TotalPaid"),
-            ("payment", "paid"),
-            ("payment", "Paid"),
-            ("payment", "received"),
-            ("payment", "receivedAmount"),
-        )
-
-        for path in paid_paths:
+        for path in PAID_PATHS:
             value = cls._get_nested_value(invoice, path)
             if value is None:
                 continue
@@ -170,6 +190,7 @@ class FirestoreCustomerService:
     def add_customer(self, customer):
         doc_ref = self.customers_ref.document(str(customer["id"]))
         doc_ref.set(customer)
+        self.ledger.forget([customer["id"]])
         self.cache.invalidate("all_customers")
         return {"message": "customer added"} 
     
@@ -177,6 +198,7 @@ class FirestoreCustomerService:
         for customer in customers:
             doc_ref = self.customers_ref.document(str(customer["id"]))
             doc_ref.set(customer)
+        self.ledger.forget(customer["id"] for customer in customers)
         self.cache.invalidate("all_customers")
         return {"message": f"{len(customers)} customers added"}
 
@@ -201,7 +223,8 @@ class FirestoreCustomerService:
             return {"message": "customer not found", "updated": False, "id": doc_id, "reason": "not_found"}
 
         try:
-            doc_ref.update(sanitized_updates)
+            doc_ref.update({**sanitized_updates, **CLEARED_CHECKSUM})
+            self.ledger.forget([doc_id])
             self.cache.invalidate("all_customers")
             self.cache.invalidate(doc_id)
             return {
@@ -267,7 +290,8 @@ class FirestoreCustomerService:
         }
 
         try:
-            doc_ref.update(updates)
+            doc_ref.update({**updates, **CLEARED_CHECKSUM})
+            self.ledger.forget([customer_id])
             if self.cache:
                 self.cache.invalidate("all_customers")
                 self.cache.invalidate(customer_id)
@@ -327,7 +351,7 @@ class FirestoreCustomerService:
         }
 
         try:
-            doc_ref.update(updates)
+            doc_ref.update({**updates, **CLEARED_CHECKSUM})
         except Exception as exc:
             return {
                 "updated": False,
@@ -335,6 +359,7 @@ class FirestoreCustomerService:
                 "customer_id": normalized_id,
             }
 
+        self.ledger.forget([normalized_id])
         data = snapshot.to_dict() or {}
         data.update(updates)
         data["id"] = normalized_id
@@ -357,7 +382,92 @@ class FirestoreCustomerService:
 
         return self.recalculate_customer_totals(customer_id)
 
-    def refresh_customer_aggregates(self):
+    def refresh_customer_aggregates(self, mode: str = "scan"):
+        """Recompute Debt/TotalInvoiced/TotalRevenue/TotalPoint of every customer from its invoices.
+
+        mode "scan" streams the invoices once, projected to AGGREGATE_INVOICE_FIELDS,
+        totals them per customer in memory and writes the customers whose values
+        changed through a BulkWritePipeline. "per_customer" runs the invoice
+        queries of get_invoices_by_customer_id for each customer (N+1 round trips).
+
+        Returns (updated_customers, errors).
+        """
+        if mode not in AGGREGATE_REFRESH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(AGGREGATE_REFRESH_MODES)}")
+        if mode == "per_customer":
+            return self._refresh_customer_aggregates_per_customer()
+
+        report_progress(mode=mode, stage="customers")
+        customers = [(doc, doc.to_dict() or {}) for doc in self.customers_ref.stream()]
+
+        # Invoice customer id -> customer doc id; doc ids win over the Id/id/CustomerId fields.
+        owners = {doc.id: doc.id for doc, _ in customers}
+        for doc, data in customers:
+            for key in NESTED_CUSTOMER_ID_FIELDS:
+                value = data.get(key)
+                if value is not None and str(value).strip():
+                    owners.setdefault(str(value).strip(), doc.id)
+
+        report_progress(stage="invoices", scanned=0, total=len(customers))
+        totals = {}  # customer doc id -> [invoice count, revenue, debt]
+        scanned = 0
+        for invoice_doc in self.invoices_ref.select(AGGREGATE_INVOICE_FIELDS).stream():
+            scanned += 1
+            if scanned % 10000 == 0:
+                report_progress(scanned=scanned)
+            invoice = invoice_doc.to_dict() or {}
+            owner = owners.get(self._extract_customer_id(invoice))
+            if owner is None:
+                continue
+            # get_invoices_by_customer_id drops the embedded customer before the debt is read.
+            invoice.pop("customer", None)
+            entry = totals.get(owner)
+            if entry is None:
+                entry = totals[owner] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += self._to_float(invoice.get("totalPrice"))
+            entry[2] += self._resolve_invoice_debt(invoice)
+
+        report_progress(stage="write", scanned=scanned)
+        written_ids = []
+
+        def record_written(writes):
+            written_ids.extend(write.context for write in writes)
+
+        refreshed = []
+        with BulkWritePipeline(db, on_batch_committed=record_written, label="customer_aggregates") as pipeline:
+            for doc, data in customers:
+                total_invoiced, total_revenue, total_debt = totals.get(doc.id, (0, 0.0, 0.0))
+                total_point = total_revenue / total_invoiced if total_invoiced else 0.0
+                updates = {
+                    "Debt": round(total_debt, 2),
+                    "TotalInvoiced": total_invoiced,
+                    "TotalRevenue": round(total_revenue, 2),
+                    "TotalPoint": round(total_point, 2),
+                }
+                if any(data.get(key) != value for key, value in updates.items()):
+                    pipeline.update(doc.reference, {**updates, **CLEARED_CHECKSUM}, context=doc.id)
+                data.update(updates)
+                data["id"] = doc.id
+                refreshed.append(data)
+
+        errors = {}
+        failures = {error["id"]: f"update_failed: {error['error']}" for error in pipeline.result.errors}
+        if failures:
+            errors["update_failures"] = failures
+        updated_customers = [customer for customer in refreshed if customer["id"] not in failures]
+        print(f"Refreshed {len(updated_customers)} customers from {scanned} invoices "
+              f"({len(written_ids)} written, {len(failures)} failed)")
+        self.ledger.forget(written_ids)
+
+        if self.cache:
+            self.cache.invalidate_many(written_ids + ["all_customers"])
+            if updated_customers:
+                self.cache.set("all_customers", updated_customers, ttl=300)
+
+        return updated_customers, errors
+
+    def _refresh_customer_aggregates_per_customer(self):
         def _to_number(value):
             if value is None:
                 return 0.0
@@ -383,7 +493,9 @@ class FirestoreCustomerService:
         except Exception as exc:
             raise exc
 
-        for doc in customer_docs:
+        for index, doc in enumerate(customer_docs):
+            if index % 100 == 0:
+                report_progress(processed=index, total=len(customer_docs))
             customer_id = doc.id
             data = doc.to_dict() or {}
             try:
@@ -412,7 +524,7 @@ class FirestoreCustomerService:
             }
 
             try:
-                doc.reference.update(updates)
+                doc.reference.update({**updates, **CLEARED_CHECKSUM})
             except Exception as exc:
                 failures[customer_id] = f"update_failed: {exc}"
                 continue
@@ -420,14 +532,13 @@ class FirestoreCustomerService:
             data.update(updates)
             data["id"] = customer_id
             updated_customers.append(data)
-            if self.cache:
-                self.cache.invalidate(customer_id)
 
         if failures:
             errors["update_failures"] = failures
+        self.ledger.forget(customer["id"] for customer in updated_customers)
 
         if self.cache:
-            self.cache.invalidate("all_customers")
+            self.cache.invalidate_many([customer["id"] for customer in updated_customers] + ["all_customers"])
             if updated_customers:
                 self.cache.set("all_customers", updated_customers, ttl=300)
 
@@ -481,6 +592,7 @@ class FirestoreCustomerService:
                 failed[doc_id] = str(exc)
 
         if deleted:
+            self.ledger.forget(deleted)
             self.cache.invalidate("all_customers")
 
         return {
@@ -2,16 +2,20 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 from dotenv import load_dotenv
-import json
 import requests
-from FromKiotViet.get_authorization import auth_token
+from FromKiotViet.http_client import kiotviet_client
+from FromKiotViet.resource_pager import IncompleteListingError, iter_resource_pages
+from Utility.json_stream import JsonArrayStream
+from Utility.sync_ledger import CLEARED_CHECKSUM, SYNC_STATE_COLLECTION, get_sync_ledger
+from Utility.fingerprint import Fingerprinter, fingerprint_many, is_legacy
 from Utility.get_env import LatestBranchId, retailer
-import hashlib
-from firebase.firebase_hanghoa.product_class import Product
+from Utility.jobs import report_progress
+from firebase.firebase_hanghoa.product_class import PRODUCT_FIELD_NAMES, Product
 from dateutil.parser import parse as parse_date
 from typing import Any, Dict, List, Optional, Set
-from datetime import datetime
+from datetime import datetime, timedelta
 from firebase.init_firebase import init_firestore
+from firebase.bulk_write import BulkWritePipeline
 
 load_dotenv()
 
@@ -21,12 +25,30 @@ API_CLIENT_ID = "WebAppWN-3e31c9b0-cd4a-43e6-be25-a5d1330372fd-500111210-878979"
 API_RESOURCE = "Products"
 API_PAGE_SIZE = 500
 API_SINGLE_FETCH_LIMIT = 20000
+API_STREAM_CHUNK_BYTES = 64 * 1024
 API_HEADERS = {
-    "Authorization": auth_token,
     "retailer": retailer,
     "branchid": LatestBranchId,
 }
 COLLECTION_NAME = "products"
+# High-water mark of the product sync, in document SyncState/products (SYNC_STATE_COLLECTION).
+SYNC_MODES = ("auto", "full", "delta")
+# KiotViet query parameter that limits resource/fetch to items modified after a date
+# (created counts as modified for items never edited since).
+API_MODIFIED_SINCE_PARAM = os.getenv("KIOTVIET_MODIFIED_SINCE_PARAM", "lastModifiedFrom")
+# "auto" runs a full reconciliation when the last one is older than this.
+FULL_SYNC_INTERVAL_HOURS = float(os.getenv("PRODUCT_FULL_SYNC_INTERVAL_HOURS", "24"))
+# A delta sync re-reads this much before the mark (clock skew, edits saved during the previous sync).
+DELTA_SYNC_OVERLAP = timedelta(minutes=5)
+
+# Fields kept with each KiotViet checksum in the sync ledger and shown in the compare report.
+COMPARE_DETAIL_FIELDS = ("Code", "FullName", "OnHand", "ModifiedDate")
+COMPARE_CATEGORIES = ("missing_in_firebase", "missing_in_kiotviet", "checksum_mismatches",
+                      "legacy_checksums", "unverified")
+COMPARE_REPORT_TTL_SECONDS = 300
+
+# SyncChecksum of a product: fields in Product's (sorted) order, see Utility.fingerprint.
+PRODUCT_FINGERPRINT = Fingerprinter(PRODUCT_FIELD_NAMES)
 
 # Sử dụng init_firestore thay vì khởi tạo trực tiếp
 db = init_firestore("FIREBASE_SERVICE_ACCOUNT_HANGHOA", app_name="hanghoa_app")
@@ -44,6 +66,11 @@ class FirestoreProductService:
         self.cache = cache
         self.products_ref = db.collection(COLLECTION_NAME)
 
+    @property
+    def ledger(self):
+        """Local id -> SyncChecksum ledger of the KiotViet sync (Utility.sync_ledger)."""
+        return get_sync_ledger(COLLECTION_NAME)
+
     @staticmethod
     def _coerce_bool(value, default: bool) -> bool:
         if isinstance(value, bool):
@@ -62,8 +89,8 @@ class FirestoreProductService:
     def _should_store_product(cls, record: Any) -> bool:
         if record is None:
             return False
-        if hasattr(record, "__dict__"):
-            record = record.__dict__
+        if isinstance(record, Product):
+            return not record.isDeleted
         if not isinstance(record, dict):
             return False
         is_deleted = cls._coerce_bool(record.get("isDeleted"), False)
@@ -116,6 +143,7 @@ class FirestoreProductService:
 
         doc_ref = self.products_ref.document(str(product_id))
 
+        self.ledger.forget([product_id])
         if not self._should_store_product(product):
             doc_ref.delete()
             self.cache.invalidate(str(product_id))
@@ -134,7 +162,7 @@ class FirestoreProductService:
     def add_products_batch(self, products: List[Dict]) -> Dict:
         """
         Add multiple products to Firestore in batch.
-        Uses Firestore batch writes for efficiency (max 500 per batch).
+        Writes go through BulkWritePipeline (500 per batch, several batches in flight).
         """
         if not products:
             return {"status": "error", "message": "No products provided"}
@@ -143,10 +171,13 @@ class FirestoreProductService:
             return {"status": "error", "message": "Products must be a list"}
 
         try:
-            batch = db.batch()
-            added_count = 0
+            pipeline = BulkWritePipeline(db, label="products_import")
             skipped_count = 0
             errors = []
+            # One pass up front so large imports can use the fingerprint process pool.
+            checksums = fingerprint_many(
+                (p if isinstance(p, dict) else {} for p in products), PRODUCT_FINGERPRINT
+            )
 
             for idx, product_data in enumerate(products):
                 if not isinstance(product_data, dict):
@@ -164,23 +195,18 @@ class FirestoreProductService:
                     continue
 
                 # Add sync metadata
-                product_data["SyncChecksum"] = self.hash_item(product_data)
+                product_data["SyncChecksum"] = checksums[idx]
                 product_data["SyncTimestamp"] = datetime.utcnow().isoformat()
 
-                # Add to batch
                 doc_ref = self.products_ref.document(str(product_id))
-                batch.set(doc_ref, product_data)
-                added_count += 1
-
-                # Firestore batch limit is 500 operations
-                if added_count % 500 == 0:
-                    batch.commit()
-                    batch = db.batch()
-                    print(f"📦 Committed batch of 500 products...")
+                pipeline.set(doc_ref, product_data)
 
-            # Commit remaining
-            if added_count % 500 != 0:
-                batch.commit()
+            write_result = pipeline.close()
+            added_count = write_result.written
+            errors.extend({"id": error["id"], "error": error["error"]} for error in write_result.errors)
+            self.ledger.forget(
+                p.get("Id") or p.get("id") for p in products if isinstance(p, dict) and (p.get("Id") or p.get("id"))
+            )
 
             # Invalidate cache
             self.invalidate_all_product_caches()
@@ -209,7 +235,8 @@ class FirestoreProductService:
 
     def update_product(self, product_id, updates):
         doc_ref = self.products_ref.document(str(product_id))
-        doc_ref.update(updates)
+        doc_ref.update({**updates, **CLEARED_CHECKSUM})
+        self.ledger.forget([product_id])
         self.cache.invalidate(product_id)
         self.invalidate_all_product_caches()
 
@@ -239,11 +266,11 @@ class FirestoreProductService:
             if not self._should_store_product(prod):
                 doc_ref.delete()
                 removed.append(product_id)
-                self.cache.invalidate(product_id)
                 continue
-            doc_ref.set(prod, merge=True)
+            doc_ref.set({**prod, **CLEARED_CHECKSUM}, merge=True)
             updated.append(product_id)
-            self.cache.invalidate(product_id)
+        self.ledger.forget(updated + removed)
+        self.cache.invalidate_many(updated + removed)
         self.invalidate_all_product_caches()
         response = {"message": f"Updated {len(updated)} products", "updated": updated}
         if removed:
@@ -253,6 +280,7 @@ class FirestoreProductService:
 
     def delete_product(self, product_id):
         self.products_ref.document(str(product_id)).delete()
+        self.ledger.forget([product_id])
         self.cache.invalidate(product_id)
         self.invalidate_all_product_caches()
         return {"message": "Product deleted"}
@@ -298,63 +326,159 @@ class FirestoreProductService:
             "total": 1 + len(variants)
         }
     
-    def update_products_from_kiotviet_to_firestore(self):
+    def update_products_from_kiotviet_to_firestore(self, mode: str = "auto"):
         """Backwards-compatible wrapper for legacy callers."""
-        return self.sync_products_from_kiotviet()
-
-    def sync_products_from_kiotviet(self):
+        return self.sync_products_from_kiotviet(mode=mode)
+
+    def _sync_state_ref(self):
+        return db.collection(SYNC_STATE_COLLECTION).document(COLLECTION_NAME)
+
+    def get_sync_state(self) -> Dict[str, Any]:
+        snapshot = self._sync_state_ref().get()
+        return (snapshot.to_dict() or {}) if snapshot.exists else {}
+
+    def _resolve_sync_mode(self, mode: str, state: Dict[str, Any]) -> str:
+        """Pick full or delta: delta needs a high-water mark, auto also needs a recent full sync."""
+        if not state.get("high_water_mark"):
+            return "full"
+        if mode != "auto":
+            return mode
+        last_full = self._as_datetime(state.get("last_full_sync_at"))
+        if last_full is None or datetime.utcnow() - last_full >= timedelta(hours=FULL_SYNC_INTERVAL_HOURS):
+            return "full"
+        return "delta"
+
+    def sync_products_from_kiotviet(self, mode: str = "auto"):
         """
         Optimized sync that:
-        1. Fetches checksums from Firestore in one go
+        1. Fetches checksums from Firestore in one go (full mode only)
         2. Fetches products from KiotViet with timeout
         3. Compares and updates only changed products
         4.Returns stats without re-fetching all data
+
+        mode:
+            full   download the whole catalog and compare every checksum
+            delta  only ask KiotViet for products modified or created since the
+                   stored high-water mark (max ModifiedDate, or CreatedDate for
+                   never-edited products, of earlier syncs)
+            auto   delta, unless there is no mark yet or the last full sync is
+                   older than PRODUCT_FULL_SYNC_INTERVAL_HOURS
         """
         import time
+        if mode not in SYNC_MODES:
+            raise ValueError(f"mode phải là một trong {', '.join(SYNC_MODES)}")
         start_time = time.time()
+        started_at = datetime.utcnow()
 
         try:
-            print("🔄 Bắt đầu đồng bộ sản phẩm từ KiotViet (tối ưu)...")
-
-            # Step 1: Fetch checksums from Firestore (fast, minimal data)
-            print("  📥 Lấy checksums từ Firestore...")
+            sync_state = self.get_sync_state()
+            mode = self._resolve_sync_mode(mode, sync_state)
+            high_water_mark = self._as_datetime(sync_state.get("high_water_mark"))
+            modified_since = high_water_mark - DELTA_SYNC_OVERLAP if mode == "delta" else None
+
+            print(f"🔄 Bắt đầu đồng bộ sản phẩm từ KiotViet (tối ưu, {mode})...")
+            report_progress(mode=mode, stage="checksums")
+
+            # Step 1: Load the checksums of what Firestore holds. Normally from the
+            # local ledger (no reads); from Firestore itself when the ledger is due
+            # for verification (also when another host's ledger saw the latest
+            # write, see Utility.sync_ledger). A delta sync never reads Firestore: it uses the
+            # ledger when it can be trusted (so the overlap window is not rewritten
+            # every run) and otherwise writes everything KiotViet returns.
             checksum_start = time.time()
+            ledger = self.ledger
             existing_checksums = {}
-            existing_ids = set()
-
-            for doc in self.products_ref.select(["SyncChecksum"]).stream():
-                data = doc.to_dict() or {}
-                existing_checksums[doc.id] = data.get("SyncChecksum")
-                existing_ids.add(doc.id)
+            checksum_source = None
+            needs_verification = ledger.needs_verification(sync_state)
+            if mode == "full" and needs_verification:
+                print("  📥 Lấy checksums từ Firestore (kiểm tra sổ checksum)...")
+                for doc in self.products_ref.select(["SyncChecksum"]).stream():
+                    data = doc.to_dict() or {}
+                    existing_checksums[doc.id] = data.get("SyncChecksum")
+                ledger.replace_all(existing_checksums)
+                ledger.claim(self._sync_state_ref())
+                checksum_source = "firestore"
+            elif not needs_verification:
+                existing_checksums = ledger.load()
+                checksum_source = "ledger"
+            if mode == "delta":
+                print(f"  📅 Chỉ lấy sản phẩm sửa sau {modified_since.isoformat()}")
 
             checksum_time = time.time() - checksum_start
-            print(f"  ✅ Đã lấy {len(existing_checksums)} checksums trong {checksum_time:.2f}s")
+            if checksum_source:
+                print(f"  ✅ Đã lấy {len(existing_checksums)} checksums ({checksum_source}) trong {checksum_time:.2f}s")
 
-            # Step 2: Fetch products from KiotViet API
-            print("  📥 Lấy sản phẩm từ KiotViet API...")
+            # Step 2-4: Stream products from KiotViet, compare each one as it arrives
+            # and hand changed ones to a write pipeline that commits several batches
+            # at once, so memory stays flat whatever the catalog size.
+            print("  📥 Lấy và so sánh sản phẩm từ KiotViet API...")
             api_start = time.time()
-            api_items = self.fetch_api_items()
-            api_time = time.time() - api_start
-            print(f"  ✅ Đã lấy {len(api_items)} sản phẩm từ KiotViet trong {api_time:.2f}s")
-
-            # Step 3: Compare and prepare updates
-            print("  🔍 So sánh và chuẩn bị cập nhật...")
-            compare_start = time.time()
-            to_upsert = []
+            compare_time = 0.0
+            update_time = 0.0
+            upserted_ids: List[str] = []
+            migrated_count = 0
             active_ids: Set[str] = set()
+            total_api_items = 0
             deleted_count = 0
             inactive_count = 0
             unchanged_count = 0
+            # What KiotViet returned, for the compare report (Utility.sync_ledger source snapshot).
+            source_rows = []
+
+            def record_committed(writes):
+                # Only commits that landed go into the ledger; failed ids are compared again next sync.
+                ledger.record((write.context, write.data["SyncChecksum"]) for write in writes)
+                # Checksum-only payloads are migrations, not product changes.
+                upserted_ids.extend(write.context for write in writes if len(write.data) > 1)
 
-            for item in api_items:
-                product_dict = item.__dict__ if hasattr(item, "__dict__") else dict(item)
-                doc_id = str(product_dict.get("Id"))
+            def log_write_progress(result):
+                if result.batches % 5 == 0:
+                    print(f"    Đã ghi {len(upserted_ids)} sản phẩm...")
+
+            pipeline = BulkWritePipeline(db, on_batch_committed=record_committed,
+                                         on_progress=log_write_progress, label="products_sync")
+
+            def queue_upsert(doc_id, payload):
+                # Blocks only while the pipeline is full or throttled; that wait counts as update time.
+                nonlocal update_time
+                update_start = time.time()
+                pipeline.set(self.products_ref.document(doc_id), payload, merge=True, context=doc_id)
+                update_time += time.time() - update_start
+
+            listing_error = None
+
+            def api_items():
+                # Keep what could be fetched; a missing page only surfaces once the rest is processed.
+                nonlocal listing_error
+                try:
+                    yield from self.iter_api_items(modified_since=modified_since)
+                except IncompleteListingError as exc:
+                    listing_error = exc
+
+            report_progress(stage="compare", received=0)
+            for item in api_items():
+                total_api_items += 1
+                if total_api_items % 1000 == 0:
+                    report_progress(received=total_api_items, written=len(upserted_ids))
+                compare_start = time.time()
+                # item is a slotted Product: read attributes, build a dict only for what gets written.
+                doc_id = str(item.Id)
                 if not doc_id:
                     continue
 
-                # Determine flags from API
-                is_deleted = self._coerce_bool(product_dict.get("isDeleted"), False)
-                is_active = self._coerce_bool(product_dict.get("isActive"), True)
+                # A product created and never edited has no ModifiedDate yet; its last change is its creation.
+                modified = item.ModifiedDate or item.CreatedDate
+                if self.is_newer(modified, high_water_mark):
+                    high_water_mark = self._as_datetime(modified)
+                # Also guards against KiotViet ignoring the modified-since filter.
+                if modified_since is not None and not self.is_newer(modified, modified_since):
+                    unchanged_count += 1
+                    compare_time += time.time() - compare_start
+                    continue
+
+                # Determine flags from API (already coerced by Product.from_dict)
+                is_deleted = item.isDeleted
+                is_active = item.isActive
 
                 # Count for reporting
                 if is_deleted:
@@ -366,13 +490,28 @@ class FirestoreProductService:
                 active_ids.add(doc_id)
 
                 # Check if changed
-                checksum = self.hash_item(product_dict)
-                if existing_checksums.get(doc_id) == checksum:
+                checksum = PRODUCT_FINGERPRINT.of_object(item)
+                source_rows.append((doc_id, checksum, {
+                    field: getattr(item, field) for field in COMPARE_DETAIL_FIELDS
+                }))
+                if len(source_rows) >= 500:
+                    ledger.record_source(source_rows)
+                    source_rows.clear()
+                stored_checksum = existing_checksums.get(doc_id)
+                if stored_checksum == checksum:
                     unchanged_count += 1
+                    compare_time += time.time() - compare_start
+                    continue
+                if is_legacy(stored_checksum) and PRODUCT_FINGERPRINT.matches(stored_checksum, item.to_firestore()):
+                    # Unchanged, but still carries a pre-v2 checksum: rewrite just that field once.
+                    unchanged_count += 1
+                    migrated_count += 1
+                    compare_time += time.time() - compare_start
+                    queue_upsert(doc_id, {"SyncChecksum": checksum})
                     continue
 
                 # Prepare payload to store in Firestore
-                product_to_store = dict(product_dict)
+                product_to_store = item.to_firestore()
                 product_to_store["SyncChecksum"] = checksum
                 product_to_store["SyncTimestamp"] = datetime.utcnow().isoformat()
                 if not is_active:
@@ -380,57 +519,79 @@ class FirestoreProductService:
                 if is_deleted:
                     product_to_store["KiotVietDeleted"] = True
 
-                to_upsert.append((doc_id, product_to_store))
-
-            compare_time = time.time() - compare_start
-            print(f"  ✅ So sánh hoàn tất trong {compare_time:.2f}s: {len(to_upsert)} cần cập nhật, {unchanged_count} không đổi")
-
-            # Step 4: Batch update to Firestore
-            update_time = 0
-            if to_upsert:
-                print(f"  📤 Cập nhật {len(to_upsert)} sản phẩm lên Firestore...")
-                update_start = time.time()
-                BATCH_SIZE = 500
-                batch_count = 0
-
-                for i in range(0, len(to_upsert), BATCH_SIZE):
-                    batch = db.batch()
-                    for doc_id, payload in to_upsert[i : i + BATCH_SIZE]:
-                        doc_ref = self.products_ref.document(doc_id)
-                        batch.set(doc_ref, payload, merge=True)
-                    batch.commit()
-                    batch_count += 1
-                    if batch_count % 5 == 0:
-                        print(f"    Đã ghi {batch_count * BATCH_SIZE} sản phẩm...")
-
-                update_time = time.time() - update_start
-                print(f"  ✅ Cập nhật hoàn tất trong {update_time:.2f}s ({batch_count} batches)")
+                compare_time += time.time() - compare_start
+                queue_upsert(doc_id, product_to_store)
+
+            update_start = time.time()
+            write_result = pipeline.close()
+            update_time += time.time() - update_start
+            ledger.record_source(source_rows)
+            if mode == "full" and listing_error is None:
+                # The whole catalog was read: whatever was not seen is gone from KiotViet.
+                # After a partial read, unseen products may just be on a missing page.
+                ledger.prune_source(before=start_time)
+            api_time = time.time() - api_start - compare_time - update_time
+            print(f"  ✅ Đã lấy {total_api_items} sản phẩm từ KiotViet trong {api_time:.2f}s")
+            print(f"  ✅ So sánh hoàn tất trong {compare_time:.2f}s: {len(upserted_ids)} cần cập nhật, {unchanged_count} không đổi")
+            if upserted_ids:
+                print(f"  ✅ Cập nhật {len(upserted_ids)} sản phẩm hoàn tất trong {update_time:.2f}s ({write_result.batches} batches)")
             else:
                 print("  ℹ️ Không có sản phẩm nào cần cập nhật")
+            if write_result.failed:
+                print(f"  ⚠️ {write_result.failed} sản phẩm ghi thất bại, sẽ được so sánh lại ở lần đồng bộ sau")
+                # Keep the old mark so the next delta sync asks KiotViet for them again.
+                high_water_mark = self._as_datetime(sync_state.get("high_water_mark"))
+            if listing_error is not None:
+                # Products on the missing pages may be older than the new mark: keep the old
+                # state so the next sync asks for them again.
+                print(f"  ⚠️ Danh sách sản phẩm từ KiotViet không đầy đủ ({listing_error}), giữ nguyên high-water mark")
 
             # Step 5: Invalidate cache
             print("  🗑️ Xóa cache...")
             self.invalidate_all_product_caches()
-            for doc_id, _ in to_upsert:
-                self.cache.invalidate(doc_id)
+            self.cache.invalidate_many(upserted_ids)
+
+            # Step 6: Remember how far KiotViet has been read for the next delta sync
+            if listing_error is None:
+                state_update = {
+                    "high_water_mark": high_water_mark.isoformat() if high_water_mark else None,
+                    "last_sync_at": started_at.isoformat(),
+                    "last_sync_mode": mode,
+                }
+                if mode == "full":
+                    # Only a complete read counts as a full sync (auto mode relies on it).
+                    state_update["last_full_sync_at"] = started_at.isoformat()
+                self._sync_state_ref().set(state_update, merge=True)
+            else:
+                state_update = {"high_water_mark": sync_state.get("high_water_mark")}
 
             total_time = time.time() - start_time
 
-            print(f"\n✅ Đồng bộ hoàn tất trong {total_time:.2f}s:")
-            print(f"   - Tổng sản phẩm từ KiotViet: {len(api_items)}")
-            print(f"   - Cập nhật/thêm mới: {len(to_upsert)}")
+            if listing_error is None:
+                print(f"\n✅ Đồng bộ hoàn tất trong {total_time:.2f}s:")
+            else:
+                print(f"\n⚠️ Đồng bộ chưa đầy đủ sau {total_time:.2f}s:")
+            print(f"   - Tổng sản phẩm từ KiotViet: {total_api_items}")
+            print(f"   - Cập nhật/thêm mới: {len(upserted_ids)}")
             print(f"   - Không thay đổi: {unchanged_count}")
+            if migrated_count:
+                print(f"   - Chuyển checksum sang v2: {migrated_count}")
             print(f"   - Inactive: {inactive_count}")
             print(f"   - Deleted: {deleted_count}")
 
-            return {
-                "success": True,
-                "message": "Đồng bộ thành công",
+            result = {
+                "success": listing_error is None,
+                "message": "Đồng bộ thành công" if listing_error is None else "Đồng bộ chưa đầy đủ",
                 "version": "optimized_v2",
+                "mode": mode,
+                "checksum_source": checksum_source,
+                "high_water_mark": state_update["high_water_mark"],
                 "stats": {
-                    "total_api_items": len(api_items),
-                    "updated_or_created": len(to_upsert),
+                    "total_api_items": total_api_items,
+                    "updated_or_created": len(upserted_ids),
                     "unchanged": unchanged_count,
+                    "checksums_migrated": migrated_count,
+                    "write_failures": write_result.failed,
                     "inactive_included": inactive_count,
                     "deleted_included": deleted_count,
                     "total_time_seconds": round(total_time, 2),
@@ -442,6 +603,11 @@ class FirestoreProductService:
                     }
                 }
             }
+            if listing_error is not None:
+                result["error"] = str(listing_error)
+                result["error_type"] = type(listing_error).__name__
+                result["failed_pages"] = listing_error.failed_pages
+            return result
         except Exception as exc:
             import traceback
             error_trace = traceback.format_exc()
@@ -470,162 +636,79 @@ class FirestoreProductService:
         return firestore_items
 
     def fetch_api_items(self):
-        print("Đang gọi API đồng bộ sản phẩm (single fetch)...")
-        single_batch = self._fetch_single_batch()
-        if single_batch is not None:
-            print(f"Đã nhận {len(single_batch)} sản phẩm từ API (single batch).")
-            return [Product.from_dict(item) for item in single_batch]
+        return list(self.iter_api_items())
 
-        print("Single batch không đủ, chuyển sang phân trang...")
-        return self._fetch_paginated_items()
+    def iter_api_items(self, modified_since: Optional[datetime] = None):
+        """Yield KiotViet products one at a time while the response is still downloading.
 
-    def _fetch_single_batch(self) -> Optional[List[dict]]:
-        """Fetch all products in a single batch with retry logic."""
+        The single large request is parsed incrementally, so the raw body and the
+        decoded list are never held in full. When it turns out incomplete (or the
+        connection drops halfway) the paginated fetch supplies the rest, skipping
+        ids that were already yielded. ``modified_since`` asks KiotViet for
+        products modified after that date only.
+        """
+        extra_params = {API_MODIFIED_SINCE_PARAM: modified_since.isoformat()} if modified_since else None
+        print("Đang gọi API đồng bộ sản phẩm (single fetch, streaming)...")
+        yielded_ids: Set[str] = set()
+        response, stream = self._open_single_batch_stream(extra_params)
+        try:
+            for item in stream:
+                product = Product.from_dict(item)
+                yielded_ids.add(str(product.Id))
+                yield product
+            total = stream.meta.get("Total") or stream.meta.get("total")
+            print(f"Đã nhận {stream.count} sản phẩm từ API (single batch).")
+            if (not total or total <= stream.count) and stream.count < API_SINGLE_FETCH_LIMIT:
+                return
+            print("Single batch không đủ, chuyển sang phân trang...")
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            print(f"⚠️ Single batch bị gián đoạn sau {stream.count} sản phẩm ({exc}), chuyển sang phân trang...")
+        finally:
+            response.close()
+
+        fetched = 0
+        for page_index, batch_products in self.iter_api_product_pages(extra_params):
+            for product in batch_products:
+                if str(product.Id) in yielded_ids:
+                    continue
+                yielded_ids.add(str(product.Id))
+                fetched += 1
+                yield product
+        print(f"Đã nhận thêm {fetched} sản phẩm từ API (phân trang).")
+
+    def _open_single_batch_stream(self, extra_params: Optional[Dict[str, Any]] = None):
         params = {
+            **(extra_params or {}),
             "clientId": API_CLIENT_ID,
             "resourceName": API_RESOURCE,
             "pageSize": API_SINGLE_FETCH_LIMIT,
         }
-
-        max_retries = 3
-        retry_delay = 2
-
-        for attempt in range(max_retries):
+        response = kiotviet_client.get(API_BASE_URL, params=params, headers=API_HEADERS, timeout=90, stream=True)
+        response.raise_for_status()
+        return response, JsonArrayStream(response.iter_content(API_STREAM_CHUNK_BYTES), key="Data")
+
+    def iter_api_product_pages(self, extra_params: Optional[Dict[str, Any]] = None):
+        """Yield each page of products as soon as it arrives (pages are fetched concurrently)."""
+        for page_index, items in iter_resource_pages(
+            API_RESOURCE,
+            client_id=API_CLIENT_ID,
+            page_size=API_PAGE_SIZE,
+            headers=API_HEADERS,
+            url=API_BASE_URL,
+            timeout=45,
+            params=extra_params,
+        ):
             try:
-                response = requests.get(
-                    API_BASE_URL,
-                    params=params,
-                    headers=API_HEADERS,
-                    timeout=90
-                )
-                response.raise_for_status()
-                payload = response.json() or {}
-                items = payload.get("Data", []) or []
-
-                total = payload.get("Total") or payload.get("total")
-                if total and total > len(items):
-                    return None
-                if len(items) >= API_SINGLE_FETCH_LIMIT:
-                    return None
-                return items
-
-            except requests.exceptions.Timeout:
-                print(f"⚠️ Timeout khi fetch single batch (lần {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(retry_delay)
-                    continue
-                raise
-
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Lỗi khi fetch single batch (lần {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(retry_delay)
-                    continue
-                raise
-
-        return None
+                yield page_index, [Product.from_dict(item) for item in items]
+            except KeyError as exc:
+                print(f"Thiếu khóa {exc} trong dữ liệu trang {page_index}, bỏ qua")
 
     def _fetch_paginated_items(self) -> List[Product]:
-        """Fetch products with pagination and retry logic."""
-        import time
+        """Fetch products page by page (kiotviet_client retries transient errors)."""
         products: List[Product] = []
-        page_index = 0
-        total_returned = 0
-        seen_ids: Set[str] = set()
-        duplicate_pages = 0
-        MAX_DUPLICATE_PAGES = 3
-        max_retries = 3
-        retry_delay = 2
-
-        while True:
-            params = {
-                "clientId": API_CLIENT_ID,
-                "resourceName": API_RESOURCE,
-                "pageSize": API_PAGE_SIZE,
-                "pageIndex": page_index,
-            }
-
-            page_fetched = False
-            for attempt in range(max_retries):
-                try:
-                    response = requests.get(
-                        API_BASE_URL,
-                        params=params,
-                        headers=API_HEADERS,
-                        timeout=45
-                    )
-                    response.raise_for_status()
-                    payload = response.json() or {}
-                    items = payload.get("Data", [])
-                    page_fetched = True
-                    break
-
-                except requests.exceptions.Timeout:
-                    print(f"⚠️ Timeout khi fetch trang {page_index} (lần {attempt + 1}/{max_retries})")
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        print(f"❌ Không thể fetch trang {page_index} sau {max_retries} lần thử")
-                        items = []
-                        page_fetched = True
-                        break
-
-                except requests.exceptions.RequestException as e:
-                    print(f"⚠️ Lỗi khi fetch trang {page_index} (lần {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        print(f"❌ Không thể fetch trang {page_index} sau {max_retries} lần thử")
-                        items = []
-                        page_fetched = True
-                        break
-
-            if not page_fetched or not items:
-                break
-
-            unique_items = []
-            for item in items:
-                product_id_raw = item.get("Id") if isinstance(item, dict) else None
-                product_id = str(product_id_raw) if product_id_raw is not None else None
-                if product_id is None:
-                    continue
-                if product_id in seen_ids:
-                    continue
-                seen_ids.add(product_id)
-                unique_items.append(item)
-
-            if not unique_items:
-                duplicate_pages += 1
-                print(f"  Trang {page_index} chỉ chứa sản phẩm trùng ({duplicate_pages}/{MAX_DUPLICATE_PAGES}).")
-                if duplicate_pages >= MAX_DUPLICATE_PAGES:
-                    print("  Đã gặp quá nhiều trang trùng lặp, dừng phân trang.")
-                    break
-                page_index += 1
-                continue
-
-            duplicate_pages = 0
-
-            try:
-                batch_products = [Product.from_dict(item) for item in unique_items]
-            except KeyError as exc:
-                missing_key = str(exc)
-                print(f"Thiếu khóa {missing_key} trong dữ liệu trang {page_index}, bỏ qua")
-                page_index += 1
-                continue
-
+        for page_index, batch_products in self.iter_api_product_pages():
             products.extend(batch_products)
-            total_returned += len(batch_products)
-
-            print(f"  Đã nhận {len(batch_products)} sản phẩm mới ở trang {page_index} (tổng {total_returned}).")
-
-            if len(items) < API_PAGE_SIZE:
-                break
-
-            page_index += 1
+            print(f"  Đã nhận {len(batch_products)} sản phẩm mới ở trang {page_index} (tổng {len(products)}).")
 
         print(f"Đã nhận tổng cộng {len(products)} sản phẩm từ API (phân trang).")
         return products
@@ -643,7 +726,7 @@ class FirestoreProductService:
                 deleted_items.append(item_id)
                 continue
             
-            item_dict = item.__dict__
+            item_dict = item.to_firestore()
             new_hash = self.hash_item(item_dict)
             old_hash = firestore_items.get(item_id, {}).get('hash')
     
@@ -653,34 +736,25 @@ class FirestoreProductService:
         print(f"Phát hiện {len(changed_items)} sản phẩm thay đổi. Đang cập nhật...")
         print(f"Phát hiện {len(deleted_items)} sản phẩm cần xóa khỏi Firestore.")
     
-        BATCH_SIZE = 500
-        for i in range(0, len(changed_items), BATCH_SIZE):
-            batch = db.batch()
-            for item in changed_items[i:i + BATCH_SIZE]:
-                doc_ref = self.products_ref.document(str(item['Id']))
-                batch.set(doc_ref, item, merge=True)
-            batch.commit()
-            print(f"Đã cập nhật batch {i // BATCH_SIZE + 1}")
-    
-        for i in range(0, len(deleted_items), BATCH_SIZE):
-            batch = db.batch()
-            for item_id in deleted_items[i:i + BATCH_SIZE]:
-                doc_ref = self.products_ref.document(str(item_id))
-                batch.delete(doc_ref)
-            batch.commit()
-            print(f"Đã xóa batch {i // BATCH_SIZE + 1}")
+        def forget_deleted(writes):
+            self.ledger.forget(write.context for write in writes if write.kind == "delete")
+
+        def log_write_progress(result):
+            print(f"Đã ghi batch {result.batches} ({result.written} sản phẩm)")
+
+        with BulkWritePipeline(db, on_batch_committed=forget_deleted, on_progress=log_write_progress,
+                               label="products_update") as pipeline:
+            for item in changed_items:
+                pipeline.set(self.products_ref.document(str(item['Id'])), item, merge=True)
+            for item_id in deleted_items:
+                pipeline.delete(self.products_ref.document(str(item_id)), context=item_id)
     
+        if pipeline.result.failed:
+            print(f"⚠️ {pipeline.result.failed} sản phẩm ghi/xóa thất bại: {pipeline.result.errors[:5]}")
         print("Đã hoàn tất cập nhật và xóa.")
 
     def hash_item(self, item):
-        def default_serializer(obj):
-            if hasattr(obj, "isoformat"):
-                return obj.isoformat()
-            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
-        item_copy = dict(item)
-        item_copy.pop("SyncChecksum", None)
-        item_copy.pop("SyncTimestamp", None)
-        return hashlib.md5(json.dumps(item_copy, sort_keys=True, default=default_serializer).encode()).hexdigest()
+        return PRODUCT_FINGERPRINT(item)
 
     @staticmethod
     def is_newer(api_mod, fs_mod):
@@ -689,10 +763,98 @@ class FirestoreProductService:
                 return False
             if not fs_mod:
                 return True
-            return parse_date(api_mod) > parse_date(fs_mod)
+            return FirestoreProductService._as_datetime(api_mod) > FirestoreProductService._as_datetime(fs_mod)
         except Exception:
             return False
 
+    @staticmethod
+    def _as_datetime(value) -> Optional[datetime]:
+        """Naive datetime from an ISO string or datetime (KiotViet dates carry no timezone)."""
+        if not value:
+            return None
+        if not isinstance(value, datetime):
+            try:
+                value = parse_date(str(value))
+            except (TypeError, ValueError, OverflowError):
+                return None
+        return value.replace(tzinfo=None)
+
+    def get_compare_report(self, source: str = "ledger", refresh: bool = False) -> Dict[str, Any]:
+        """KiotViet vs Firestore diff from the sync's checksum data, cached until the catalog changes."""
+        if source not in ("ledger", "firestore"):
+            raise ValueError("source phải là ledger hoặc firestore")
+        # The catalog version moves on every sync and product write, so a cached report is never stale.
+        cache_key = f"compare_report:{source}:{self.cache.version}"
+        report = None if refresh else self.cache.get(cache_key)
+        if report is None:
+            report = self.build_compare_report(source)
+            self.cache.set(cache_key, report, ttl=COMPARE_REPORT_TTL_SECONDS)
+        return report
+
+    def build_compare_report(self, source: str = "ledger") -> Dict[str, Any]:
+        """
+        Diff the KiotViet snapshot the last syncs left in the ledger against
+        - source="ledger": the checksums the sync wrote (no Firestore reads);
+          ids the ledger does not know (written by the app since) are "unverified"
+        - source="firestore": SyncChecksum of every document (projected reads);
+          pre-v2 checksums cannot be checked without the full record: "legacy_checksums"
+        """
+        import time
+        started = time.time()
+        ledger = self.ledger
+        snapshot = ledger.load_source()
+        info = ledger.source_info()
+
+        firebase_details: Dict[str, Dict[str, Any]] = {}
+        if source == "firestore":
+            firebase_checksums = {}
+            for doc in self.products_ref.select(["SyncChecksum", *COMPARE_DETAIL_FIELDS]).stream():
+                data = doc.to_dict() or {}
+                firebase_checksums[doc.id] = data.get("SyncChecksum")
+                firebase_details[doc.id] = data
+        else:
+            firebase_checksums = ledger.load()
+
+        categories: Dict[str, List[Dict[str, Any]]] = {name: [] for name in COMPARE_CATEGORIES}
+        for doc_id, (kv_checksum, details) in snapshot.items():
+            fb_checksum = firebase_checksums.get(doc_id)
+            if fb_checksum == kv_checksum:
+                continue
+            entry = {"Id": doc_id, "code": details.get("Code"), "name": details.get("FullName"),
+                     "kiotviet_checksum": kv_checksum, "kiotviet_onhand": details.get("OnHand"),
+                     "kiotviet_modified": details.get("ModifiedDate")}
+            if doc_id not in firebase_checksums:
+                categories["unverified" if source == "ledger" else "missing_in_firebase"].append(entry)
+                continue
+            entry["firebase_checksum"] = fb_checksum
+            fb_data = firebase_details.get(doc_id)
+            if fb_data is not None:
+                entry["firebase_onhand"] = fb_data.get("OnHand")
+                entry["firebase_modified"] = fb_data.get("ModifiedDate")
+            categories["legacy_checksums" if is_legacy(fb_checksum) else "checksum_mismatches"].append(entry)
+
+        for doc_id in firebase_checksums.keys() - snapshot.keys():
+            data = firebase_details.get(doc_id, {})
+            categories["missing_in_kiotviet"].append({"Id": doc_id, "code": data.get("Code"),
+                                                      "name": data.get("FullName")})
+
+        for items in categories.values():
+            items.sort(key=lambda entry: (len(entry["Id"]), entry["Id"]))
+
+        return {
+            "source": source,
+            "generated_at": datetime.utcnow().isoformat(),
+            "build_seconds": round(time.time() - started, 3),
+            "kiotviet_snapshot_at": info["updated_at"],
+            "kiotviet_full_snapshot_at": info["complete_at"],
+            # Without a full sync since the snapshot started, missing_in_kiotviet is not meaningful.
+            "complete": info["complete_at"] is not None,
+            "total_kiotviet": len(snapshot),
+            "total_firebase": len(firebase_checksums),
+            "counts": {name: len(items) for name, items in categories.items()},
+            "categories": categories,
+        }
+
     def read_all_products_fresh(self, include_inactive: bool = False, include_deleted: bool = False):
         """Đọc TẤT CẢ products trực tiếp từ Firestore, KHÔNG dùng cache."""
         print(f"🔄 read_all_products_fresh (include_inactive={include_inactive}, include_deleted={include_deleted})")
@@ -726,7 +888,7 @@ class FirestoreProductService:
             "all_products:inactive=True:deleted=True",
         ]
 
-        for key in cache_keys_to_invalidate:
-            self.cache.invalidate(key)
+        self.cache.invalidate_many(cache_keys_to_invalidate)
+        self.cache.bump_version()
 
         print(f"🗑️ Invalidated {len(cache_keys_to_invalidate)} product cache keys")
\ No newline at end of file
@@ -1,9 +1,36 @@
 import json
+import threading
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 
-def init_firestore(account, app_name=None):
+# Khi được đặt (benchmarks/tests), init_firestore() trả về client giả thay vì kết nối Firestore thật
+_client_factory = None
+
+# Một client cho mỗi service account, tạo khi dùng lần đầu và dùng chung giữa các module.
+_clients = {}
+_app_names = {}
+_registry_lock = threading.Lock()
+# Riêng cho việc tạo client (chậm) để init_firestore() lúc import không phải chờ.
+_create_lock = threading.Lock()
+# Tăng mỗi khi đổi factory: các proxy đã resolve sẽ resolve lại theo client mới.
+_generation = 0
+
+
+def use_firestore_client_factory(factory):
+    """Route init_firestore() to ``factory(account, app_name)``; pass None to restore the real client."""
+    global _client_factory, _generation
+    with _create_lock, _registry_lock:
+        _client_factory = factory
+        _clients.clear()
+        _generation += 1
+
+
+def _create_client(account, app_name):
+    if _client_factory is not None:
+        return _client_factory(account, app_name)
+
     service_account_json = os.environ.get(account)
     if not service_account_json:
         raise Exception(f"Missing {account} environment variable.")
@@ -19,4 +46,91 @@ def init_firestore(account, app_name=None):
         cred = credentials.Certificate(cred_dict)
         app = firebase_admin.initialize_app(cred, name=app_name)
     db = firestore.client(app=app)
-    return db
\ No newline at end of file
+    print(f"🔥 Firestore client ready: {account}")
+    return db
+
+
+def get_firestore(account):
+    """The shared Firestore client for ``account``, created on first call."""
+    client = _clients.get(account)
+    if client is not None:
+        return client
+    with _create_lock:
+        client = _clients.get(account)
+        if client is None:
+            client = _clients[account] = _create_client(account, _app_names.get(account))
+        return client
+
+
+class _LazyProxy:
+    """Forwards attribute access to the object ``resolve()`` returns, resolved on first use."""
+
+    __slots__ = ("_resolve", "_target", "_target_generation", "_label")
+
+    def __init__(self, resolve, label):
+        object.__setattr__(self, "_resolve", resolve)
+        object.__setattr__(self, "_target", None)
+        object.__setattr__(self, "_target_generation", -1)
+        object.__setattr__(self, "_label", label)
+
+    def _get_target(self):
+        if self._target_generation != _generation:
+            generation = _generation
+            object.__setattr__(self, "_target", self._resolve())
+            object.__setattr__(self, "_target_generation", generation)
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._get_target(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get_target(), name, value)
+
+    def __repr__(self):
+        return f"<lazy {self._label}>"
+
+
+class LazyFirestoreClient(_LazyProxy):
+    """What init_firestore() returns: no credentials are parsed until the client is used.
+
+    ``collection()`` returns a lazy reference too, so services can keep building
+    their collection references at import time without opening the client.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, account):
+        super().__init__(lambda: get_firestore(account), account)
+
+    def collection(self, *path):
+        return _LazyProxy(lambda: self._get_target().collection(*path), f"{self._label}/{'/'.join(path)}")
+
+
+def init_firestore(account, app_name=None):
+    with _registry_lock:
+        # Tên app của lần gọi đầu tiên được dùng khi client thật được tạo.
+        _app_names.setdefault(account, app_name)
+    return LazyFirestoreClient(account)
+
+
+def prewarm_firestore_clients(accounts=None):
+    """Create the clients (and their gRPC channels) in a background thread.
+
+    Startup no longer pays for credential parsing and channel setup; this lets
+    the first request not pay for it either. Defaults to every account that
+    init_firestore() has been asked for so far.
+    """
+    accounts = list(accounts if accounts is not None else _app_names)
+
+    def _warm():
+        for account in accounts:
+            try:
+                client = get_firestore(account)
+                # Builds the transport and channel without issuing an RPC.
+                getattr(client, "_firestore_api", None)
+            except Exception as exc:
+                print(f"⚠️ Firestore prewarm {account} lỗi: {exc}")
+
+    thread = threading.Thread(target=_warm, name="firestore-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,181 @@
+"""Lease lock in Firestore so a sync runs on one worker of one host at a time.
+
+The job runner (``Utility.jobs``) only keeps one job per type per host; two
+hosts, or a scheduled run racing a button press, could still start the same
+sync twice. ``LeaseLock`` stores the current holder in ``SyncLocks/<name>``
+(products project), taken and renewed in transactions:
+
+- ``acquire()`` succeeds when nobody holds the lease or the holder's lease
+  expired (``SYNC_LEASE_SECONDS`` after its last renewal; a crashed worker
+  therefore blocks the sync for at most that long);
+- ``keep_alive()`` renews the lease every third of its lifetime until
+  ``release()``; whoever acquires a lease starts it right away, so a sync
+  waiting in the job queue keeps its lease too;
+- ``run_exclusive()`` holds the lease while the sync runs, releases it
+  afterwards and records sync duration/result metrics;
+- a scheduled run passes its ``slot`` (the cron minute it fires for); the
+  lease remembers the last slot taken, so the other workers that wake up for
+  the same minute skip it instead of running the sync again.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from firebase_admin import firestore
+
+from firebase.init_firebase import init_firestore
+from Utility.metrics import metrics
+
+LEASE_COLLECTION = "SyncLocks"
+SYNC_LEASE_SECONDS = float(os.getenv("SYNC_LEASE_SECONDS", "300"))
+
+metrics.describe("sync_runs_total", "KiotViet syncs started through run_exclusive, by sync, trigger and status.")
+metrics.describe("sync_duration_seconds", "KiotViet sync run time, by sync.")
+metrics.describe("sync_last_success_timestamp", "Unix time of the last successful run, by sync.")
+metrics.describe("sync_last_changed", "Records written by the last successful run, by sync.")
+
+db = init_firestore("FIREBASE_SERVICE_ACCOUNT_HANGHOA", app_name="hanghoa_app")
+
+
+class LeaseLock:
+    def __init__(self, name: str, *, client: Any = None, ttl_seconds: float = SYNC_LEASE_SECONDS):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        # Lease document as seen by the last failed acquire(), for messages.
+        self.holder: Dict[str, Any] = {}
+        self._client = client or db
+        self._renewer_stop: Optional[threading.Event] = None
+
+    @property
+    def ref(self):
+        return self._client.collection(LEASE_COLLECTION).document(self.name)
+
+    def _transact(self, body: Callable[[Any, Dict[str, Any], float], bool]) -> bool:
+        @firestore.transactional
+        def run(transaction):
+            snapshot = self.ref.get(transaction=transaction)
+            data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            return body(transaction, data, time.time())
+
+        return run(self._client.transaction())
+
+    def acquire(self, slot: Optional[str] = None) -> bool:
+        def take(transaction, data, now):
+            held_by_other = data.get("owner") not in (None, self.owner) and (data.get("expires_at") or 0) > now
+            if held_by_other or (slot is not None and data.get("last_slot") == slot):
+                self.holder = data
+                return False
+            lease = {"owner": self.owner, "acquired_at": now, "expires_at": now + self.ttl_seconds}
+            if slot is not None:
+                lease["last_slot"] = slot
+            transaction.set(self.ref, lease, merge=True)
+            return True
+
+        self.held = self._transact(take)
+        return self.held
+
+    def keep_alive(self) -> None:
+        """Renew the lease every third of its lifetime, on a daemon thread, until ``release()``."""
+        if self._renewer_stop is not None:
+            return
+        self._renewer_stop = threading.Event()
+        threading.Thread(target=_keep_renewing, args=(self, self._renewer_stop), name=f"lease-{self.name}",
+                         daemon=True).start()
+
+    def renew(self) -> bool:
+        def extend(transaction, data, now):
+            if data.get("owner") != self.owner:
+                return False
+            transaction.update(self.ref, {"expires_at": now + self.ttl_seconds})
+            return True
+
+        self.held = self._transact(extend)
+        return self.held
+
+    def release(self, outcome: Optional[Dict[str, Any]] = None) -> None:
+        if self._renewer_stop is not None:
+            self._renewer_stop.set()
+            self._renewer_stop = None
+
+        def drop(transaction, data, now):
+            if data.get("owner") != self.owner:
+                return False
+            transaction.update(self.ref, {"owner": None, "expires_at": 0, "released_at": now,
+                                          "last_outcome": outcome or {}})
+            return True
+
+        try:
+            self._transact(drop)
+        finally:
+            self.held = False
+
+
+def _keep_renewing(lock: LeaseLock, stop: threading.Event) -> None:
+    while not stop.wait(lock.ttl_seconds / 3):
+        try:
+            if not lock.renew():
+                print(f"⚠️ Mất lease {lock.name}, một tiến trình khác có thể bắt đầu đồng bộ")
+                return
+        except Exception as exc:
+            print(f"⚠️ Không gia hạn được lease {lock.name}: {exc}")
+
+
+def _changed_count(result: Any) -> Optional[float]:
+    stats = result.get("stats") if isinstance(result, dict) else None
+    if not isinstance(stats, dict):
+        return None
+    for key in ("updated_or_created", "updated", "written"):
+        if isinstance(stats.get(key), (int, float)):
+            return stats[key]
+    return None
+
+
+def run_exclusive(name: str, func: Callable[..., Any], *args: Any, trigger: str = "manual",
+                  lock: Optional[LeaseLock] = None, **kwargs: Any) -> Any:
+    """Run ``func`` while holding lease ``name``; returns a failure dict when someone else holds it.
+
+    Pass an already acquired ``lock`` to keep it (the scheduler takes it, and starts
+    ``keep_alive()``, before queueing the job).
+    """
+    lock = lock or LeaseLock(name)
+    if not lock.held and not lock.acquire():
+        holder = lock.holder.get("owner") or "?"
+        print(f"⏭️ Bỏ qua {name}: đang được chạy bởi {holder}")
+        metrics.inc("sync_runs_total", labels={"sync": name, "trigger": trigger, "status": "skipped"})
+        return {
+            "success": False,
+            "skipped": True,
+            "message": f"{name} đang chạy ở tiến trình khác ({holder})",
+            "error": f"{name} đang chạy ở tiến trình khác",
+        }
+
+    lock.keep_alive()
+    started = time.time()
+    status = "failed"
+    result: Any = None
+    try:
+        result = func(*args, **kwargs)
+        if not (isinstance(result, dict) and result.get("success") is False):
+            status = "succeeded"
+        return result
+    finally:
+        elapsed = time.time() - started
+        metrics.inc("sync_runs_total", labels={"sync": name, "trigger": trigger, "status": status})
+        metrics.observe("sync_duration_seconds", elapsed, {"sync": name})
+        if status == "succeeded":
+            metrics.set_gauge("sync_last_success_timestamp", time.time(), {"sync": name})
+            changed = _changed_count(result)
+            if changed is not None:
+                metrics.set_gauge("sync_last_changed", changed, {"sync": name})
+        try:
+            lock.release({"status": status, "trigger": trigger, "seconds": round(elapsed, 2)})
+        except Exception as exc:
+            print(f"⚠️ Không trả được lease {name} (sẽ hết hạn sau {lock.ttl_seconds:.0f}s): {exc}")
@@ -0,0 +1,195 @@
+"""Cron-like scheduler for the KiotViet syncs.
+
+``SYNC_SCHEDULE`` lists ``task=<cron>`` entries separated by ``;``; the cron
+expression has the usual five fields (minute hour day-of-month month
+day-of-week, Sunday = 0 or 7) with ``*``, ``a-b``, ``*/n``, ``a-b/n`` and
+lists. Times are in UTC+``SYNC_SCHEDULE_UTC_OFFSET_HOURS`` (Vietnam, 7).
+
+    products_full=0 2 * * *; products_delta=*/15 * * * *; customers=30 2 * * *
+
+Tasks (``build_sync_tasks``): ``products_delta``, ``products_full``,
+``products_auto`` and ``customers``. Every worker process runs the
+scheduler thread; when an entry is due, the worker takes the sync's lease
+(``firebase.sync_lock``) for that minute and queues the sync as a job
+(``Utility.jobs``), so it runs once across all workers and hosts and shows up
+in ``/api/jobs``. Entries that fire in the same minute and share a sync run
+in the order listed; the later ones are skipped while the first holds the lease.
+
+``SYNC_SCHEDULER_ENABLED`` (default: on in prod, off otherwise) switches the
+thread on; an empty ``SYNC_SCHEDULE`` disables every entry.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from firebase.sync_lock import LeaseLock, run_exclusive
+from Utility.jobs import job_runner
+from Utility.metrics import metrics
+from Utility.server_env import get_env_name
+
+DEFAULT_SCHEDULE = "products_full=0 2 * * *; products_delta=*/15 * * * *; customers=30 2 * * *"
+SCHEDULE_TZ = timezone(timedelta(hours=float(os.getenv("SYNC_SCHEDULE_UTC_OFFSET_HOURS", "7"))))
+
+# (min, max) of each cron field.
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+SyncTask = Tuple[str, Callable[..., Any]]  # (job type / lease name, function)
+
+
+class CronExpression:
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Biểu thức cron cần 5 trường: {expression!r}")
+        self.expression = expression
+        fields = [self._parse_field(part, low, high) for part, (low, high) in zip(parts, _FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        # Standard cron: when both day fields are restricted, either may match.
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> FrozenSet[int]:
+        values = set()
+        for item in field.split(","):
+            step = 1
+            if "/" in item:
+                item, raw_step = item.split("/", 1)
+                step = int(raw_step)
+                if step < 1:
+                    raise ValueError(f"Bước cron không hợp lệ: {field!r}")
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(value) for value in item.split("-", 1))
+            else:
+                start = int(item)
+                end = high if step > 1 else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"Giá trị cron ngoài khoảng {low}-{high}: {field!r}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def matches(self, moment: datetime) -> bool:
+        if moment.minute not in self.minutes or moment.hour not in self.hours or moment.month not in self.months:
+            return False
+        day_ok = moment.day in self.days
+        # datetime: Monday = 0; cron: Sunday = 0.
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+
+class ScheduleEntry(NamedTuple):
+    task: str
+    cron: CronExpression
+
+
+def parse_schedule(spec: str) -> List[ScheduleEntry]:
+    entries = []
+    for raw in spec.split(";"):
+        raw = raw.strip()
+        if not raw:
+            continue
+        task, sep, expression = raw.partition("=")
+        if not sep:
+            raise ValueError(f"Mục lịch cần dạng task=<cron>: {raw!r}")
+        entries.append(ScheduleEntry(task.strip(), CronExpression(expression.strip())))
+    return entries
+
+
+def build_sync_tasks(product_service) -> Dict[str, SyncTask]:
+    from firebase.firebase_khachhang.import_to_firestore import update_customer_from_kiotviet_to_firestore
+
+    def product_sync(mode: str) -> Callable[[], Any]:
+        return lambda: product_service.sync_products_from_kiotviet(mode=mode)
+
+    return {
+        "products_delta": ("products_sync", product_sync("delta")),
+        "products_full": ("products_sync", product_sync("full")),
+        "products_auto": ("products_sync", product_sync("auto")),
+        "customers": ("customers_sync", update_customer_from_kiotviet_to_firestore),
+    }
+
+
+class SyncScheduler:
+    def __init__(self, entries: List[ScheduleEntry], tasks: Dict[str, SyncTask]):
+        unknown = [entry.task for entry in entries if entry.task not in tasks]
+        if unknown:
+            raise ValueError(f"Tác vụ không có trong lịch đồng bộ: {', '.join(unknown)}")
+        self.entries = entries
+        self.tasks = tasks
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None and self.entries:
+            self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+            self._thread.start()
+            print("⏰ Lịch đồng bộ: " + "; ".join(f"{e.task}={e.cron.expression}" for e in self.entries))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        last_minute: Optional[datetime] = None
+        while not self._stop.is_set():
+            minute = datetime.now(SCHEDULE_TZ).replace(second=0, microsecond=0)
+            if minute != last_minute:
+                last_minute = minute
+                self.run_due(minute)
+            # Wake just after the next minute starts.
+            self._stop.wait(60.5 - datetime.now(SCHEDULE_TZ).second)
+
+    def run_due(self, minute: datetime) -> None:
+        for entry in self.entries:
+            if entry.cron.matches(minute):
+                try:
+                    self.fire(entry.task, f"{entry.task}@{minute.isoformat()}")
+                except Exception as exc:
+                    print(f"❌ Không chạy được tác vụ lịch {entry.task}: {exc}")
+
+    def fire(self, task: str, slot: str) -> Optional[Dict[str, Any]]:
+        job_type, func = self.tasks[task]
+        lock = LeaseLock(job_type)
+        if not lock.acquire(slot=slot):
+            # Another worker took this minute, or the sync is already running somewhere.
+            metrics.inc("sync_runs_total", labels={"sync": job_type, "trigger": "schedule", "status": "skipped"})
+            return None
+        # The job may wait behind others in the queue; renew from now, not from when it starts.
+        lock.keep_alive()
+        try:
+            job, created = job_runner.submit(job_type, run_exclusive, job_type, func, trigger="schedule", lock=lock,
+                                             params={"task": task, "slot": slot})
+        except Exception:
+            lock.release({"status": "failed", "trigger": "schedule"})
+            raise
+        if not created:
+            lock.release({"status": "skipped", "trigger": "schedule"})
+            metrics.inc("sync_runs_total", labels={"sync": job_type, "trigger": "schedule", "status": "skipped"})
+        return job
+
+
+def _scheduler_enabled() -> bool:
+    default = "1" if get_env_name() == "prod" else "0"
+    return os.getenv("SYNC_SCHEDULER_ENABLED", default).lower() in ("1", "true", "yes")
+
+
+_scheduler: Optional[SyncScheduler] = None
+
+
+def start_sync_scheduler(product_service) -> Optional[SyncScheduler]:
+    """Start this process's scheduler thread (once) if enabled; returns it."""
+    global _scheduler
+    if _scheduler is not None or not _scheduler_enabled():
+        return _scheduler
+    entries = parse_schedule(os.getenv("SYNC_SCHEDULE", DEFAULT_SCHEDULE))
+    _scheduler = SyncScheduler(entries, build_sync_tasks(product_service))
+    _scheduler.start()
+    return _scheduler
@@ -0,0 +1,126 @@
+"""Server-Sent Events change feed: ``GET /api/events/<namespace>``.
+
+A lighter alternative to Socket.IO long-polling for terminals that only
+listen: one long-lived ``text/event-stream`` response per client instead of a
+new HTTP request per poll. Events are the same ones the ``notify_*`` helpers
+in ``routes/shared.py`` emit to Socket.IO, read from the per-namespace event
+log, so the SSE ``id`` is the Socket.IO sequence number and ``Last-Event-ID``
+resumes exactly like ``auth.last_seq`` on a Socket.IO reconnect.
+
+Stream format::
+
+    id: <seq>
+    event: <event name>        e.g. invoice_created, products_onhand_updated
+    data: <JSON payload>
+
+plus ``event: resync`` when the missed events are no longer available (reload
+from REST) and a ``: heartbeat`` comment every ``SSE_HEARTBEAT_SECONDS``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+from flask import Blueprint, Response, jsonify, request
+
+from routes.firebase_websocket import get_event_log
+from Utility.metrics import metrics
+
+NAMESPACES = ("products", "customers", "invoices", "orders")
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15") or 15)
+# Client reconnect delay announced with the `retry:` field (ms).
+SSE_RETRY_MS = 3000
+
+metrics.describe("sse_connections", "Open Server-Sent Events streams, by namespace.")
+metrics.describe("sse_events_sent_total", "Events written to Server-Sent Events streams, by namespace.")
+
+_open_streams = {namespace: 0 for namespace in NAMESPACES}
+_open_streams_lock = threading.Lock()
+
+
+def _track_stream(namespace: str, delta: int) -> None:
+    with _open_streams_lock:
+        _open_streams[namespace] += delta
+        metrics.set_gauge("sse_connections", _open_streams[namespace], {"namespace": namespace})
+
+
+def _format_event(seq, event, data) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
+
+
+def _resync(latest_seq, reason) -> str:
+    return _format_event(latest_seq, "resync", {"latest_seq": latest_seq, "reason": reason})
+
+
+def _parse_last_event_id(raw):
+    try:
+        return int(raw) if raw not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def create_events_routes_bp() -> Blueprint:
+    bp = Blueprint("events", __name__, url_prefix="/api/events")
+
+    @bp.route("/<namespace>", methods=["GET"])
+    def stream_events(namespace: str):
+        if namespace not in NAMESPACES:
+            return jsonify({"status": "error", "message": "invalid namespace"}), 404
+
+        log = get_event_log(f"/api/websocket/{namespace}")
+        # EventSource sends Last-Event-ID on reconnect; the query parameter lets a
+        # freshly opened EventSource resume from a seq it persisted itself.
+        last_seq = _parse_last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+
+        def generate():
+            labels = {"namespace": namespace}
+            # Subscribe only once the body is actually streamed (the finally below is then
+            # guaranteed to run), and before reading the backlog so nothing falls between the two.
+            subscription = log.subscribe()
+            backlog = log.since(last_seq) if last_seq is not None else []
+            _track_stream(namespace, 1)
+            try:
+                yield f"retry: {SSE_RETRY_MS}\n\n"
+                sent_seq = last_seq or 0
+                if backlog is None:
+                    sent_seq = log.latest_seq
+                    yield _resync(sent_seq, "gap_too_large")
+                else:
+                    for seq, event, data in backlog:
+                        sent_seq = seq
+                        yield _format_event(seq, event, data)
+                    metrics.inc("sse_events_sent_total", len(backlog), labels)
+
+                while True:
+                    if subscription.overflowed:
+                        # This client stopped reading; tell it to reload and drop the stream.
+                        yield _resync(log.latest_seq, "client_too_slow")
+                        return
+                    entry = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                    if entry is None:
+                        yield ": heartbeat\n\n"
+                        continue
+                    seq, event, data = entry
+                    if seq <= sent_seq:
+                        continue
+                    sent_seq = seq
+                    metrics.inc("sse_events_sent_total", labels=labels)
+                    yield _format_event(seq, event, data)
+            finally:
+                log.unsubscribe(subscription)
+                _track_stream(namespace, -1)
+
+        return Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                # Keep nginx from buffering the stream.
+                "X-Accel-Buffering": "no",
+            },
+        )
+
+    return bp
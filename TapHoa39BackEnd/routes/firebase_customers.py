@@ -5,7 +5,9 @@ from google.api_core.exceptions import ResourceExhausted
 
 from FromKiotViet.Model.customer import Customer
 from FromKiotViet.add_customer import add_customer_to_kiotviet
+from firebase.firebase_service.customer_service import AGGREGATE_REFRESH_MODES
 from Utility.get_env import LatestBranchId
+from routes.jobs_routes import respond_with_job
 from routes.shared import (
     broadcast_customer_updates,
     create_fetch_handler,
@@ -32,11 +34,7 @@ def create_firebase_customers_bp(customer_service, socketio) -> Blueprint:
         return customer
 
     def _customer_to_firestore_payload(customer: Customer) -> dict:
-        data = customer.to_dict(include_none=False, include_id_alias=True)
-        if customer.Id is not None:
-            data.setdefault("Id", customer.Id)
-            data.setdefault("id", str(customer.Id))
-        return data
+        return customer.to_firestore()
 
     def _sync_customer_with_kiotviet(customer: Customer) -> dict:
         kiot_response = add_customer_to_kiotviet(customer.to_kiotviet_payload())
@@ -165,6 +163,24 @@ def create_firebase_customers_bp(customer_service, socketio) -> Blueprint:
             print(traceback.format_exc())
             return jsonify({"status": "error", "message": str(exc)}), 500
 
+    @bp.route("/customers/refresh_aggregates", methods=["POST"])
+    @handle_api_errors
+    def refresh_customer_aggregates():
+        """Recompute Debt/TotalInvoiced/TotalRevenue/TotalPoint of every customer.
+        Optional "mode" (body or ?mode=): "scan" (default, one pass over the invoices)
+        or "per_customer" (invoice queries per customer).
+        Runs as a background job: 202 with the job id if it outlasts JOB_WAIT_SECONDS."""
+        payload = request.get_json(silent=True)
+        mode = request.args.get("mode") or (payload.get("mode") if isinstance(payload, dict) else None) or "scan"
+        if mode not in AGGREGATE_REFRESH_MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(AGGREGATE_REFRESH_MODES)}"}), 400
+
+        def run():
+            updated, errors = customer_service.refresh_customer_aggregates(mode=mode)
+            return {"updated_count": len(updated), "mode": mode, "errors": errors}
+
+        return respond_with_job("customers_refresh_aggregates", run, params={"mode": mode}, payload=payload)
+
     @bp.route("/customers/batch_delete", methods=["POST"])
     def delete_customers():
         try:
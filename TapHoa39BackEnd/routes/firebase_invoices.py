@@ -7,6 +7,7 @@ from routes.shared import (
     broadcast_customer_updates,
     broadcast_products_onhand_updated,
     create_simple_fetch_handler,
+    emit_notification,
     handle_api_errors,
     invalidate_invoice_cache,
     is_valid_pid,
@@ -366,20 +367,9 @@ def create_firebase_invoices_bp(invoice_service, product_service, customer_servi
         if not socketio:
             return jsonify({"status": "error", "message": "socketio not available"}), 500
 
-        # store last notify for the namespace so new connections receive it on connect
-        try:
-            from routes.firebase_websocket import set_last_notify
-
-            set_last_notify(ns_path, event, data)
-        except Exception:
-            pass
-
-        # If sender_sid supplied, skip sending to that socket id (avoid echo)
-        emit_kwargs = {"namespace": ns_path}
-        if sender_sid:
-            emit_kwargs["skip_sid"] = sender_sid
-
-        socketio.emit(event, data, **emit_kwargs)
+        # Remembered as the namespace's last notify so new connections receive it on connect;
+        # if sender_sid is supplied, skip sending to that socket id (avoid echo)
+        emit_notification(socketio, ns_path, event, data, remember=True, skip_sid=sender_sid or None)
 
         return jsonify({"status": "ok", "namespace": namespace, "event": event})
 
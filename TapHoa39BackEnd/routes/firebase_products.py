@@ -3,6 +3,8 @@ from __future__ import annotations
 from flask import Blueprint, jsonify, request
 
 from firebase.firebase_hanghoa.import_to_firestore import update_products_from_banhang_app_to_firestore
+from firebase.sync_lock import run_exclusive
+from routes.jobs_routes import respond_with_job
 from routes.shared import (
     apply_product_updates,
     broadcast_products_onhand_updated,
@@ -162,19 +164,23 @@ def create_firebase_products_bp(product_service, socketio) -> Blueprint:
         """
         Trigger a sync from KiotViet into Firestore (KiotViet is source-of-truth).
         Accepts optional JSON body: { "force": true, "limit": 100 }
-        Returns the sync summary and latest products (up to `limit`).
+        Returns the sync summary and latest products (up to `limit`), or 202 with
+        the job id when the sync outlasts JOB_WAIT_SECONDS (poll /api/jobs/<id>).
         """
         payload = request.get_json(silent=True) or {}
         force = bool(payload.get("force", False))
         limit = int(payload.get("limit", 100)) if payload.get("limit") is not None else 100
 
-        sync_result = product_service.sync_products_from_kiotviet()
+        def render(sync_result):
+            products = product_service.read_all_products() or []
+            if limit and isinstance(limit, int) and limit > 0:
+                products = products[:limit]
 
-        products = product_service.read_all_products() or []
-        if limit and isinstance(limit, int) and limit > 0:
-            products = products[:limit]
+            return jsonify({"sync": sync_result, "products": products})
 
-        return jsonify({"sync": sync_result, "products": products})
+        return respond_with_job("products_sync", run_exclusive, "products_sync",
+                                product_service.sync_products_from_kiotviet,
+                                params={"mode": "auto"}, payload=payload, render=render)
 
     @bp.route("/products/latest", methods=["GET"])
     @handle_api_errors
@@ -10,11 +10,21 @@ subscribe to rooms in the future.
 
 from __future__ import annotations
 
+import os
+import queue
+import threading
+import time
+from bisect import bisect_right, insort
+from collections import deque
+
 from flask_socketio import Namespace, join_room
 from flask import request
 from typing import Any
 from flask_socketio import SocketIO
 
+from Utility.message_bus import get_bus
+from Utility.metrics import metrics
+
 # Simple in-memory pending notifications store.
 # Key: namespace string (e.g. '/api/websocket/invoices'), value: list of payloads
 _PENDING_NOTIFICATIONS: dict[str, list[Any]] = {}
@@ -63,8 +73,15 @@ class BaseNamespace(Namespace):
         super().__init__(namespace)
         self._namespace = namespace
 
-    def on_connect(self):  # pragma: no cover - thin wrapper
+    def on_connect(self, auth=None):  # pragma: no cover - thin wrapper
         print(f"Client connected to namespace {self._namespace}")
+        # A reconnecting client sends the last sequence number it saw; give it
+        # exactly the events it missed (or a resync signal) instead of the
+        # pending/last-notify catch-up below.
+        last_seq = auth.get("last_seq") if isinstance(auth, dict) else None
+        if isinstance(last_seq, (int, float)) and not isinstance(last_seq, bool):
+            self._replay_since(int(last_seq))
+            return
         # When a client connects, emit any pending notifications that were queued
         pending = _PENDING_NOTIFICATIONS.get(self._namespace)
         if pending:
@@ -91,6 +108,19 @@ class BaseNamespace(Namespace):
         except Exception:
             pass
 
+    def _replay_since(self, last_seq: int) -> None:
+        log = get_event_log(self._namespace)
+        missed = log.since(last_seq)
+        if missed is None:
+            metrics.inc("socketio_resyncs_total", labels={"namespace": self._namespace})
+            self.emit('resync', {'latest_seq': log.latest_seq, 'reason': 'gap_too_large'}, room=request.sid)
+            return
+        metrics.inc("socketio_replayed_events_total", len(missed), labels={"namespace": self._namespace})
+        self.emit('replay', {
+            'events': [{'seq': seq, 'event': event, 'data': data} for seq, event, data in missed],
+            'latest_seq': log.latest_seq,
+        }, room=request.sid)
+
     def on_disconnect(self):  # pragma: no cover - thin wrapper
         print(f"Client disconnected from namespace {self._namespace}")
 
@@ -123,15 +153,166 @@ def register_namespaces(socketio) -> None:
 
 # In-memory store for last notifications per namespace. Structure:
 # { namespace_path: { 'event': <event_name>, 'data': <payload> } }
-# This is process-local and intended for single-process dev use.
+# Each worker keeps its own copy; set_last_notify() publishes the change on the
+# message bus so a client connecting to any worker gets the same last notify.
 LAST_NOTIFIES = {}
+LAST_NOTIFY_CHANNEL = 'socketio.last_notify'
+
+
+def _store_last_notify(namespace: str, event: str, data: object) -> None:
+    LAST_NOTIFIES[namespace] = {"event": event, "data": data}
+
+
+def _apply_remote_last_notify(message: dict) -> None:
+    namespace = message.get("namespace")
+    if namespace:
+        _store_last_notify(namespace, message.get("event"), message.get("data"))
 
 
 def set_last_notify(namespace: str, event: str, data: object) -> None:
     try:
         if not namespace:
             return
-        LAST_NOTIFIES[namespace] = {"event": event, "data": data}
+        _store_last_notify(namespace, event, data)
+        get_bus().publish(LAST_NOTIFY_CHANNEL, {"namespace": namespace, "event": event, "data": data})
     except Exception:
         pass
 
+
+get_bus().subscribe(LAST_NOTIFY_CHANNEL, _apply_remote_last_notify)
+
+
+# Ring buffer of recent events per namespace, so a reconnecting client can ask
+# for everything after the last sequence number it saw. Sequence numbers are
+# microsecond timestamps made strictly increasing: every worker can assign them
+# without coordination and the logs replicated over the message bus stay ordered.
+EVENT_LOG_SIZE = int(os.getenv("SOCKETIO_EVENT_LOG_SIZE", "500") or 500)
+# Replaying more than this is slower than a full resync on the client.
+EVENT_REPLAY_MAX = int(os.getenv("SOCKETIO_EVENT_REPLAY_MAX", "200") or 200)
+EVENT_LOG_CHANNEL = 'socketio.event_log'
+
+metrics.describe("socketio_replayed_events_total", "Events replayed to reconnecting Socket.IO clients, by namespace.")
+metrics.describe("socketio_resyncs_total", "Reconnecting clients told to resync (gap too large), by namespace.")
+
+_seq_lock = threading.Lock()
+_last_seq = 0
+
+
+def next_seq() -> int:
+    global _last_seq
+    with _seq_lock:
+        _last_seq = max(_last_seq + 1, time.time_ns() // 1000)
+        return _last_seq
+
+
+# Anything before this worker started is unknown to its logs.
+_STARTED_SEQ = next_seq()
+
+
+class EventLog:
+    def __init__(self, size: int = EVENT_LOG_SIZE, replay_max: int = EVENT_REPLAY_MAX):
+        self.size = size
+        self.replay_max = replay_max
+        self._entries: deque = deque()
+        self._lock = threading.Lock()
+        self._subscribers: list = []
+        # Events at or below this seq may be missing here: evicted from the
+        # buffer, or emitted before this worker started.
+        self._floor = _STARTED_SEQ
+
+    @property
+    def latest_seq(self) -> int:
+        with self._lock:
+            return self._entries[-1][0] if self._entries else self._floor
+
+    def append(self, seq: int, event: str, data: Any) -> None:
+        with self._lock:
+            if self._entries and seq < self._entries[-1][0]:
+                # Replicated from another worker slightly out of order.
+                entries = list(self._entries)
+                insort(entries, (seq, event, data), key=lambda entry: entry[0])
+                self._entries = deque(entries)
+            else:
+                self._entries.append((seq, event, data))
+            while len(self._entries) > self.size:
+                self._floor = max(self._floor, self._entries.popleft()[0])
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put((seq, event, data))
+
+    def subscribe(self, maxsize: int = 1000) -> "EventSubscription":
+        """Live feed of every event appended from now on (used by the SSE stream)."""
+        subscription = EventSubscription(maxsize)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: "EventSubscription") -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def since(self, last_seq: int):
+        """Events after ``last_seq``, or None when some of them are no longer known."""
+        with self._lock:
+            if last_seq < self._floor:
+                return None
+            entries = list(self._entries)
+        start = bisect_right([entry[0] for entry in entries], last_seq)
+        missed = entries[start:]
+        if len(missed) > self.replay_max:
+            return None
+        return missed
+
+
+class EventSubscription:
+    """Bounded per-listener queue; a listener that falls behind is marked overflowed."""
+
+    def __init__(self, maxsize: int):
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, entry) -> None:
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout: float):
+        """Next ``(seq, event, data)``, or None when nothing arrived within ``timeout``."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+_EVENT_LOGS: dict[str, EventLog] = {}
+_event_logs_lock = threading.Lock()
+
+
+def get_event_log(namespace: str) -> EventLog:
+    log = _EVENT_LOGS.get(namespace)
+    if log is None:
+        with _event_logs_lock:
+            log = _EVENT_LOGS.setdefault(namespace, EventLog())
+    return log
+
+
+def record_event(namespace: str, event: str, data: Any) -> int:
+    """Assign the next sequence number to an event and log it in every worker."""
+    seq = next_seq()
+    get_event_log(namespace).append(seq, event, data)
+    try:
+        get_bus().publish(EVENT_LOG_CHANNEL, {"namespace": namespace, "seq": seq, "event": event, "data": data})
+    except ValueError as exc:
+        print(f"⚠️ Event log không đồng bộ được sang worker khác: {exc}")
+    return seq
+
+
+def _apply_remote_event(message: dict) -> None:
+    namespace = message.get("namespace")
+    if namespace and message.get("seq"):
+        get_event_log(namespace).append(int(message["seq"]), message.get("event"), message.get("data"))
+
+
+get_bus().subscribe(EVENT_LOG_CHANNEL, _apply_remote_event)
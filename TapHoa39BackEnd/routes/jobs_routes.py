@@ -0,0 +1,91 @@
+"""Status of background jobs (``Utility.jobs``) and the helper routes use to start them.
+
+``GET /api/jobs/<id>``  one job: status, progress, result or error
+``GET /api/jobs``       recent jobs, optional ``?type=`` and ``?limit=``
+
+Routes that start a job answer through ``respond_with_job()``: they wait up to
+``JOB_WAIT_SECONDS`` (or ``wait`` from the query/body, never longer) and
+return the usual response if the job finished in time, otherwise
+``202 Accepted`` with the job and the URL to poll.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+
+from flask import Blueprint, jsonify, request
+
+from routes.shared import handle_api_errors
+from Utility.jobs import JOB_WAIT_SECONDS, job_runner
+
+
+def _requested_wait(payload: Optional[Dict[str, Any]] = None) -> float:
+    raw = request.args.get("wait")
+    if raw is None and isinstance(payload, dict):
+        raw = payload.get("wait")
+    if raw is None:
+        return JOB_WAIT_SECONDS
+    try:
+        return max(0.0, min(float(raw), JOB_WAIT_SECONDS))
+    except (TypeError, ValueError):
+        return JOB_WAIT_SECONDS
+
+
+def _job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: job.get(key) for key in ("id", "type", "status", "params", "progress", "error",
+                                          "created_at", "started_at", "finished_at")}
+
+
+def respond_with_job(job_type: str, func: Callable[..., Any], *args: Any,
+                     render: Optional[Callable[[Any], Any]] = None,
+                     params: Optional[Dict[str, Any]] = None,
+                     payload: Optional[Dict[str, Any]] = None, **kwargs: Any):
+    """Run ``func`` as a ``job_type`` job and answer with its result if it finishes in time.
+
+    ``render(result)`` builds the finished response (default: the result as JSON);
+    a skipped run always answers 409, so callers can tell "already running" from a failure.
+    """
+    job, created = job_runner.submit(job_type, func, *args, params=params, **kwargs)
+    job = job_runner.wait(job["id"], _requested_wait(payload)) or job
+    if job["status"] == "succeeded" or (job["status"] == "failed" and job.get("result") is not None):
+        result = job["result"]
+        if isinstance(result, dict) and result.get("skipped"):
+            # The sync's lease is held by another worker or host (firebase/sync_lock.py).
+            return jsonify(result), 409
+        if render:
+            return render(result)
+        if job["status"] == "failed":
+            return jsonify(result), 500
+        return jsonify(result)
+    if job["status"] == "failed":
+        return jsonify({"job": _job_summary(job), "error": job.get("error")}), 500
+    return jsonify({
+        "job": _job_summary(job),
+        "already_running": not created,
+        "status_url": f"/api/jobs/{job['id']}",
+        "message": "Đang xử lý ở nền, kiểm tra tiến độ qua status_url.",
+    }), 202
+
+
+def create_jobs_routes_bp() -> Blueprint:
+    bp = Blueprint("jobs_routes", __name__, url_prefix="/api/jobs")
+
+    @bp.route("/<job_id>", methods=["GET"])
+    @handle_api_errors
+    def get_job(job_id: str):
+        job = job_runner.get(job_id)
+        if job is None:
+            return jsonify({"error": "Không tìm thấy job"}), 404
+        return jsonify(job)
+
+    @bp.route("", methods=["GET"])
+    @handle_api_errors
+    def list_jobs():
+        try:
+            limit = max(1, min(int(request.args.get("limit", 20)), 200))
+        except ValueError:
+            limit = 20
+        jobs = job_runner.recent(request.args.get("type") or None, limit)
+        return jsonify([_job_summary(job) for job in jobs])
+
+    return bp
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import time
+
+from flask import Blueprint, Response, g, jsonify, request
+
+from firebase.firebase_service.cache import all_cache_stats
+from Utility.metrics import metrics
+from Utility.tracing import (
+    SLOW_REQUEST_THRESHOLD_MS,
+    finish_trace,
+    recent_slow_traces,
+    record_slow_trace,
+    start_trace,
+)
+
+REQUEST_LATENCY_METRIC = "http_request_duration_seconds"
+
+metrics.describe(REQUEST_LATENCY_METRIC, "HTTP request latency by blueprint, route, method and status.")
+
+
+def register_request_metrics(app) -> None:
+    """Record per-route latency histograms and trace slow requests."""
+
+    @app.before_request
+    def _start_request_trace():
+        g.request_started = time.perf_counter()
+        g.request_trace = start_trace(request.method, path=request.path)
+
+    @app.after_request
+    def _record_request_latency(response):
+        started = g.pop("request_started", None)
+        trace = g.pop("request_trace", None)
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        labels = {
+            "blueprint": request.blueprint or "app",
+            "route": route,
+            "method": request.method,
+            "status": str(response.status_code),
+        }
+        metrics.observe(REQUEST_LATENCY_METRIC, elapsed, labels)
+
+        if trace is not None:
+            duration_ms = finish_trace(trace)
+            if duration_ms >= SLOW_REQUEST_THRESHOLD_MS:
+                record_slow_trace(trace, duration_ms, **labels)
+        return response
+
+    @app.teardown_request
+    def _discard_request_trace(exc=None):
+        # after_request does not run when the response could not be built.
+        trace = g.pop("request_trace", None)
+        if trace is not None:
+            finish_trace(trace)
+
+
+def create_metrics_routes_bp() -> Blueprint:
+    bp = Blueprint("metrics_routes", __name__, url_prefix="/api/metrics")
+
+    @bp.route("", methods=["GET"])
+    def prometheus_metrics():
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @bp.route("/latency", methods=["GET"])
+    def latency_summary():
+        """p50/p95/p99 per route, slowest first."""
+        return jsonify(metrics.latency_summary(REQUEST_LATENCY_METRIC))
+
+    @bp.route("/cache", methods=["GET"])
+    def cache_statistics():
+        """Hits/misses/expirations/invalidations, entries and approx memory per cache key prefix.
+        Query param `memory=false` skips the (sampled) memory estimate."""
+        include_memory = request.args.get("memory", "true").lower() not in ("0", "false", "no")
+        return jsonify(all_cache_stats(include_memory=include_memory))
+
+    @bp.route("/slow", methods=["GET"])
+    def slow_requests():
+        """Span trees of the most recent slow requests (newest first)."""
+        return jsonify({
+            "threshold_ms": SLOW_REQUEST_THRESHOLD_MS,
+            "requests": list(reversed(recent_slow_traces())),
+        })
+
+    return bp
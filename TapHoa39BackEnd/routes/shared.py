@@ -4,9 +4,12 @@ from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from functools import wraps
 from flask import jsonify, request
 from google.api_core.exceptions import ResourceExhausted
+import os
+import threading
 import traceback
 
-from routes.firebase_websocket import set_last_notify
+from routes.firebase_websocket import record_event, set_last_notify
+from Utility.metrics import metrics
 
 UPDATE_ID_KEYS: Tuple[str, ...] = ("Id", "id", "productId", "ProductId")
 ONHAND_KEYS: Tuple[str, ...] = ("OnHand", "onHand", "onhand")
@@ -144,38 +147,141 @@ def apply_product_updates(product_service, normalized_items: Iterable[Dict[str,
     return results, broadcast_updates
 
 
-def notify_product_onhand_updated(socketio, product_id: Any, fields: Dict[str, Any]):
-    # Emit a minimal notification so clients know to fetch fresh product data.
+PRODUCTS_NAMESPACE = '/api/websocket/products'
+CUSTOMERS_NAMESPACE = '/api/websocket/customers'
+INVOICES_NAMESPACE = '/api/websocket/invoices'
+ORDERS_NAMESPACE = '/api/websocket/orders'
+
+
+def emit_notification(socketio, namespace: str, event: str, payload: Any, remember: bool = False,
+                      skip_sid: Optional[str] = None) -> None:
+    """Single exit point for REST-triggered Socket.IO notifications.
+
+    The emit reaches the clients of every worker (see ``Utility/socketio_bus.py``)
+    as ``(payload, seq)``; ``seq`` lets a reconnecting client ask for what it
+    missed (see ``BaseNamespace.on_connect``). With ``remember`` the payload
+    also becomes the namespace's last notify, replayed to clients that connect
+    later without a sequence number.
+    """
     if not socketio:
         return
-    socketio.emit('product_onhand_updated', {'productId': str(product_id)}, namespace='/api/websocket/products')
+    seq = record_event(namespace, event, payload)
+    socketio.emit(event, (payload, seq), namespace=namespace, skip_sid=skip_sid)
+    if remember:
+        try:
+            set_last_notify(namespace, event, payload)
+        except Exception:
+            pass
+
+
+# Product/customer change notifications are merged over this window (ms) and sent
+# as one list event; 0 emits immediately (still one deduplicated event per call).
+NOTIFY_COALESCE_MS = float(os.getenv("NOTIFY_COALESCE_MS", "150") or 0)
+_INLINE_TYPES = (str, int, float, bool, type(None))
+
+metrics.describe("notify_coalesced_items_total", "Changed ids queued for a coalesced notification, by event.")
+metrics.describe("notify_coalesced_emits_total", "Coalesced notifications emitted, by event.")
+
+
+class NotificationCoalescer:
+    """Collect changed records for one namespace/event and emit them as a single list.
+
+    Records are keyed by ``Id``: a record queued twice inside the window is sent
+    once, with the later fields merged over the earlier ones. Only JSON scalar
+    fields are kept (Firestore timestamps and nested objects stay behind a fetch).
+    """
+
+    def __init__(self, socketio, namespace: str, event: str, window_ms: float = NOTIFY_COALESCE_MS):
+        self.socketio = socketio
+        self.namespace = namespace
+        self.event = event
+        self.window_seconds = max(0.0, window_ms) / 1000.0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> None:
+        added = 0
+        with self._lock:
+            for record in records:
+                merged = self._pending.setdefault(str(record["Id"]), {})
+                merged.update((key, value) for key, value in record.items() if isinstance(value, _INLINE_TYPES))
+                added += 1
+            if not added:
+                return
+            schedule = self.window_seconds > 0 and not self._scheduled
+            if schedule:
+                self._scheduled = True
+        metrics.inc("notify_coalesced_items_total", added, labels={"event": self.event})
+
+        if self.window_seconds <= 0:
+            self.flush()
+        elif schedule:
+            self.socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self) -> None:
+        self.socketio.sleep(self.window_seconds)
+        self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            records = list(self._pending.values())
+            self._pending = {}
+            self._scheduled = False
+        if not records:
+            return
+        metrics.inc("notify_coalesced_emits_total", labels={"event": self.event})
+        emit_notification(self.socketio, self.namespace, self.event, records)
+
+
+_coalescers: Dict[Tuple[int, str, str], NotificationCoalescer] = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_coalescer(socketio, namespace: str, event: str) -> NotificationCoalescer:
+    key = (id(socketio), namespace, event)
+    coalescer = _coalescers.get(key)
+    if coalescer is None:
+        with _coalescers_lock:
+            coalescer = _coalescers.get(key)
+            if coalescer is None:
+                coalescer = _coalescers[key] = NotificationCoalescer(socketio, namespace, event)
+    return coalescer
+
+
+def _entity_id(entity: Any) -> Optional[Any]:
+    if isinstance(entity, dict):
+        return entity.get('Id') or entity.get('id')
+    return entity
+
+
+def notify_product_onhand_updated(socketio, product_id: Any, fields: Dict[str, Any]):
+    """Queue one product change; it goes out in the next ``products_onhand_updated`` batch."""
+    broadcast_products_onhand_updated(socketio, [{**(fields or {}), 'Id': product_id}])
 
 
 def broadcast_products_onhand_updated(socketio, updates: Iterable[Dict[str, Any]]):
-    updates_list = list(updates)
-    if not updates_list:
-        return
-    # Emit only product IDs; clients should call GET /api/firebase/get/products/<id> or
-    # use `GET /api/firebase/products/latest` to refresh data.
-    ids = []
-    for item in updates_list:
+    # Emits one `products_onhand_updated` event per coalescing window carrying
+    # [{Id, OnHand, ...changed fields}], so clients can apply it without refetching.
+    records = []
+    for item in updates:
         pid = item.get('Id') or item.get('productId')
         if pid is None:
             continue
-        ids.append(str(pid))
+        record = {key: value for key, value in item.items() if key not in UPDATE_ID_KEYS}
+        record['Id'] = str(pid)
+        records.append(record)
 
-    if not socketio:
+    if not records or not socketio:
         return
-    socketio.emit('products_onhand_updated', ids, namespace='/api/websocket/products')
-    for pid in ids:
-        notify_product_onhand_updated(socketio, pid, {})
+    get_coalescer(socketio, PRODUCTS_NAMESPACE, 'products_onhand_updated').add(records)
 
 
 def broadcast_customer_updates(socketio, results: Iterable[Dict[str, Any]]):
     if not results:
         return
-    # Emit only customer IDs so clients will fetch fresh customer data.
-    ids: List[str] = []
+    # One `customers_updated` event per coalescing window carrying the updated customers.
+    records: List[Dict[str, Any]] = []
     for result in results:
         if not isinstance(result, dict) or not result.get('applied'):
             continue
@@ -185,152 +291,75 @@ def broadcast_customer_updates(socketio, results: Iterable[Dict[str, Any]]):
         cid = customer_data.get('Id') or customer_data.get('id')
         if cid is None:
             continue
-        cid_str = str(cid)
-        ids.append(cid_str)
-        if socketio:
-            socketio.emit('customer_updated', {'id': cid_str}, namespace='/api/websocket/customers')
+        records.append({**customer_data, 'Id': cid})
 
-    if ids and socketio:
-        socketio.emit('customers_updated', ids, namespace='/api/websocket/customers')
+    if records and socketio:
+        get_coalescer(socketio, CUSTOMERS_NAMESPACE, 'customers_updated').add(records)
 
 
 def notify_customer_created(socketio, customer: Dict[str, Any]):
     if not isinstance(customer, dict):
         return
-    cid = customer.get('Id') or customer.get('id')
+    cid = _entity_id(customer)
     if cid is None:
         return
-    if not socketio:
-        return
-    socketio.emit('customer_created', {'id': str(cid)}, namespace='/api/websocket/customers')
+    emit_notification(socketio, CUSTOMERS_NAMESPACE, 'customer_created', {'id': str(cid)})
 
 
 def notify_invoice_updated(socketio, invoice: Dict[str, Any]):
-    if isinstance(invoice, dict):
-        iid = invoice.get('Id') or invoice.get('id')
-    else:
-        iid = invoice
+    iid = _entity_id(invoice)
     if iid is None:
         return
-    if not socketio:
-        return
-    socketio.emit('invoice_updated', {'id': str(iid)}, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'invoice_updated', {'id': str(iid)})
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'invoice_updated', {'id': str(iid)}, remember=True)
 
 
 def notify_invoice_deleted(socketio, invoice_id: Any):
-    if not socketio:
-        return
-    socketio.emit('invoice_deleted', {'id': str(invoice_id)}, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'invoice_deleted', {'id': str(invoice_id)})
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'invoice_deleted', {'id': str(invoice_id)}, remember=True)
 
 
 def notify_invoice_created(socketio, invoice: Dict[str, Any]):
-    if isinstance(invoice, dict):
-        iid = invoice.get('Id') or invoice.get('id')
-    else:
-        iid = invoice
+    iid = _entity_id(invoice)
     if iid is None:
         return
-    if not socketio:
-        return
-    socketio.emit('invoice_created', {'id': str(iid)}, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'invoice_created', {'id': str(iid)})
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'invoice_created', {'id': str(iid)}, remember=True)
 
 
 def notify_order_created(socketio, order: Dict[str, Any]):
-    if isinstance(order, dict):
-        oid = order.get('Id') or order.get('id')
-    else:
-        oid = order
+    oid = _entity_id(order)
     if oid is None:
         return
-    if not socketio:
-        return
-    socketio.emit('order_created', {'id': str(oid)}, namespace='/api/websocket/orders')
-    try:
-        set_last_notify('/api/websocket/orders', 'order_created', {'id': str(oid)})
-    except Exception:
-        pass
+    emit_notification(socketio, ORDERS_NAMESPACE, 'order_created', {'id': str(oid)}, remember=True)
 
 
 def notify_order_updated(socketio, order: Dict[str, Any]):
-    if isinstance(order, dict):
-        oid = order.get('Id') or order.get('id')
-    else:
-        oid = order
+    oid = _entity_id(order)
     if oid is None:
         return
-    if not socketio:
-        return
-    socketio.emit('order_updated', {'id': str(oid)}, namespace='/api/websocket/orders')
-    try:
-        set_last_notify('/api/websocket/orders', 'order_updated', {'id': str(oid)})
-    except Exception:
-        pass
+    emit_notification(socketio, ORDERS_NAMESPACE, 'order_updated', {'id': str(oid)}, remember=True)
 
 
 def notify_order_deleted(socketio, order_id: Any):
-    if not socketio:
-        return
-    socketio.emit('order_deleted', {'id': str(order_id)}, namespace='/api/websocket/orders')
-    try:
-        set_last_notify('/api/websocket/orders', 'order_deleted', {'id': str(order_id)})
-    except Exception:
-        pass
+    emit_notification(socketio, ORDERS_NAMESPACE, 'order_deleted', {'id': str(order_id)}, remember=True)
 
 
 def notify_daily_summary(socketio, date: str, summary: Dict[str, Any]):
     payload = {'date': date, 'summary': summary if summary is not None else {}}
-    if not socketio:
-        return
-    socketio.emit('daily_summary', payload, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'daily_summary', payload)
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'daily_summary', payload, remember=True)
 
 
 def notify_monthly_summary(socketio, year: str, month: str, summary: Dict[str, Any]):
     payload = {'year': year, 'month': month, 'summary': summary if summary is not None else {}}
-    if not socketio:
-        return
-    socketio.emit('monthly_summary', payload, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'monthly_summary', payload)
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'monthly_summary', payload, remember=True)
 
 
 def notify_yearly_summary(socketio, year: str, summary: Dict[str, Any]):
     payload = {'year': year, 'summary': summary if summary is not None else {}}
-    if not socketio:
-        return
-    socketio.emit('yearly_summary', payload, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'yearly_summary', payload)
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'yearly_summary', payload, remember=True)
 
 
 def notify_top_products(socketio, filters: Dict[str, Any], products: List[Dict[str, Any]]):
     payload = {'filters': filters, 'products': products}
-    if not socketio:
-        return
-    socketio.emit('top_products', payload, namespace='/api/websocket/invoices')
-    try:
-        set_last_notify('/api/websocket/invoices', 'top_products', payload)
-    except Exception:
-        pass
+    emit_notification(socketio, INVOICES_NAMESPACE, 'top_products', payload, remember=True)
 
 
 def safe_float(val: Any) -> float:
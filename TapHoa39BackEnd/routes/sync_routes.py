@@ -2,7 +2,10 @@ from __future__ import annotations
 
 from flask import Blueprint, jsonify, request
 
+from routes.jobs_routes import respond_with_job
 from routes.shared import handle_api_errors, safe_int
+from firebase.firebase_service.product_service import COMPARE_CATEGORIES, SYNC_MODES
+from firebase.sync_lock import run_exclusive
 from firebase.firebase_khachhang.import_to_firestore import update_customer_from_kiotviet_to_firestore
 
 
@@ -10,19 +13,28 @@ def create_sync_routes_bp(product_service) -> Blueprint:
     bp = Blueprint("sync_routes", __name__, url_prefix="/api/sync")
 
     @bp.route("/kiotviet/firebase/customers", methods=["PUT"])
+    @handle_api_errors
     def sync_customers_from_kiotviet():
-        return jsonify(update_customer_from_kiotviet_to_firestore())
+        """Runs as a background job (see routes/jobs_routes.py); 409 while another worker syncs."""
+        return respond_with_job("customers_sync", run_exclusive, "customers_sync",
+                                update_customer_from_kiotviet_to_firestore, payload=request.get_json(silent=True))
 
     @bp.route("/kiotviet/firebase/products", methods=["POST"])
     @handle_api_errors
     def sync_products_from_kiotviet():
         """Trigger a sync from KiotViet into Firestore and return final Firestore data.
-        Accepts optional JSON body: { "limit": 100, "skip_products": false }
+        Accepts optional JSON body: { "limit": 100, "skip_products": false, "mode": "auto" }
+
+        mode (body or ?mode=): "auto" (default) only pulls products modified since
+        the last sync and runs a full reconciliation once a day; "full" always
+        downloads the whole catalog; "delta" always pulls modified products only.
 
         Optimizations:
         - Returns sync stats by default (no product data)
         - Set skip_products=false to include products in response
         - Uses optimized sync with retry logic and timeout
+        - Runs as a background job: answers 202 with the job id when the sync
+          takes longer than JOB_WAIT_SECONDS (or `wait`), poll /api/jobs/<id>
         """
         payload = request.get_json(silent=True)
 
@@ -31,108 +43,75 @@ def create_sync_routes_bp(product_service) -> Blueprint:
             payload = {}
 
         skip_products = payload.get("skip_products", True)  # Default to skip for faster response
+        mode = str(payload.get("mode") or request.args.get("mode") or "auto").strip().lower()
+        if mode not in SYNC_MODES:
+            raise ValueError(f"mode phải là một trong {', '.join(SYNC_MODES)}")
+
+        def render(sync_result):
+            # Check if sync succeeded
+            if not sync_result.get("success", False):
+                return jsonify({
+                    "sync": sync_result,
+                    "products": [],
+                    "error": sync_result.get("message", "Đồng bộ thất bại")
+                }), 500
+
+            # Only fetch products if explicitly requested
+            if skip_products:
+                return jsonify({
+                    "sync": sync_result,
+                    "message": "Đồng bộ thành công. Gọi /api/firebase/get/products để lấy danh sách.",
+                    "products_count": sync_result.get("stats", {}).get("total_api_items", 0)
+                })
 
-        # Perform optimized sync
-        sync_result = product_service.update_products_from_kiotviet_to_firestore()
-
-        # Check if sync succeeded
-        if not sync_result.get("success", False):
-            return jsonify({
-                "sync": sync_result,
-                "products": [],
-                "error": sync_result.get("message", "Đồng bộ thất bại")
-            }), 500
-
-        # Only fetch products if explicitly requested
-        if skip_products:
-            return jsonify({
-                "sync": sync_result,
-                "message": "Đồng bộ thành công. Gọi /api/firebase/get/products để lấy danh sách.",
-                "products_count": sync_result.get("stats", {}).get("total_api_items", 0)
-            })
+            # Fetch and return products (slower)
+            products = product_service.read_all_products(include_inactive=True, include_deleted=True) or []
 
-        # Fetch and return products (slower)
-        products = product_service.read_all_products(include_inactive=True, include_deleted=True) or []
+            return jsonify({"sync": sync_result, "products": products})
 
-        return jsonify({"sync": sync_result, "products": products})
+        # Perform optimized sync (one products_sync job at a time, shared with /api/firebase/products/sync
+        # and the scheduler; the lease keeps other workers/hosts out)
+        return respond_with_job("products_sync", run_exclusive, "products_sync",
+                                product_service.update_products_from_kiotviet_to_firestore,
+                                mode=mode, params={"mode": mode}, payload=payload, render=render)
 
     @bp.route("/kiotviet/firebase/products/compare", methods=["GET"])
+    @handle_api_errors
     def compare_products_between_sources():
-        kiotviet_products = product_service.fetch_api_items()
-        firebase_products = product_service.read_all_products()
+        """Diff KiotViet vs Firestore from the sync's checksum data (no KiotViet refetch).
 
-        kv_by_id = {str(getattr(prod, "Id", "")): prod for prod in kiotviet_products if getattr(prod, "Id", None) is not None}
-        fb_by_id = {str(prod.get("Id")): prod for prod in firebase_products if prod.get("Id")}
+        Query params:
+            source     "ledger" (default, no Firestore reads) or "firestore"
+                       (projected SyncChecksum reads, catches edits made outside the sync)
+            category   one of COMPARE_CATEGORIES (default: every category, paginated each)
+            page, page_size   1-based page, page_size up to 1000 (default 100)
+            refresh    1 to rebuild instead of using the cached report
 
-        all_ids = set(kv_by_id.keys()) | set(fb_by_id.keys())
-
-        missing_in_firebase = []
-        missing_in_kiotviet = []
-        checksum_mismatches = []
-
-        for pid in all_ids:
-            kv_item = kv_by_id.get(pid)
-            fb_item = fb_by_id.get(pid)
-
-            if kv_item is None and fb_item is not None:
-                missing_in_kiotviet.append({
-                    "Id": pid,
-                    "code": fb_item.get("Code") or fb_item.get("code"),
-                })
-                continue
-
-            if kv_item is not None and fb_item is None:
-                kv_code = None
-                if hasattr(kv_item, "__dict__"):
-                    kv_code = getattr(kv_item, "Code", None) or kv_item.__dict__.get("Code") or kv_item.__dict__.get("code")
-                else:
-                    try:
-                        kv_code = kv_item.get("Code") or kv_item.get("code")
-                    except Exception:
-                        kv_code = None
-
-                missing_in_firebase.append({
-                    "Id": pid,
-                    "code": kv_code,
-                })
-                continue
-
-            if kv_item is None or fb_item is None:
-                continue
-
-            kv_dict = kv_item.__dict__ if hasattr(kv_item, "__dict__") else kv_item
-            kv_checksum = product_service.hash_item(kv_dict)
-            fb_checksum = fb_item.get("SyncChecksum") or product_service.hash_item(fb_item)
-
-            if kv_checksum != fb_checksum:
-                discrepancy = {
-                    "Id": pid,
-                    "kiotviet_checksum": kv_checksum,
-                    "firebase_checksum": fb_checksum,
-                }
-
-                kv_onhand = getattr(kv_item, "OnHand", None)
-                fb_onhand = fb_item.get("OnHand")
-                if kv_onhand is not None:
-                    discrepancy["kiotviet_onhand"] = kv_onhand
-                if fb_onhand is not None:
-                    discrepancy["firebase_onhand"] = fb_onhand
-
-                kv_modified = getattr(kv_item, "ModifiedDate", None)
-                fb_modified = fb_item.get("ModifiedDate")
-                if kv_modified:
-                    discrepancy["kiotviet_modified"] = str(kv_modified)
-                if fb_modified:
-                    discrepancy["firebase_modified"] = str(fb_modified)
-
-                checksum_mismatches.append(discrepancy)
-
-        return jsonify({
-            "total_kiotviet": len(kv_by_id),
-            "total_firebase": len(fb_by_id),
-            "missing_in_firebase": sorted(missing_in_firebase, key=safe_int),
-            "missing_in_kiotviet": sorted(missing_in_kiotviet, key=safe_int),
-            "checksum_mismatches": checksum_mismatches,
+        Built from what the last syncs read; run a full sync first for a complete picture.
+        """
+        source = (request.args.get("source") or "ledger").strip().lower()
+        category = request.args.get("category")
+        if category and category not in COMPARE_CATEGORIES:
+            raise ValueError(f"category phải là một trong {', '.join(COMPARE_CATEGORIES)}")
+        page = max(1, safe_int(request.args.get("page", 1)))
+        page_size = min(1000, max(1, safe_int(request.args.get("page_size", 100)) or 100))
+        refresh = request.args.get("refresh", "false").lower() in ("1", "true", "yes")
+
+        report = product_service.get_compare_report(source, refresh=refresh)
+        if report["kiotviet_snapshot_at"] is None:
+            return jsonify({
+                "error": "Chưa có dữ liệu đồng bộ để so sánh, hãy chạy đồng bộ full trước.",
+                "counts": report["counts"],
+            }), 409
+
+        start = (page - 1) * page_size
+        selected = (category,) if category else COMPARE_CATEGORIES
+        body = {key: value for key, value in report.items() if key != "categories"}
+        body.update({
+            "page": page,
+            "page_size": page_size,
+            "items": {name: report["categories"][name][start:start + page_size] for name in selected},
         })
+        return jsonify(body)
 
     return bp
@@ -0,0 +1,152 @@
+"""Production entry point: ``python -m serve``.
+
+Runs the Flask + Socket.IO app under gunicorn with gevent workers, so every
+long-polling Socket.IO client costs a greenlet instead of an OS thread and
+REST requests are no longer starved by idle polls. gRPC (used by the
+Firestore client) is switched to its gevent-compatible mode in every worker
+before the app, and therefore any Firestore client, is imported.
+
+Environment:
+    e                     prod (port 8000) / local (port 5000), as in app.py
+    SERVER_PORT           explicit port (overrides the above)
+    WEB_CONCURRENCY       gunicorn worker processes (default 1, see below)
+    SERVER_WORKER_CLASS   gevent (default) | gthread
+    SERVER_THREADS        threads per worker for gthread (default 8)
+    SERVER_WORKER_CONNECTIONS  concurrent connections per gevent worker (default 1000)
+    SERVER_TIMEOUT        worker timeout in seconds (default 120)
+    SERVER_ACCESS_LOG     1 to print one access-log line per request
+    MESSAGE_BUS_BACKEND   see Utility/message_bus.py; defaults to ``unix`` when
+                          WEB_CONCURRENCY > 1 so cache invalidations reach every worker
+
+Socket.IO polling keeps its session in the worker that created it: with
+WEB_CONCURRENCY > 1 the load balancer must use sticky sessions (e.g. nginx
+``ip_hash`` or a cookie affinity), otherwise polls land on workers that do
+not know the session and clients reconnect in a loop.
+
+gunicorn does not run on Windows; there (or when gunicorn is missing) the app
+is served by gevent's own WSGI server in a single process.
+"""
+
+import os
+import tempfile
+
+from Utility.server_env import get_env_name, get_port, print_banner
+
+WORKER_CLASSES = {
+    "gevent": ("gevent", "gevent"),
+    "gthread": ("gthread", "threading"),
+}
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def server_settings():
+    env_name = get_env_name()
+    worker_class = os.getenv("SERVER_WORKER_CLASS", "gevent").strip().lower()
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"SERVER_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, got {worker_class!r}")
+    return {
+        "env": env_name,
+        "port": get_port(env_name),
+        "worker_class": worker_class,
+        "workers": max(1, _int_env("WEB_CONCURRENCY", 1)),
+        "threads": max(1, _int_env("SERVER_THREADS", 8)),
+        "worker_connections": max(1, _int_env("SERVER_WORKER_CONNECTIONS", 1000)),
+        "timeout": _int_env("SERVER_TIMEOUT", 120),
+        "access_log": os.getenv("SERVER_ACCESS_LOG", "0").lower() in ("1", "true", "yes"),
+    }
+
+
+def _prepare_worker(async_mode):
+    """Run inside the worker, before the app is imported."""
+    os.environ["SOCKETIO_ASYNC_MODE"] = async_mode
+    if async_mode == "gevent":
+        from gevent import monkey
+
+        # No-op when gunicorn's gevent worker already patched the process.
+        monkey.patch_all()
+        import grpc.experimental.gevent as grpc_gevent
+
+        grpc_gevent.init_gevent()
+
+
+def _load_app(async_mode):
+    _prepare_worker(async_mode)
+    from app import app
+
+    return app
+
+
+def run_gunicorn(settings):
+    from gunicorn.app.base import BaseApplication
+
+    gunicorn_worker, async_mode = WORKER_CLASSES[settings["worker_class"]]
+
+    class TapHoa39Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{settings['port']}")
+            self.cfg.set("workers", settings["workers"])
+            self.cfg.set("worker_class", gunicorn_worker)
+            self.cfg.set("threads", settings["threads"])
+            self.cfg.set("worker_connections", settings["worker_connections"])
+            self.cfg.set("timeout", settings["timeout"])
+            self.cfg.set("graceful_timeout", 30)
+            self.cfg.set("keepalive", 5)
+            # Each worker imports the app (and opens its Firestore/gRPC clients) after the fork.
+            self.cfg.set("preload_app", False)
+            if settings["access_log"]:
+                self.cfg.set("accesslog", "-")
+
+        def load(self):
+            return _load_app(async_mode)
+
+    TapHoa39Application().run()
+
+
+def run_gevent_fallback(settings):
+    _prepare_worker("gevent")
+    from app import app
+
+    app.socketio.run(app, host="0.0.0.0", port=settings["port"], log_output=settings["access_log"])
+
+
+def main():
+    settings = server_settings()
+    try:
+        import gunicorn  # noqa: F401
+        use_gunicorn = os.name != "nt"
+    except ImportError:
+        use_gunicorn = False
+
+    if use_gunicorn:
+        gunicorn_worker, async_mode = WORKER_CLASSES[settings["worker_class"]]
+        concurrency = (
+            f"{settings['worker_connections']} connections/worker" if gunicorn_worker == "gevent"
+            else f"{settings['threads']} threads/worker"
+        )
+        server_line = f"gunicorn, {settings['workers']} x {gunicorn_worker} worker(s), {concurrency}"
+    else:
+        async_mode = "gevent"
+        server_line = "gevent WSGIServer (single process, gunicorn unavailable)"
+
+    print_banner(settings["env"], settings["port"], server_line, f"Polling transport ({async_mode} mode)")
+    if use_gunicorn and settings["workers"] > 1:
+        print("⚠️ WEB_CONCURRENCY > 1: Socket.IO polling cần sticky sessions ở load balancer.")
+        if not os.getenv("MESSAGE_BUS_BACKEND"):
+            # Workers inherit this before they import the app and create their caches.
+            os.environ["MESSAGE_BUS_BACKEND"] = "unix"
+            os.environ.setdefault(
+                "MESSAGE_BUS_DIR", os.path.join(tempfile.gettempdir(), f"taphoa39-bus-{os.getpid()}")
+            )
+
+    if use_gunicorn:
+        run_gunicorn(settings)
+    else:
+        run_gevent_fallback(settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,10 @@ export class FirebaseWebsocketService {
     orders: null,
   };
 
+  // Last server sequence number seen per namespace (second argument of every
+  // notification). Sent on reconnect so the server replays only missed events.
+  private lastSeq: Partial<Record<keyof typeof this.namespacePaths, number>> = {};
+
   private anySubject = new Subject<AnyEvent>();
   public any$: Observable<AnyEvent> = this.anySubject.asObservable();
 
@@ -43,10 +47,30 @@ export class FirebaseWebsocketService {
         const socket = io(`${url}${this.namespacePaths[ns]}`, {
           transports: ['polling'],  // Use polling only, WebSocket disabled
           reconnectionAttempts: 5,
-          reconnectionDelay: 1000
+          reconnectionDelay: 1000,
+          auth: (cb: (data: object) => void) => {
+            const lastSeq = this.lastSeq[ns];
+            cb(lastSeq !== undefined ? { last_seq: lastSeq } : {});
+          }
         });
         // forward any event
         socket.onAny((event: string, ...args: any[]) => {
+          if (event === 'replay') {
+            // Missed events after a reconnect, re-dispatched as if they had arrived live
+            const replay = args[0] ?? {};
+            for (const item of replay.events ?? []) {
+              this.trackSeq(ns, item.seq);
+              this.zone.run(() => this.anySubject.next({ namespace: ns as string, event: item.event, args: [item.data, item.seq] }));
+            }
+            this.trackSeq(ns, replay.latest_seq);
+            return;
+          }
+          if (event === 'resync') {
+            // Too much was missed: subscribers should reload from REST
+            this.trackSeq(ns, args[0]?.latest_seq);
+          } else {
+            this.trackSeq(ns, args[1]);
+          }
           // Run inside Angular zone so subscribers trigger change detection
           this.zone.run(() => this.anySubject.next({ namespace: ns as string, event, args }));
         });
@@ -65,6 +89,12 @@ export class FirebaseWebsocketService {
     }
   }
 
+  private trackSeq(ns: keyof typeof this.namespacePaths, seq: unknown): void {
+    if (typeof seq === 'number' && Number.isFinite(seq) && seq > (this.lastSeq[ns] ?? 0)) {
+      this.lastSeq[ns] = seq;
+    }
+  }
+
   disconnectAll(): void {
     for (const ns of Object.keys(this.sockets) as Array<keyof typeof this.sockets>) {
       const s = this.sockets[ns];
@@ -137,7 +167,7 @@ export class FirebaseWebsocketService {
    * If `namespaceName` is provided, only notifications from that namespace are returned.
    */
   public notify$(namespaceName?: keyof typeof this.namespacePaths): Observable<any> {
-    const notifyNames = new Set(['notify', 'changed', 'data_changed', 'update', 'updated', 'sync_needed']);
+    const notifyNames = new Set(['notify', 'changed', 'data_changed', 'update', 'updated', 'sync_needed', 'resync']);
     return this.any$.pipe(
       filter(e => notifyNames.has(e.event) && (!namespaceName || e.namespace === namespaceName)),
       map(e => e.args[0])